@@ -1,20 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from config.db import mongo
 import os
+import json
+import math
+import threading
+import uuid
 
 # 1. Force load .env and override any cached VS Code terminal variables
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
 # Import Controllers
-from controllers.chatbot_controller import chatbot_bp
-from controllers.measurement_controller import process_measurement
+from controllers.chatbot_controller import chatbot_bp, setup_qa_indexes
+from controllers.measurement_controller import (
+    process_measurement_bytes, process_measurement_batch_job, image_options, MAX_BATCH_IMAGES, AI_MODEL_VERSION, VISION_BACKEND,
+    DETECTION_CASCADE
+)
+from controllers.video_controller import process_video_bytes, process_frame_stream_bytes, VIDEO_MAX_FRAMES, VIDEO_MAX_MB
+from services.result_store import store_images, image_path
+from concurrent.futures import TimeoutError as FutureTimeout
+from services.inference_pool import inference_pool, PoolFullError, INFERENCE_POOL, INFERENCE_TIMEOUT
+from services.warmup import is_eager, is_ready, preload_models, warm_up
+from services.metrics import render_prometheus
+from services.chat_logs import setup_log_storage
+from services.scale_cache import scale_cache
+from services.scan_cache import scan_cache, content_digest, scan_key
+from services.model_registry import registry_stats
 
 app = Flask(__name__)
 
 # 2. Enable CORS (Allow React Frontend to talk to Python Backend)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor", "X-Scan-Cache"])
 
 # 3. Database Config
 raw_uri = os.environ.get("MONGO_URI")
@@ -28,9 +45,149 @@ app.config["MONGO_URI"] = raw_uri
 # 4. Initialize DB
 mongo.init_app(app)
 
+# 4b. Chatbot log + Q&A indexes (and log retention), in the background so an unreachable Mongo
+#     can't hold up startup (skipped in spawned inference-pool processes)
+if __name__ != '__mp_main__':
+    threading.Thread(target=setup_log_storage, name="log-storage-setup", daemon=True).start()
+    threading.Thread(target=setup_qa_indexes, name="qa-index-setup", daemon=True).start()
+
 # 5. Register Blueprints (Routes)
 app.register_blueprint(chatbot_bp, url_prefix='/api/training/chatbot')
 
+# 6. Eager model loading (MODEL_PRELOAD=eager). Under gunicorn's preload_app this runs once
+#    in the master, so every forked worker shares the same weights (see gunicorn.conf.py)
+#    (Skipped when this module is re-imported by a spawned inference-pool process)
+if is_eager() and __name__ != '__mp_main__':
+    preload_models()
+
+# --- SCAN RESPONSE FORMATS ---
+# ?response= (or form field) picks how the annotated image comes back:
+#   json      = base64 inside the JSON (default, what the mobile app expects)
+#   lite      = measurements only, no image
+#   url       = JSON with an image_url to fetch the JPEG from the local result store
+#   multipart = multipart/mixed: the JSON part followed by raw image/jpeg parts
+# ?quality=10-100 and ?max_width=px (64 or more) shrink the JPEG for slow connections;
+# out-of-range values are clamped, non-numeric ones rejected with a 400.
+RESPONSE_FORMATS = {"json": "base64", "lite": "none", "url": "binary", "multipart": "binary"}
+
+def _param(name, default=None):
+    return request.args.get(name) or request.form.get(name) or default
+
+def _response_format():
+    fmt = (_param('response') or '').lower()
+    if not fmt and 'multipart/mixed' in request.headers.get('Accept', ''):
+        fmt = 'multipart'
+    return fmt if fmt in RESPONSE_FORMATS else 'json'
+
+def _number_param(name):
+    value = _param(name)
+    if value is None: return None
+    try:
+        return int(float(value))
+    except (ValueError, OverflowError):
+        raise ValueError(f"{name} must be a number") from None
+
+def _positive_param(name):
+    """A positive float param (None when absent); ValueError otherwise."""
+    value = _param(name)
+    if value is None: return None
+    try:
+        number = float(value)
+    except ValueError:
+        number = math.nan
+    if not math.isfinite(number) or number <= 0:
+        raise ValueError(f"{name} must be a positive number")
+    return number
+
+def _image_options(fmt):
+    """Image settings for this request (clamped by image_options); ValueError on a non-numeric value."""
+    return image_options(mode=RESPONSE_FORMATS[fmt], quality=_number_param('quality'), max_width=_number_param('max_width'))
+
+def _request_options():
+    """(format, image options, None), or (None, None, 400 response) when the image params don't parse."""
+    fmt = _response_format()
+    try:
+        return fmt, _image_options(fmt), None
+    except ValueError as e:
+        return None, None, (jsonify({"error": str(e)}), 400)
+
+def _scan_outputs(payload):
+    return payload.get("results", [payload]) if isinstance(payload, dict) else []
+
+def _multipart_response(payload):
+    boundary = uuid.uuid4().hex
+    images = []
+    for i, output in enumerate(_scan_outputs(payload)):
+        data = output.pop("image_bytes", None)
+        if data is not None:
+            output["image_part"] = f"image-{i}"
+            images.append((f"image-{i}", data))
+
+    chunks = [f"--{boundary}\r\nContent-Type: application/json\r\n\r\n".encode(), json.dumps(payload).encode(), b"\r\n"]
+    for part_id, data in images:
+        chunks.append(f"--{boundary}\r\nContent-Type: image/jpeg\r\nContent-ID: <{part_id}>\r\nContent-Length: {len(data)}\r\n\r\n".encode())
+        chunks.extend([data, b"\r\n"])
+    chunks.append(f"--{boundary}--\r\n".encode())
+    return Response(b"".join(chunks), content_type=f"multipart/mixed; boundary={boundary}")
+
+def scan_response(payload, fmt):
+    if fmt == "multipart":
+        return _multipart_response(payload)
+    if fmt == "url":
+        store_images(payload)
+    return jsonify(payload)
+
+def _remember_scale(payload):
+    # Optional `session_id` groups photos from one rig so they can share the paper calibration
+    scale_cache.remember(_param('session_id'), payload)
+    return payload
+
+# --- SCAN RESULT CACHE ---
+# Two keys per scan: results that only depend on the photo itself (paper found, or environment
+# mode) are shared by everyone; results that used the session/default scale are also keyed by it.
+def _scan_cache_keys(kind, payloads, scan_mode, options, fallback_scale):
+    digest = content_digest(payloads)
+    params = (kind, scan_mode.upper(), AI_MODEL_VERSION, VISION_BACKEND, DETECTION_CASCADE, sorted(options.items()))
+    return scan_key(digest, *params), scan_key(digest, *params, fallback_scale)
+
+def _cache_scan(cache_keys, result):
+    if not cache_keys: return result
+    photo_only = all(output.get("scale_source") in ("paper", None) for output in _scan_outputs(result))
+    scan_cache.set(cache_keys[0] if photo_only else cache_keys[1], result)
+    return result
+
+def run_scan(fn, *args, fmt="json", cache_keys=None):
+    """
+    Runs a scan job. With the inference pool on, the job goes to a separate process and
+    `?async=1` returns a job id right away; otherwise it runs inline in this request thread.
+    Identical uploads are answered from the scan cache without running the models.
+    """
+    cached = scan_cache.get(*cache_keys) if cache_keys else None
+    if cached is not None:
+        response = scan_response(_remember_scale(cached), fmt)
+        response.headers["X-Scan-Cache"] = "hit"
+        return response
+
+    if not INFERENCE_POOL:
+        return scan_response(_remember_scale(_cache_scan(cache_keys, fn(*args))), fmt)
+
+    is_async = request.args.get('async') == '1' or request.form.get('async') == '1'
+    try:
+        job_id = inference_pool.submit(fn, *args, shared=is_async)
+    except PoolFullError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+
+    if is_async:
+        return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/measure/jobs/{job_id}"}), 202
+    try:
+        result = inference_pool.result(job_id, timeout=INFERENCE_TIMEOUT)
+        return scan_response(_remember_scale(_cache_scan(cache_keys, result)), fmt)
+    except FutureTimeout:
+        # Still running: hand the client the job id so it can keep polling instead of retrying
+        inference_pool.share(job_id)
+        return jsonify({"error": "Scan is taking longer than expected", "job_id": job_id,
+                        "status_url": f"/api/measure/jobs/{job_id}"}), 504
+
 @app.route('/api/measure', methods=['POST'])
 def measure_object():
     if 'photo' not in request.files:
@@ -41,20 +198,133 @@ def measure_object():
     # ---> NEW: Catch the mode sent from the mobile app (Defaults to OVERALL if not found) <---
     scan_mode = request.form.get('mode', 'OVERALL')
     
+    fmt, options, error = _request_options()
+    if error: return error
     try:
         # ---> NEW: Pass the scan_mode into your controller <---
-        result = process_measurement(file, scan_mode=scan_mode)
-        return jsonify(result)
+        data, fallback_scale = file.read(), scale_cache.get(_param('session_id'))
+        return run_scan(process_measurement_bytes, data, scan_mode, options, fallback_scale, fmt=fmt,
+                        cache_keys=_scan_cache_keys("single", [data], scan_mode, options, fallback_scale))
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/measure/batch', methods=['POST'])
+def measure_batch():
+    files = request.files.getlist('photos')
+    if not files:
+        return jsonify({"error": "No photos uploaded"}), 400
+    if len(files) > MAX_BATCH_IMAGES:
+        return jsonify({"error": f"Too many photos (max {MAX_BATCH_IMAGES} per batch)"}), 400
+
+    scan_mode = request.form.get('mode', 'OVERALL')
+
+    fmt, options, error = _request_options()
+    if error: return error
+    try:
+        payloads, fallback_scale = [f.read() for f in files], scale_cache.get(_param('session_id'))
+        return run_scan(process_measurement_batch_job, payloads, scan_mode, options, fallback_scale, fmt=fmt,
+                        cache_keys=_scan_cache_keys("batch", payloads, scan_mode, options, fallback_scale))
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+VIDEO_FORM_SLACK = 1024 * 1024  # multipart headers and the non-file fields of a video upload
+
+@app.route('/api/measure/video', methods=['POST'])
+def measure_video():
+    # The whole upload (clip or frames) is capped at VIDEO_MAX_MB, plus room for the other form fields.
+    # Checked on Content-Length before request.files is touched, since parsing the form spools the body.
+    limit = int(VIDEO_MAX_MB * 1024 * 1024)
+    if (request.content_length or 0) > limit + VIDEO_FORM_SLACK:
+        return jsonify({"error": f"Video too large (max {VIDEO_MAX_MB:g} MB)"}), 413
+
+    # Either a short clip (`video`) or a burst of frames from the camera (`frames`, in capture order)
+    video, frames = request.files.get('video'), request.files.getlist('frames')
+    if not video and not frames:
+        return jsonify({"error": "No video or frames uploaded"}), 400
+    if len(frames) > VIDEO_MAX_FRAMES:
+        return jsonify({"error": f"Too many frames (max {VIDEO_MAX_FRAMES} per stream)"}), 400
+
+    fmt, options, error = _request_options()
+    if error: return error
+    try:
+        sample_fps = _positive_param('sample_fps')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        fallback_scale = scale_cache.get(_param('session_id'))
+        if video:
+            # Chunked uploads carry no Content-Length: this read only bounds what is held in memory,
+            # the form parser has already spooled the clip to disk by now
+            data = video.stream.read(limit + 1)
+            if len(data) > limit:
+                return jsonify({"error": f"Video too large (max {VIDEO_MAX_MB:g} MB)"}), 413
+            return run_scan(process_video_bytes, data, options, fallback_scale, sample_fps, fmt=fmt,
+                            cache_keys=_scan_cache_keys("video", [data], f"STREAM@{sample_fps}", options, fallback_scale))
+        payloads = [f.read() for f in frames]
+        return run_scan(process_frame_stream_bytes, payloads, options, fallback_scale, fmt=fmt,
+                        cache_keys=_scan_cache_keys("frames", payloads, "STREAM", options, fallback_scale))
+    except Exception as e:
+        print(f"Error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/measure/jobs/<job_id>', methods=['GET'])
+def measure_job_status(job_id):
+    # ?wait=N long-polls for up to N seconds (capped below the gunicorn timeout)
+    try:
+        wait = max(0.0, min(float(request.args.get('wait', 0)), INFERENCE_TIMEOUT))
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    status = inference_pool.status(job_id, wait=wait)
+    if status is None:
+        return jsonify({"error": "Job not found"}), 404
+    if status.get("result"):
+        # Binary-mode jobs are served by URL; shared jobs were stored on completion, so this is a no-op for them
+        store_images(status["result"])
+    return jsonify(status), 200
+
+@app.route('/api/measure/cache', methods=['GET'])
+def measure_cache_stats():
+    return jsonify(scan_cache.stats()), 200
+
+@app.route('/api/models', methods=['GET'])
+def model_stats():
+    # Per-process: with the inference pool on, the YOLO models live in the pool processes,
+    # so their numbers come from whichever pool process picks up this probe
+    report = {"web": registry_stats()}
+    if INFERENCE_POOL:
+        try:
+            report["inference_pool"] = inference_pool.result(inference_pool.submit(registry_stats), timeout=5)
+        except (PoolFullError, FutureTimeout) as e:
+            report["inference_pool"] = {"error": str(e) or "Pool busy"}
+    return jsonify(report), 200
+
+@app.route('/api/measure/results/<result_id>', methods=['GET'])
+def measure_result_image(result_id):
+    path = image_path(result_id)
+    if path is None:
+        return jsonify({"error": "Result not found or expired"}), 404
+    return send_file(path, mimetype='image/jpeg', max_age=3600)
+
 @app.route('/')
 def home():
     return "CrayAI API (Chatbot + Vision) is Running 🦞"
 
+@app.route('/ready')
+def ready():
+    if not is_ready():
+        return jsonify({"status": "warming_up"}), 503
+    return jsonify({"status": "ready"}), 200
+
+@app.route('/metrics')
+def metrics():
+    # Per-process numbers: with several gunicorn workers each scrape sees the worker that answered
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     # port = int(os.environ.get("PYTHON_PORT", 5001)) Use Railway's port or default to 5001
     # app.run(host='0.0.0.0', debug=True, port=port)
     port = int(os.environ.get("PORT", 7860))
+    warm_up(app)
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
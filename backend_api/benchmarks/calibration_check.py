@@ -0,0 +1,114 @@
+"""
+Validates calculate_dynamic_scale on synthetic paper-square photos with a known scale,
+and times it against the original per-contour loop.
+
+Run from backend_api/:
+    python -m benchmarks.calibration_check --images 200
+
+Each image is 800px wide with a mottled tank-like background, some clutter (short strokes and
+blobs), and a 2cm reference square drawn at a random scale/position/small rotation. The printed
+size is the square's outer edge, outline included, and the paper margin around it is kept clear
+of clutter as on a real sheet. A result counts as correct when the detected pixels-per-cm is
+within 10% of the truth (slight rotation widens the detected box a little).
+Both paths should score close to 100% here, so a drop in either is a real regression.
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+
+from controllers.measurement_controller import (
+    calculate_dynamic_scale, preprocess, REFERENCE_BOX_SIZE_CM, DEFAULT_PIXELS_PER_CM
+)
+
+TOLERANCE = 0.10
+
+OUTLINE_PX = 2
+
+def _color(rng):
+    return tuple(int(c) for c in rng.integers(0, 255, 3))
+
+def make_image(rng):
+    h, w = 600, 800
+    # Patches a few tens of px across, like gravel and shadows on a tank floor (per-pixel noise
+    # at this scale thresholds into random blobs big enough to pass as squares)
+    noise = rng.integers(70, 190, size=(h // 20, w // 20, 3), dtype=np.uint8)
+    background = cv2.resize(noise, (w, h), interpolation=cv2.INTER_CUBIC)
+    background = np.clip(background.astype(np.int16) + rng.integers(-10, 10, size=background.shape), 0, 255).astype(np.uint8)
+    img = background.copy()
+
+    # Clutter: short strokes and blobs that create lots of small contours
+    for _ in range(rng.integers(20, 40)):
+        p1 = rng.integers(0, [w, h])
+        p2 = p1 + rng.integers(-60, 60, 2)
+        cv2.line(img, tuple(int(v) for v in p1), tuple(int(v) for v in p2), _color(rng), int(rng.integers(1, 3)))
+    for _ in range(rng.integers(5, 15)):
+        cv2.circle(img, tuple(int(v) for v in rng.integers(0, [w, h])), int(rng.integers(3, 15)), _color(rng), -1)
+
+    pixels_per_cm = float(rng.uniform(20, 60))
+    side = pixels_per_cm * REFERENCE_BOX_SIZE_CM
+    cx, cy = rng.uniform(side, w - side), rng.uniform(side, h - side)
+    angle = float(rng.uniform(-2, 2))
+    margin = np.zeros((h, w), np.uint8)
+    cv2.fillPoly(margin, [cv2.boxPoints(((cx, cy), (side * 1.5, side * 1.5), angle)).astype(np.int32)], 255)
+    img[margin > 0] = background[margin > 0]
+    # The outline is drawn centred on the box, so inset it to put the outer edge at `side`
+    inner = side - OUTLINE_PX
+    box = cv2.boxPoints(((cx, cy), (inner, inner), angle)).astype(np.int32)
+    cv2.fillPoly(img, [box], (245, 245, 245))
+    cv2.polylines(img, [box], True, (15, 15, 15), OUTLINE_PX)
+    return img, pixels_per_cm
+
+def legacy_scale(img):
+    """The original implementation: every contour goes through approxPolyDP."""
+    thresh = preprocess(img).thresh
+    cnts_result = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contours = cnts_result[0] if len(cnts_result) == 2 else cnts_result[1]
+    square_widths = []
+    for cnt in contours:
+        peri = cv2.arcLength(cnt, True)
+        approx = cv2.approxPolyDP(cnt, 0.04 * peri, True)
+        if len(approx) == 4:
+            x, y, w, h = cv2.boundingRect(approx)
+            aspect_ratio = float(w) / h if h != 0 else 0
+            area = cv2.contourArea(cnt)
+            if 0.8 < aspect_ratio < 1.2 and 1000 < area < (img.shape[0] * img.shape[1] * 0.1):
+                square_widths.append(w)
+    if square_widths:
+        return np.median(square_widths) / REFERENCE_BOX_SIZE_CM, True
+    return DEFAULT_PIXELS_PER_CM, False
+
+def evaluate(fn, dataset):
+    correct, agree_found, elapsed, outputs = 0, 0, 0.0, []
+    for img, truth in dataset:
+        start = time.perf_counter()
+        scale, found = fn(img)
+        elapsed += time.perf_counter() - start
+        outputs.append((round(float(scale), 3), found))
+        if found and abs(scale - truth) / truth <= TOLERANCE:
+            correct += 1
+    return correct / len(dataset), elapsed / len(dataset) * 1000, outputs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--images', type=int, default=200)
+    args = parser.parse_args()
+
+    import controllers.measurement_controller as measurement
+    measurement.DEBUG_MODE = False
+
+    rng = np.random.default_rng(7)
+    dataset = [make_image(rng) for _ in range(args.images)]
+
+    legacy_acc, legacy_ms, legacy_out = evaluate(legacy_scale, dataset)
+    new_acc, new_ms, new_out = evaluate(calculate_dynamic_scale, dataset)
+    same = np.mean([a == b for a, b in zip(legacy_out, new_out)])
+
+    print(f"{args.images} synthetic images (paper within {TOLERANCE:.0%} of true px/cm)")
+    print(f"{'path':<10}{'accuracy':>10}{'ms/image':>10}")
+    print(f"{'legacy':<10}{legacy_acc:>10.1%}{legacy_ms:>10.2f}")
+    print(f"{'current':<10}{new_acc:>10.1%}{new_ms:>10.2f}")
+    print(f"identical results: {same:.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Exercises the Gemini wrapper (services/llm_client.py) against the local stub server:
+healthy traffic, an upstream that hangs past the timeout, a failing upstream tripping the
+circuit breaker, and recovery through the half-open trial call. Needs google-genai installed.
+
+Run from backend_api/:
+    python -m benchmarks.gemini_fallback_check --timeout 1 --concurrency 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from benchmarks.gemini_stub_server import start_stub
+from services.llm_client import GeminiClient, CircuitBreaker, LLMUnavailable
+
+def fire(client, requests, parallel):
+    """Sends `requests` prompts from `parallel` threads; returns per-call (outcome, ms)."""
+    def one(i):
+        started = time.perf_counter()
+        try:
+            client.generate(f"How warm should the tank be? #{i}")
+            outcome = "ok"
+        except LLMUnavailable as e:
+            outcome = "circuit_open" if "circuit" in str(e) else "busy"
+        except Exception:
+            outcome = "error"
+        return outcome, (time.perf_counter() - started) * 1000
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        return list(pool.map(one, range(requests)))
+
+def report(name, results, client):
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    ms = np.array([m for _, m in results])
+    print(f"{name:<22}{str(outcomes):<44}p50 {np.percentile(ms, 50):>7.1f}ms  p95 {np.percentile(ms, 95):>7.1f}ms  "
+          f"circuit={client.breaker.state}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timeout', type=float, default=1.0)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--failures', type=int, default=3, help="consecutive failures that open the circuit")
+    parser.add_argument('--cooldown', type=float, default=2.0)
+    parser.add_argument('--requests', type=int, default=24)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    _, behaviour, base_url = start_stub()
+    client = GeminiClient(timeout=args.timeout, max_concurrency=args.concurrency, base_url=base_url,
+                          breaker=CircuitBreaker(args.failures, args.cooldown))
+    print(f"stub at {base_url}, timeout {args.timeout}s, {args.concurrency} concurrent calls max")
+
+    behaviour.latency_ms, behaviour.error_rate = 150, 0.0
+    client.generate("warm-up")  # client construction + first connection aren't part of the numbers
+    report("healthy", fire(client, args.requests, args.concurrency), client)
+    report("burst (3x slots)", fire(client, args.requests, args.concurrency * 3), client)
+
+    behaviour.latency_ms = args.timeout * 3000  # upstream hangs well past our timeout
+    report("slow upstream", fire(client, args.requests, args.concurrency), client)
+
+    behaviour.latency_ms, behaviour.error_rate = 50, 1.0
+    time.sleep(args.cooldown)
+    report("failing upstream", fire(client, args.requests, args.concurrency), client)
+
+    behaviour.error_rate = 0.0
+    time.sleep(args.cooldown)
+    report("recovered", fire(client, args.requests, args.concurrency), client)
+    print(f"upstream saw {behaviour.requests} requests; client stats: {client.stats()}")
+
+if __name__ == '__main__':
+    main()
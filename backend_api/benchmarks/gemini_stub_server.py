@@ -0,0 +1,120 @@
+"""
+Local stand-in for the Gemini generateContent / streamGenerateContent APIs that simulates
+latency, upstream errors and (for streams) a delay between chunked tokens.
+
+Run from backend_api/:
+    python -m benchmarks.gemini_stub_server --port 8090 --latency-ms 300 --error-rate 0.2 --token-ms 40
+
+then point the app at it:
+    GEMINI_BASE_URL=http://127.0.0.1:8090 GEMINI_API_KEY=stub python app.py
+
+`benchmarks.gemini_fallback_check` drives services/llm_client.py against it in-process.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubBehaviour:
+    """Mutable so a test can flip the stub between healthy, slow and failing while it runs."""
+
+    def __init__(self, latency_ms=100, jitter_ms=0, error_rate=0.0, error_status=503, token_ms=30):
+        self.latency_ms = latency_ms    # before the response (time to first token when streaming)
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token_ms = token_ms        # between streamed chunks
+        self.requests = 0
+        self.lock = threading.Lock()
+
+def _reply_text(payload):
+    try:
+        prompt = payload["contents"][0]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        prompt = ""
+    return f"[stub] Red claw crayfish answer to: {prompt[-80:]}"
+
+def make_handler(behaviour):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so the client's connection reuse is exercised
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode()
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client already gave up (timeout), which is the point of a slow stub
+
+        def _send_stream(self, text):
+            # Server-sent events, one chunk of a few words per event (what ?alt=sse returns)
+            words = text.split(" ")
+            chunks = [" ".join(words[i:i + 3]) + (" " if i + 3 < len(words) else "") for i in range(0, len(words), 3)]
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i, chunk in enumerate(chunks):
+                    if i: time.sleep(behaviour.token_ms / 1000)
+                    candidate = {"content": {"role": "model", "parts": [{"text": chunk}]}}
+                    if i == len(chunks) - 1: candidate["finishReason"] = "STOP"
+                    self.wfile.write(f"data: {json.dumps({'candidates': [candidate], 'modelVersion': 'stub'})}\r\n\r\n".encode())
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            self.close_connection = True
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            with behaviour.lock:
+                behaviour.requests += 1
+            time.sleep(max(0.0, behaviour.latency_ms + random.uniform(-behaviour.jitter_ms, behaviour.jitter_ms)) / 1000)
+
+            method = self.path.split("?")[0].rpartition(":")[2]
+            if method not in ("generateContent", "streamGenerateContent"):
+                return self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {self.path}", "status": "NOT_FOUND"}})
+            if random.random() < behaviour.error_rate:
+                return self._send_json(behaviour.error_status, {"error": {"code": behaviour.error_status, "message": "Stub upstream failure", "status": "UNAVAILABLE"}})
+            if method == "streamGenerateContent":
+                return self._send_stream(_reply_text(payload))
+            self._send_json(200, {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": _reply_text(payload)}]}, "finishReason": "STOP"}],
+                "modelVersion": "stub"
+            })
+    return Handler
+
+def start_stub(port=0, behaviour=None):
+    """Starts the stub in a background thread. Returns (server, behaviour, base_url)."""
+    behaviour = behaviour or StubBehaviour()
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(behaviour))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="gemini-stub", daemon=True).start()
+    return server, behaviour, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency-ms', type=float, default=100)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--token-ms', type=float, default=30, help="delay between streamed chunks")
+    args = parser.parse_args()
+
+    behaviour = StubBehaviour(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.token_ms)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(behaviour))
+    print(f"Gemini stub on http://127.0.0.1:{args.port} (latency {args.latency_ms}ms, error rate {args.error_rate:.0%})")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
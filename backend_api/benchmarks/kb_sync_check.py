@@ -0,0 +1,94 @@
+"""
+Checks the knowledge-base change feed (services/kb_sync.py) against interleaved writers.
+
+Run from backend_api/ (needs `pip install mongomock`):
+    python -m benchmarks.kb_sync_check
+
+Two KnowledgeSync instances stand in for two gunicorn workers sharing one (in-memory) Mongo.
+Each scenario writes changes in a given order, lets a worker poll, and checks that it ends up
+having applied every generation exactly once. Exits 1 if any scenario fails.
+"""
+import sys
+from datetime import datetime, timedelta
+import mongomock
+
+from config.db import mongo
+from services import kb_sync as ks
+
+def _fresh_db():
+    mongo.db = mongomock.MongoClient()["crayai_kb_sync_check"]
+
+def _worker():
+    return ks.KnowledgeSync(interval=0, watch=False)
+
+def _poll(worker):
+    """One sync_knowledge_index-style refresh. Returns the generations it applied."""
+    pending = worker.pending_changes()
+    if pending is None: return None
+    generations, _ = pending
+    for generation in generations:
+        worker.mark_applied(generation)
+    return generations
+
+def _age_changes(seconds):
+    mongo.db[ks.KB_CHANGES_COLLECTION].update_many({}, {'$set': {'at': datetime.utcnow() - timedelta(seconds=seconds)}})
+
+def own_write_after_old_foreign_write():
+    # B writes gen 1, which ages well past any lookback; A then writes gen 2 before it polls
+    a, b = _worker(), _worker()
+    b.record_change('doc-b', 'update')
+    _age_changes(3600)
+    a.record_change('doc-a', 'update')
+    applied = _poll(a)
+    return applied == [1] and a.generation == 2, f"applied {applied}, generation {a.generation}"
+
+def generation_in_flight():
+    # A allocates gen 1 but hasn't inserted its change yet when B commits gen 2 and C polls
+    b, c = _worker(), _worker()
+    meta = mongo.db[ks.KB_META_COLLECTION]
+    meta.update_one({'_id': ks._META_ID}, {'$inc': {'generation': 1}}, upsert=True)
+    b.record_change('doc-b', 'update')
+    first, held = _poll(c), c.generation
+    mongo.db[ks.KB_CHANGES_COLLECTION].insert_one({'generation': 1, 'doc_id': 'doc-a', 'op': 'update', 'at': datetime.utcnow()})
+    second = _poll(c)
+    ok = first == [2] and held == 0 and second == [1] and c.generation == 2
+    return ok, f"first {first} (held at {held}), second {second}, generation {c.generation}"
+
+def no_reapply():
+    a, b = _worker(), _worker()
+    for i in range(5):
+        (a if i % 2 else b).record_change(f'doc-{i}', 'update')
+    first, second = _poll(a), _poll(a)
+    return first == [1, 3, 5] and second == [] and a.generation == 5, f"first {first}, second {second}"
+
+def failed_local_apply_retries():
+    # A's own index update failed after its write committed: its next poll must pick the change up
+    a = _worker()
+    a.record_change('doc-a', 'update', applied=False)
+    applied = _poll(a)
+    return applied == [1] and a.generation == 1, f"applied {applied}, generation {a.generation}"
+
+def pruned_feed_rebuilds():
+    a, b = _worker(), _worker()
+    b.record_change('doc-1', 'update')
+    _poll(a)
+    b.record_change('doc-2', 'update')
+    b.record_change('doc-3', 'update')
+    mongo.db[ks.KB_CHANGES_COLLECTION].delete_many({'generation': {'$lte': 2}})
+    pending = a.pending_changes()
+    return pending is None, f"pending {pending}"
+
+SCENARIOS = (own_write_after_old_foreign_write, generation_in_flight, no_reapply, failed_local_apply_retries,
+             pruned_feed_rebuilds)
+
+def main():
+    failures = 0
+    for scenario in SCENARIOS:
+        _fresh_db()
+        ok, detail = scenario()
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {scenario.__name__:<36}{detail}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Load test for the Python API: /api/measure and /api/training/chatbot/ask, run in-process
+through the Flask test client against an in-memory Mongo (mongomock) and the local Gemini stub.
+
+Run from backend_api/ (needs `pip install mongomock`):
+    python -m benchmarks.load_test --save bench.json
+    python -m benchmarks.load_test --compare bench.json --tolerance 0.2   # exit 1 on regression
+
+Scenarios:
+    measure  ENVIRONMENT and OVERALL scans of synthetic tank photos at several sizes and
+             crayfish counts (the detector only runs if the .pt files are in ai_models/)
+    ask      chatbot questions against knowledge bases of several sizes with a given
+             share of questions that hit a stored answer (misses go to the Gemini stub)
+
+For each scenario it prints requests/s, p50/p95/p99 latency, errors and the RSS of this
+process (plus every inference-pool process with --pool). `--fake-embeddings` swaps the
+SentenceTransformer for a deterministic hashing encoder so the suite runs without the model.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+def _configure_env(args):
+    # Everything below is read at import time, so it has to be set before the app is imported
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/crayai_bench")
+    os.environ["INFERENCE_POOL"] = "1" if args.pool else "0"
+    os.environ["SCAN_CACHE"] = "0"                 # every request must do the real work
+    os.environ.setdefault("ANSWER_CACHE_BACKEND", "memory" if args.answer_cache else "off")
+    os.environ.setdefault("KB_WATCH", "0")
+    os.environ.setdefault("LOG_RETENTION_DAYS", "0")
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    os.environ.setdefault("METRICS_ENABLED", "1")
+
+def _patch_mongo():
+    """Points Flask-PyMongo at an in-memory mongomock database."""
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("benchmarks.load_test needs mongomock: pip install mongomock")
+    import flask_pymongo
+
+    # mongomock's bulk_write trips over newer pymongo UpdateOne objects; the app only bulk-writes
+    # UpdateOne, so replay them one by one
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        for op in requests:
+            self.update_one(op._filter, op._doc, upsert=op._upsert)
+    mongomock.collection.Collection.bulk_write = bulk_write
+
+    def init_app(self, app, uri=None, *args, **kwargs):
+        self.cx = mongomock.MongoClient()
+        self.db = self.cx["crayai_bench"]
+    flask_pymongo.PyMongo.init_app = init_app
+
+class HashingEncoder:
+    """Deterministic stand-in for the SentenceTransformer: hashed character trigrams, L2-normalised."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=True):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            text = f"  {text.lower()} "
+            for i in range(len(text) - 2):
+                out[row, zlib.crc32(text[i:i + 3].encode()) % self.dim] += 1.0
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-6)
+        return out
+
+# --- SYNTHETIC INPUTS ---
+TOPICS = ["feeding", "water temperature", "ph level", "moulting", "breeding", "tank size", "oxygen", "harvest"]
+
+def make_scan(rng, width, crayfish):
+    """A tank-like photo with a 2cm paper square and `crayfish` dark elongated bodies, as JPEG bytes."""
+    h, w = 600, 800
+    noise = rng.integers(60, 140, size=(h // 8, w // 8, 3), dtype=np.uint8)
+    img = cv2.resize(noise, (w, h), interpolation=cv2.INTER_CUBIC)
+    img[..., 1] = np.clip(img[..., 1].astype(np.int16) + 40, 0, 255)  # greenish water
+    side = int(rng.integers(50, 80))
+    x, y = int(rng.integers(20, w - side - 20)), int(rng.integers(20, h - side - 20))
+    cv2.rectangle(img, (x, y), (x + side, y + side), (245, 245, 245), -1)
+    cv2.rectangle(img, (x, y), (x + side, y + side), (15, 15, 15), 2)
+    for _ in range(crayfish):
+        center = (int(rng.integers(60, w - 60)), int(rng.integers(60, h - 60)))
+        axes = (int(rng.integers(15, 30)), int(rng.integers(50, 110)))
+        cv2.ellipse(img, center, axes, float(rng.uniform(0, 180)), 0, 360, (30, 40, 110), -1)
+    if width != w:
+        img = cv2.resize(img, (width, int(width * h / w)), interpolation=cv2.INTER_CUBIC)
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+def seed_knowledge(db, size, rng):
+    db["chatbot_knowledge"].delete_many({})
+    docs = [{
+        "query": f"How do I manage {TOPICS[i % len(TOPICS)]} for tank {i} with red claw crayfish batch {i * 7 % 1000}?",
+        "response": f"Stored answer {i}", "topic": TOPICS[i % len(TOPICS)], "status": "Approved"
+    } for i in range(size)]
+    db["chatbot_knowledge"].insert_many(docs)
+    return [doc["query"] for doc in docs]
+
+def make_questions(stored, count, hit_ratio, rng):
+    questions = []
+    for i in range(count):
+        if rng.random() < hit_ratio:
+            questions.append(stored[int(rng.integers(0, len(stored)))].upper())  # same question, different casing
+        else:
+            questions.append(f"Unrelated question {i} about weather forecasts number {int(rng.integers(0, 10**9))}")
+    return questions
+
+# --- MEASUREMENT ---
+def rss_mb(pid="self"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, Linux kB
+
+def pool_rss_mb():
+    from services.inference_pool import inference_pool
+    executor = getattr(inference_pool, "_executor", None)
+    processes = getattr(executor, "_processes", None) or {}
+    return [round(rss_mb(pid), 1) for pid in processes]
+
+def run_load(app, requests, concurrency):
+    """
+    Sends (path, make_kwargs) requests from `concurrency` threads (kwargs are built per call since
+    upload streams can only be read once). Returns (latencies_ms, errors, seconds).
+    """
+    def one(request_args):
+        path, make_kwargs = request_args
+        client = app.test_client()
+        kwargs = make_kwargs()
+        started = time.perf_counter()
+        response = client.post(path, **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, response.status_code >= 400 or not response.get_json(silent=True)
+
+    with contextlib.redirect_stdout(io.StringIO()):  # the pipeline's debug prints would drown the report
+        one(requests[0])  # untimed warm-up: lazy model loads and first connections aren't part of the numbers
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, requests))
+    seconds = time.perf_counter() - started
+    return np.array([r[0] for r in results]), sum(r[1] for r in results), seconds
+
+def summarize(name, latencies, errors, seconds):
+    row = {
+        "scenario": name, "requests": len(latencies), "rps": round(len(latencies) / seconds, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1), "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 1), "errors": int(errors), "rss_mb": round(rss_mb(), 1)
+    }
+    pool = pool_rss_mb()
+    if pool: row["pool_rss_mb"] = pool
+    print(f"{name:<34}{row['requests']:>6}{row['rps']:>9.1f}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+          f"{row['p99_ms']:>9.1f}{row['errors']:>7}{row['rss_mb']:>9.1f}{'  pool ' + str(pool) if pool else ''}")
+    return row
+
+def measure_scenarios(app, args, rng):
+    rows = []
+    for mode in ("ENVIRONMENT", "OVERALL"):
+        for width in args.image_widths:
+            for crayfish in (args.crayfish if mode == "OVERALL" else [0]):
+                photos = [make_scan(rng, width, crayfish) for _ in range(args.requests)]
+                requests = [("/api/measure?response=lite", lambda photo=photo, mode=mode: {
+                    "data": {"photo": (io.BytesIO(photo), "scan.jpg"), "mode": mode},
+                    "content_type": "multipart/form-data"
+                }) for photo in photos]
+                name = f"measure {mode.lower()} {width}px" + (f" x{crayfish}" if mode == "OVERALL" else "")
+                rows.append(summarize(name, *run_load(app, requests, args.concurrency)))
+    return rows
+
+def ask_scenarios(app, args, rng):
+    from config.db import mongo
+    import controllers.chatbot_controller as chatbot
+    from services.ai_engine import knowledge_index
+    rows = []
+    for kb_size in args.kb_sizes:
+        stored = seed_knowledge(mongo.db, kb_size, rng)
+        knowledge_index.ready = False
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            chatbot.ensure_knowledge_index()
+        print(f"{'  (index build ' + str(kb_size) + ' docs)':<34}{(time.perf_counter() - started) * 1000:>33.1f} ms")
+        for hit_ratio in args.hit_ratios:
+            questions = make_questions(stored, args.requests, hit_ratio, rng)
+            requests = [("/api/training/chatbot/ask", lambda q=q: {"json": {"question": q}}) for q in questions]
+            rows.append(summarize(f"ask kb={kb_size} hit={hit_ratio:.0%}", *run_load(app, requests, args.concurrency)))
+    return rows
+
+def compare(rows, baseline_path, tolerance):
+    """Flags scenarios whose p95 grew or throughput dropped by more than `tolerance`."""
+    with open(baseline_path) as f:
+        baseline = {row["scenario"]: row for row in json.load(f)["results"]}
+    regressions = []
+    for row in rows:
+        base = baseline.get(row["scenario"])
+        if not base: continue
+        if row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{row['scenario']}: p95 {base['p95_ms']} -> {row['p95_ms']} ms")
+        if row["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{row['scenario']}: throughput {base['rps']} -> {row['rps']} req/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', default=['measure', 'ask'], choices=['measure', 'ask'])
+    parser.add_argument('--requests', type=int, default=40, help="requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--image-widths', type=int, nargs='+', default=[800, 1920, 4000])
+    parser.add_argument('--crayfish', type=int, nargs='+', default=[1, 5])
+    parser.add_argument('--kb-sizes', type=int, nargs='+', default=[100, 2000])
+    parser.add_argument('--hit-ratios', type=float, nargs='+', default=[0.9, 0.5])
+    parser.add_argument('--gemini-latency-ms', type=float, default=300)
+    parser.add_argument('--pool', action='store_true', help="run scans in the inference process pool")
+    parser.add_argument('--answer-cache', action='store_true', help="leave the chatbot answer cache on")
+    parser.add_argument('--fake-embeddings', action='store_true')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--save', help="write the results as JSON (a baseline for --compare)")
+    parser.add_argument('--compare', help="baseline JSON from an earlier --save")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    _configure_env(args)
+    from benchmarks.gemini_stub_server import start_stub, StubBehaviour
+    _, _, base_url = start_stub(behaviour=StubBehaviour(latency_ms=args.gemini_latency_ms))
+    os.environ["GEMINI_BASE_URL"] = base_url
+    _patch_mongo()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+        import controllers.measurement_controller as measurement
+        from services.model_registry import model_registry
+    measurement.DEBUG_MODE = False
+    if args.fake_embeddings:
+        model_registry.register("embedding", HashingEncoder)
+    missing = [name for name, path in (("crayfish", measurement.MODEL_PATH), ("gender", measurement.GENDER_MODEL_PATH),
+                                       ("environment", measurement.ENV_MODEL_PATH)) if not os.path.exists(path)]
+    if missing and 'measure' in args.scenarios:
+        print(f"⚠️ Model files missing ({', '.join(missing)}): those stages are skipped in the scan numbers")
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'scenario':<34}{'reqs':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>7}{'rss MB':>9}")
+    rows = []
+    if 'measure' in args.scenarios: rows += measure_scenarios(app, args, rng)
+    if 'ask' in args.scenarios: rows += ask_scenarios(app, args, rng)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"args": vars(args), "python": sys.version.split()[0], "results": rows}, f, indent=2)
+        print(f"Saved {len(rows)} scenario(s) to {args.save}")
+    if args.compare:
+        regressions = compare(rows, args.compare, args.tolerance)
+        for line in regressions: print(f"❌ {line}")
+        if regressions: raise SystemExit(1)
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+if __name__ == '__main__':
+    main()
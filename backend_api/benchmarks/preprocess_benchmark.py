@@ -0,0 +1,77 @@
+"""
+Microbenchmark for the scan preprocessing stage: the original separate decode/resize/HSV/threshold
+passes versus the fused path (reduced-resolution JPEG decode + one shared preprocessing pass).
+
+Run from backend_api/:
+    python -m benchmarks.preprocess_benchmark --width 4000 --height 3000 --runs 20
+
+Both paths stop at the products the downstream stages consume (green mask + threshold image);
+contour analysis is the same afterwards and is left out. Reports mean time per image and the
+peak Python-visible memory (numpy buffers, via tracemalloc).
+"""
+import argparse
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+from controllers.measurement_controller import decode_image, preprocess, MAX_IMAGE_SIZE, LOWER_GREEN, UPPER_GREEN
+
+def make_photo(width, height, rng):
+    """Tank-ish photo: noisy background, some algae green, a few paper squares."""
+    noise = rng.integers(60, 200, size=(height // 8, width // 8, 3), dtype=np.uint8)
+    img = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+    img[int(height * 0.7):, :, 1] = 170
+    side = width // 10
+    for i in range(3):
+        x = width // 8 + i * 2 * side
+        cv2.rectangle(img, (x, height // 4), (x + side, height // 4 + side), (255, 255, 255), -1)
+        cv2.rectangle(img, (x, height // 4), (x + side, height // 4 + side), (0, 0, 0), 6)
+    _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 92])
+    return buffer.tobytes()
+
+def legacy(file_bytes):
+    img = cv2.imdecode(np.frombuffer(file_bytes, np.uint8), cv2.IMREAD_COLOR)
+    h, w = img.shape[:2]
+    if max(h, w) > MAX_IMAGE_SIZE:
+        scale = MAX_IMAGE_SIZE / max(h, w)
+        img = cv2.resize(img, (int(w * scale), int(h * scale)))
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, LOWER_GREEN, UPPER_GREEN)
+    cv2.countNonZero(mask)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
+
+def fused(file_bytes):
+    img = decode_image(file_bytes)
+    prep = preprocess(img)
+    cv2.countNonZero(prep.green_mask)
+
+def measure(fn, payload, runs):
+    fn(payload)  # warm-up (also allocates the reusable buffers)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn(payload)
+    elapsed = (time.perf_counter() - start) / runs * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    payload = make_photo(args.width, args.height, np.random.default_rng(0))
+    print(f"{args.width}x{args.height} JPEG ({len(payload) / 1024:.0f} KB), {args.runs} runs")
+    print(f"{'path':<10}{'ms/image':>10}{'peak MB':>10}")
+    for name, fn in (("legacy", legacy), ("fused", fused)):
+        ms, peak = measure(fn, payload, args.runs)
+        print(f"{name:<10}{ms:>10.1f}{peak:>10.1f}")
+
+if __name__ == '__main__':
+    main()
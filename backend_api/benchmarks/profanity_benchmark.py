@@ -0,0 +1,87 @@
+"""
+Compares services/profanity_filter.py (one compiled regex) with better_profanity's
+contains_profanity on the same wordlist.
+
+Run from backend_api/:
+    python -m benchmarks.profanity_benchmark --clean 2000 --seed 7
+
+The corpus is every wordlist term in a few question templates, leetspeak / upper-case /
+split-across-words variants of each, and clean crayfish-farming questions (including words
+that merely contain a term, e.g. "assess", "Scunthorpe"). Reports the agreement between the
+two matchers, lists every disagreement, and the per-query latency of each.
+"""
+import argparse
+import random
+import time
+import numpy as np
+from better_profanity import profanity
+from better_profanity.utils import get_complete_path_of_file, read_wordlist
+
+from services.profanity_filter import ProfanityFilter, LEET_MAP
+
+TEMPLATES = ["{w}", "why is my {w} crayfish red?", "{w} tank", "my {w}s keep dying", "is it ok to say {w}?"]
+CLEAN_WORDS = (
+    "how often should i feed my red claw crayfish in a glass tank while it is molting "
+    "what temperature ph and hardness does the water need can juveniles share with shrimp "
+    "assess class assume bass grass scunthorpe cocktail shitake therapist analysis sussex "
+    "hatchlings berried female pellets algae filter aeration it's they'll don't"
+).split()
+
+def leet(word, rng):
+    return "".join(rng.choice(LEET_MAP[c]) if c in LEET_MAP and rng.random() < 0.5 else c for c in word)
+
+def make_corpus(words, clean, rng):
+    texts = []
+    for w in words:
+        texts += [t.format(w=w) for t in TEMPLATES]
+        texts += [leet(w.lower(), rng), w.upper(), f"what about {w[:len(w) // 2]} {w[len(w) // 2:]} now"]
+    texts += [" ".join(rng.choice(CLEAN_WORDS) for _ in range(rng.randint(4, 14))).capitalize() + "?" for _ in range(clean)]
+    return texts
+
+def time_per_query(fn, texts, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for text in texts:
+            started = time.perf_counter()
+            fn(text)
+            latencies.append((time.perf_counter() - started) * 1e6)
+    return np.array(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clean', type=int, default=2000, help="clean questions in the corpus")
+    parser.add_argument('--timing-sample', type=int, default=2000, help="queries timed per matcher")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = list(read_wordlist(get_complete_path_of_file("profanity_wordlist.txt")))
+    started = time.perf_counter()
+    compiled = ProfanityFilter(words)
+    build_ms = (time.perf_counter() - started) * 1000
+    profanity.load_censor_words(words)
+
+    texts = make_corpus(words, args.clean, rng)
+    disagreements = []
+    for text in texts:
+        expected, got = profanity.contains_profanity(text), compiled.contains_profanity(text)
+        if expected != got: disagreements.append((text, expected, got))
+    agreement = 1 - len(disagreements) / len(texts)
+    print(f"{len(words)} wordlist terms, {len(texts)} queries, compiled in {build_ms:.0f}ms "
+          f"({len(compiled.pattern.pattern) / 1000:.0f}k chars of regex)")
+    print(f"agreement with better_profanity: {agreement:.2%} ({len(disagreements)} disagreements)")
+    for text, expected, got in disagreements:
+        print(f"  better_profanity={expected!s:<5} compiled={got!s:<5} {text!r}  -> {compiled.find(text)!r}")
+
+    sample = rng.sample(texts, min(args.timing_sample, len(texts)))
+    print(f"\n{'matcher':<20}{'p50 us':>10}{'p99 us':>10}{'mean us':>10}")
+    means = {}
+    for name, fn in (("better_profanity", profanity.contains_profanity), ("compiled", compiled.contains_profanity)):
+        latencies = time_per_query(fn, sample, args.repeat)
+        means[name] = latencies.mean()
+        print(f"{name:<20}{np.percentile(latencies, 50):>10.1f}{np.percentile(latencies, 99):>10.1f}{latencies.mean():>10.1f}")
+    print(f"speed-up: {means['better_profanity'] / means['compiled']:.0f}x")
+
+if __name__ == '__main__':
+    main()
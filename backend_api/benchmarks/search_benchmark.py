@@ -0,0 +1,71 @@
+"""
+Compares the chatbot search backends (exact matmul vs. IVF) on a synthetic corpus.
+
+Run from backend_api/:
+    python -m benchmarks.search_benchmark --size 50000 --nprobe 4 8 16
+
+Reports recall@1 against the exact backend plus p50/p99 latency per query.
+No model or database is needed: the corpus is clustered random unit vectors,
+which behaves much like sentence embeddings of many similar farm questions.
+"""
+import argparse
+import time
+import numpy as np
+
+from services.ai_engine import ExactSearch, IVFSearch
+
+def make_corpus(size, dim, topics, rng):
+    centers = rng.normal(size=(topics, dim)).astype(np.float32)
+    rows = centers[rng.integers(0, topics, size)] + 0.6 * rng.normal(size=(size, dim)).astype(np.float32)
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+    return np.ascontiguousarray(rows, dtype=np.float32)
+
+def make_queries(matrix, count, rng):
+    # Paraphrase-like queries: a stored question plus some noise
+    picks = matrix[rng.integers(0, len(matrix), count)]
+    queries = picks + 0.05 * rng.normal(size=picks.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def run(backend, matrix, queries):
+    latencies, winners = [], []
+    for q in queries:
+        start = time.perf_counter()
+        positions, _ = backend.search(matrix, q, 1)
+        latencies.append((time.perf_counter() - start) * 1000)
+        winners.append(int(positions[0]))
+    return np.array(winners), np.array(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--topics', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--nlist', type=int, default=0)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = make_corpus(args.size, args.dim, args.topics, rng)
+    queries = make_queries(matrix, args.queries, rng)
+
+    exact = ExactSearch()
+    truth, exact_ms = run(exact, matrix, queries)
+    print(f"Corpus: {args.size} x {args.dim}, {args.queries} queries")
+    print(f"{'backend':<18}{'recall@1':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    print(f"{'exact':<18}{1.0:>10.3f}{np.percentile(exact_ms, 50):>10.3f}{np.percentile(exact_ms, 99):>10.3f}")
+
+    ivf = IVFSearch(nlist=args.nlist, min_size=1)
+    start = time.perf_counter()
+    ivf.fit(matrix)
+    print(f"(IVF trained {len(ivf.centroids)} clusters in {time.perf_counter() - start:.2f}s)")
+
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        winners, ivf_ms = run(ivf, matrix, queries)
+        recall = float(np.mean(winners == truth))
+        label = f"ivf nprobe={nprobe}"
+        print(f"{label:<18}{recall:>10.3f}{np.percentile(ivf_ms, 50):>10.3f}{np.percentile(ivf_ms, 99):>10.3f}")
+
+if __name__ == '__main__':
+    main()
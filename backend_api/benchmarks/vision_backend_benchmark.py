@@ -0,0 +1,120 @@
+"""
+Compares the PyTorch (.pt) YOLO models against an exported CPU runtime on a local image set.
+
+Run from backend_api/:
+    python -m benchmarks.vision_backend_benchmark --images ./sample_scans --backend onnx
+    python -m benchmarks.vision_backend_benchmark --images ./sample_scans --backend openvino --int8
+    python -m benchmarks.vision_backend_benchmark --images ./sample_crops --backend pytorch --gender-imgsz 320
+
+For each of the crayfish, environment and gender models it reports p50/p95 latency
+per image for both paths plus how often they agree (same top class for classifiers,
+matched boxes with IoU >= 0.5 and the same class for detectors). The reference always runs the
+gender model at its trained size; --gender-imgsz runs the candidate at a smaller one, which is the
+check to pass before setting GENDER_INPUT_SIZE.
+"""
+import argparse
+import glob
+import os
+import time
+import cv2
+import numpy as np
+
+from controllers.measurement_controller import (
+    load_yolo, letterbox, model_input_size, MODEL_PATH, GENDER_MODEL_PATH, ENV_MODEL_PATH, MAX_IMAGE_SIZE
+)
+
+def load_images(folder, limit):
+    paths = sorted(p for ext in ("jpg", "jpeg", "png") for p in glob.glob(os.path.join(folder, f"*.{ext}")))
+    images = []
+    for path in paths[:limit]:
+        img = cv2.imread(path)
+        if img is None: continue
+        h, w = img.shape[:2]
+        if max(h, w) > MAX_IMAGE_SIZE:
+            scale = MAX_IMAGE_SIZE / max(h, w)
+            img = cv2.resize(img, (int(w * scale), int(h * scale)))
+        images.append(img)
+    return images
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def summarize(result):
+    """Reduces a YOLO result to something comparable across backends."""
+    if getattr(result, 'probs', None) is not None:
+        return ("cls", int(result.probs.top1))
+    boxes = result.boxes if getattr(result, 'boxes', None) is not None else []
+    return ("det", [(int(b.cls[0]), b.xyxy[0].tolist()) for b in boxes])
+
+def agreement(ref, alt):
+    if ref[0] == "cls":
+        return float(ref[1] == alt[1])
+    ref_boxes, alt_boxes = ref[1], list(alt[1])
+    if not ref_boxes and not alt_boxes: return 1.0
+    matched = 0
+    for cls, box in ref_boxes:
+        best = max(((iou(box, b), j) for j, (c, b) in enumerate(alt_boxes) if c == cls), default=(0, None))
+        if best[0] >= 0.5:
+            matched += 1
+            alt_boxes.pop(best[1])
+    # Matched boxes over everything either side found (unmatched alt boxes are left in alt_boxes)
+    return matched / (len(ref_boxes) + len(alt_boxes))
+
+def run(model, images, **kwargs):
+    latencies, summaries = [], []
+    model.predict(source=images[0], verbose=False, **kwargs)  # warm-up
+    for img in images:
+        start = time.perf_counter()
+        result = model.predict(source=img, verbose=False, **kwargs)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        summaries.append(summarize(result))
+    return np.array(latencies), summaries
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--images', required=True, help="folder of tank/crayfish photos")
+    parser.add_argument('--backend', default='onnx', choices=['onnx', 'openvino', 'pytorch'])
+    parser.add_argument('--int8', action='store_true')
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--gender-imgsz', type=int, default=0, help="candidate gender input size (0 = trained size)")
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    label = f"{args.backend}{' int8' if args.int8 else ''}{f' gender@{args.gender_imgsz}' if args.gender_imgsz else ''}"
+    print(f"{len(images)} images, pytorch vs {label}")
+    print(f"{'model':<12}{'pt p50':>9}{'pt p95':>9}{'alt p50':>9}{'alt p95':>9}{'speedup':>9}{'agree':>8}")
+
+    for name, path, conf in (("crayfish", MODEL_PATH, 0.6), ("environment", ENV_MODEL_PATH, 0.4), ("gender", GENDER_MODEL_PATH, 0.4)):
+        reference = load_yolo(path, backend="pytorch")
+        try:
+            # strict: a failed export must stop the run, not quietly benchmark PyTorch against itself
+            candidate = load_yolo(path, backend=args.backend, int8=args.int8, strict=True)
+        except Exception as e:
+            raise SystemExit(f"{name}: could not load the {label} model ({e})")
+        if not reference or not candidate:
+            print(f"{name:<12}(model file missing)")
+            continue
+        ref_inputs = alt_inputs = images
+        ref_kwargs, alt_kwargs = {"conf": conf}, {"conf": conf}
+        if name == "gender":
+            # Gender crops are letterboxed squares, as in classify_genders
+            ref_size = model_input_size(reference)
+            alt_size = args.gender_imgsz or ref_size
+            ref_inputs, alt_inputs = [letterbox(img, ref_size) for img in images], [letterbox(img, alt_size) for img in images]
+            ref_kwargs["imgsz"], alt_kwargs["imgsz"] = ref_size, alt_size
+        ref_ms, ref_out = run(reference, ref_inputs, **ref_kwargs)
+        alt_ms, alt_out = run(candidate, alt_inputs, **alt_kwargs)
+        agree = np.mean([agreement(r, a) for r, a in zip(ref_out, alt_out)])
+        speedup = np.median(ref_ms) / np.median(alt_ms)
+        print(f"{name:<12}{np.percentile(ref_ms, 50):>9.1f}{np.percentile(ref_ms, 95):>9.1f}"
+              f"{np.percentile(alt_ms, 50):>9.1f}{np.percentile(alt_ms, 95):>9.1f}{speedup:>8.2f}x{agree:>8.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from config.db import mongo
 from bson.objectid import ObjectId
 from datetime import datetime
-from services.ai_engine import find_best_match 
-from better_profanity import profanity
+from pymongo import UpdateOne, DESCENDING
+from services.ai_engine import find_best_match, knowledge_index, embedding_batcher, EMBEDDING_MODEL_NAME
+from services.answer_cache import answer_cache, normalize_query
+from services.metrics import span, timed, observe
+from services.llm_client import gemini_client
+from services.kb_sync import kb_sync
+from services.chat_logs import LOGS_COLLECTION, log_writer, archive_old_logs, time_window, encode_cursor, cursor_filter
+from services.profanity_filter import profanity_filter
+import json
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,26 +22,208 @@ chatbot_bp = Blueprint('chatbot_bp', __name__)
 
 # COLLECTION NAMES
 COLLECTION = 'chatbot_knowledge'
-LOGS_COLLECTION = 'chatbot_logs'
+
+_index_build_lock = threading.Lock()
+_index_refresh_lock = threading.Lock()
+
+# =========================================================
+# KNOWLEDGE INDEX HELPERS
+# =========================================================
+def _embedding_fields(embedding):
+    return {"embedding": embedding.tolist(), "embedding_model": EMBEDDING_MODEL_NAME}
+
+def ensure_knowledge_index():
+    """Builds the in-memory embedding index once per worker, saving any new embeddings back to Mongo."""
+    if knowledge_index.ready:
+        return
+    with _index_build_lock:
+        if knowledge_index.ready:
+            return
+        # Read the generation first: anything written during the scan is re-applied by the next refresh
+        generation = kb_sync.current_generation()
+        docs = mongo.db[COLLECTION].find(
+            {"status": "Approved"},
+            {"query": 1, "response": 1, "topic": 1, "embedding": 1, "embedding_model": 1}
+        )
+        fresh = knowledge_index.build(docs)
+        if fresh:
+            mongo.db[COLLECTION].bulk_write([
+                UpdateOne({'_id': ObjectId(doc_id)}, {'$set': _embedding_fields(vec)})
+                for doc_id, vec in fresh.items()
+            ], ordered=False)
+        kb_sync.mark_built(generation)
+        print(f"📚 Knowledge index ready: {len(knowledge_index)} entries ({len(fresh)} newly embedded, generation {generation})")
+
+def _apply_changes(doc_ids):
+    """Re-reads only the changed docs and patches them into (or out of) this worker's index."""
+    docs = {str(doc['_id']): doc for doc in mongo.db[COLLECTION].find(
+        {'_id': {'$in': [ObjectId(doc_id) for doc_id in doc_ids]}},
+        {"query": 1, "response": 1, "topic": 1, "status": 1, "embedding": 1, "embedding_model": 1}
+    )}
+    fresh = []
+    for doc_id in doc_ids:
+        doc = docs.get(doc_id)
+        if doc is None or doc.get('status') != 'Approved' or not doc.get('query'):
+            knowledge_index.remove(doc_id)
+            continue
+        stored = knowledge_index.stored_embedding(doc)
+        embedding = knowledge_index.upsert(doc, embedding=stored)
+        if stored is None: fresh.append(UpdateOne({'_id': doc['_id']}, {'$set': _embedding_fields(embedding)}))
+    if fresh:
+        mongo.db[COLLECTION].bulk_write(fresh, ordered=False)
+
+def sync_knowledge_index():
+    """
+    Ask-path entry point: builds the index on first use, then picks up edits made by other
+    workers from the change feed (only the changed docs are read, at most every KB_SYNC_INTERVAL_S).
+    """
+    ensure_knowledge_index()
+    if not kb_sync.due() or not _index_refresh_lock.acquire(blocking=False):
+        return  # another thread is already refreshing; answer from the current index
+    try:
+        pending = kb_sync.pending_changes()
+        if pending is None:
+            # Fell behind the pruned change feed: start over from a full read
+            kb_sync.rebuilds += 1
+            knowledge_index.ready = False
+            ensure_knowledge_index()
+            _invalidate_answers()
+            return
+        generations, doc_ids = pending
+        if doc_ids:
+            _apply_changes(doc_ids)
+            _invalidate_answers()
+            kb_sync.refreshes += 1
+            kb_sync.docs_refreshed += len(doc_ids)
+        for generation in generations:
+            kb_sync.mark_applied(generation)
+    except Exception as e:
+        print(f"⚠️ Knowledge index refresh failed: {e}")
+    finally:
+        _index_refresh_lock.release()
+
+def _sync_index(doc_id, doc):
+    """Keeps the index (and the embedding stored on the doc) in step with a create/update."""
+    if not knowledge_index.ready:
+        return  # The first build will pick the change up from Mongo
+    if doc.get('status') != 'Approved':
+        knowledge_index.remove(doc_id)
+        return
+    embedding = knowledge_index.upsert({**doc, '_id': doc_id})
+    mongo.db[COLLECTION].update_one({'_id': ObjectId(doc_id)}, {'$set': _embedding_fields(embedding)})
+
+def _publish_change(doc_id, op, doc=None):
+    """
+    After a committed knowledge write: record it in the change feed and drop cached answers first,
+    so other workers hear of it even if this worker's own index update (an embed) then fails.
+    That update is best-effort; if it fails, this worker's next sync re-reads the doc.
+    """
+    generation = kb_sync.record_change(doc_id, op, applied=False)
+    _invalidate_answers()
+    try:
+        if doc is None:
+            knowledge_index.remove(doc_id)
+        else:
+            _sync_index(doc_id, doc)
+        kb_sync.mark_applied(generation)
+    except Exception as e:
+        print(f"⚠️ Knowledge index update for {doc_id} failed, the next sync retries it: {e}")
+
+def _log_interaction(entry):
+    # Async by default: the record is queued and written in a batch off the request path
+    with span("chatbot.mongo_log"):
+        log_writer.write(entry)
+
+def _invalidate_answers():
+    """Any knowledge base edit can change which answer a question should get."""
+    try:
+        answer_cache.clear()
+    except Exception as e:
+        print(f"Answer Cache Error: {e}")
+
+def _cached_answer(cache_key):
+    if not cache_key:
+        return None
+    try:
+        return answer_cache.get(cache_key)
+    except Exception as e:
+        print(f"Answer Cache Error: {e}")
+        return None
+
+def _cache_answer(cache_key, body, log_fields):
+    if not cache_key:
+        return
+    try:
+        answer_cache.set(cache_key, {"body": body, "log": log_fields})
+    except Exception as e:
+        print(f"Answer Cache Error: {e}")
 
 # =========================================================
-# 1. READ (GET) - Fetch all Q&A pairs
+# 1. READ (GET) - Fetch Q&A pairs (paginated, or streamed as NDJSON)
 # =========================================================
+QA_FIELDS = ('query', 'response', 'topic', 'status', 'created_at')
+QA_EXPORT_BATCH = int(os.environ.get('QA_EXPORT_BATCH', 500))
+
+def setup_qa_indexes():
+    """Startup hook: topic/status filters walk these in _id order, so every page is an index range scan."""
+    try:
+        collection = mongo.db[COLLECTION]
+        collection.create_index([('topic', 1), ('_id', DESCENDING)], name='topic_id')
+        collection.create_index([('status', 1), ('_id', DESCENDING)], name='status_id')
+    except Exception as e:
+        print(f"⚠️ Q&A index setup failed: {e}")
+
+def _limit_param(default=100):
+    """?limit= clamped to 1-500; ValueError (a 400) when it isn't a number."""
+    value = request.args.get('limit')
+    if not value: return default
+    try:
+        return min(max(int(float(value)), 1), 500)
+    except (ValueError, OverflowError):
+        raise ValueError("limit must be a number") from None
+
+def _qa_query(args):
+    """
+    Filter (?topic=, ?status=, ?cursor=) and projection (?fields=query,topic) for a listing.
+    Raises ValueError on a malformed cursor.
+    """
+    query = {key: args[key] for key in ('topic', 'status') if args.get(key)}
+    # ?cursor= (from the previous page's X-Next-Cursor header) continues after that _id
+    if args.get('cursor'):
+        if not ObjectId.is_valid(args['cursor']):
+            raise ValueError("cursor is not valid (use the X-Next-Cursor of the previous page)")
+        query['_id'] = {'$lt': ObjectId(args['cursor'])}
+    fields = [f for f in (args.get('fields') or '').split(',') if f in QA_FIELDS] or QA_FIELDS
+    return query, {field: 1 for field in fields}
+
+def _qa_record(doc, projection):
+    doc['_id'] = str(doc['_id'])
+    for field in projection: doc.setdefault(field, None)
+    return doc
+
 @chatbot_bp.route('/', methods=['GET'], strict_slashes=False)
 def get_qa_pairs():
     try:
-        cursor = mongo.db[COLLECTION].find().sort('_id', -1)
-        results = []
-        for doc in cursor:
-            results.append({
-                '_id': str(doc['_id']),
-                'query': doc.get('query'),
-                'response': doc.get('response'),
-                'topic': doc.get('topic'),
-                'status': doc.get('status'),
-                'created_at': doc.get('created_at')
-            })
-        return jsonify(results), 200
+        query, projection = _qa_query(request.args)
+        limit = _limit_param()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        cursor = mongo.db[COLLECTION].find(query, projection).sort('_id', DESCENDING)
+
+        # ?format=ndjson: the whole (filtered) collection, one JSON document per line as it comes off the cursor
+        if request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', ''):
+            dumps = current_app.json.dumps
+            rows = (dumps(_qa_record(doc, projection)) + '\n' for doc in cursor.batch_size(QA_EXPORT_BATCH))
+            return Response(stream_with_context(rows), mimetype='application/x-ndjson')
+
+        # No ?limit=/?cursor=: the whole list, as the Training admin page expects
+        if not request.args.get('limit') and not request.args.get('cursor'):
+            return jsonify([_qa_record(doc, projection) for doc in cursor]), 200
+
+        results = [_qa_record(doc, projection) for doc in cursor.limit(limit)]
+        headers = {"X-Next-Cursor": results[-1]['_id']} if len(results) == limit else {}
+        return jsonify(results), 200, headers
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -56,6 +247,7 @@ def add_qa_pair():
 
         result = mongo.db[COLLECTION].insert_one(new_entry)
         new_entry['_id'] = str(result.inserted_id)
+        _publish_change(new_entry['_id'], 'insert', new_entry)
         
         return jsonify(new_entry), 201
     except Exception as e:
@@ -75,10 +267,14 @@ def update_qa_pair(id):
             "status": data['status'],
             "updated_at": datetime.utcnow()
         }
-        mongo.db[COLLECTION].update_one(
+        # The query text may have changed, so drop the stored embedding with the same write
+        result = mongo.db[COLLECTION].update_one(
             {'_id': ObjectId(id)},
-            {'$set': update_fields}
+            {'$set': update_fields, '$unset': {"embedding": "", "embedding_model": ""}}
         )
+        if result.matched_count == 0:
+            return jsonify({"error": "Item not found"}), 404
+        _publish_change(id, 'update', update_fields)
         update_fields['_id'] = id
         return jsonify(update_fields), 200
     except Exception as e:
@@ -93,6 +289,7 @@ def delete_qa_pair(id):
         result = mongo.db[COLLECTION].delete_one({'_id': ObjectId(id)})
         if result.deleted_count == 0:
             return jsonify({"error": "Item not found"}), 404
+        _publish_change(id, 'delete')
         return jsonify({"message": "Deleted successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -100,109 +297,213 @@ def delete_qa_pair(id):
 # =========================================================
 # 5. ASK (AI SEARCH) - The "Chat" Endpoint
 # =========================================================
+FAIL_RESPONSE = "I'm sorry, my local database doesn't know this, and I couldn't reach my cloud brain right now."
+
+def _local_answer(user_query, cache_key):
+    """
+    Answers a question without Gemini when possible: cached answer, profanity refusal or a
+    knowledge-base match (each logged, and cached where it applies). None means "ask Gemini".
+    """
+    # 🔄 0. KB SYNC first: edits from other workers must invalidate cached answers before a lookup
+    index_ok = True
+    try:
+        with span("chatbot.index_build"):
+            sync_knowledge_index()
+    except Exception as e:
+        print(f"Knowledge index sync error: {e}")
+        index_ok = False
+
+    # ⚡ 1. ANSWER CACHE (repeat questions skip the whole pipeline, but are still logged)
+    with span("chatbot.cache"):
+        cached = _cached_answer(cache_key)
+    if cached:
+        _log_interaction({
+            "query": user_query,
+            "response": cached['body']['response'],
+            **cached['log'],
+            "timestamp": datetime.utcnow()
+        })
+        return cached['body']
+
+    # 🚨 2. SAFETY CHECK (Profanity)
+    with span("chatbot.profanity"):
+        is_profane = profanity_filter.contains_profanity(user_query)
+    if is_profane:
+        response_text = "I cannot answer that. Please be respectful."
+        _log_interaction({
+            "query": user_query,
+            "response": response_text,
+            "status": "Flagged",
+            "reason": "Offensive Content",
+            "timestamp": datetime.utcnow()
+        })
+        body = {
+            "response": response_text,
+            "topic": "System",
+            "confidence": "Low",
+            "is_flagged": True
+        }
+        _cache_answer(cache_key, body, {"status": "Flagged", "reason": "Offensive Content"})
+        return body
+
+    # 🔍 3. AI MATCHING (against the precomputed embedding index)
+    if not index_ok:
+        return None
+    match = None
+    try:
+        with span("chatbot.match"):
+            match = find_best_match(user_query)
+    except Exception as e:
+        print(f"Local AI Match Error: {e}")
+        match = None
+    if not match:
+        return None
+
+    # ✅ 4. SUCCESS QUERY (Local Match)
+    match_id_str = str(match['_id'])
+
+    _log_interaction({
+        "query": user_query,
+        "response": match['response'],
+        "status": "Success",
+        "match_id": match_id_str,
+        "timestamp": datetime.utcnow()
+    })
+
+    body = {
+        "response": match['response'],
+        "topic": match.get('topic'),
+        "confidence": "High"
+    }
+    _cache_answer(cache_key, body, {"status": "Success", "match_id": match_id_str})
+    return body
+
+def _gemini_prompt(user_query):
+    return f"You are CrayAI, an expert assistant for Australian Red Claw crayfish. Answer this question concisely: {user_query}"
+
+def _gemini_answered(user_query, cache_key, gemini_text):
+    # Log the Gemini interaction
+    _log_interaction({
+        "query": user_query,
+        "response": gemini_text,
+        "status": "Success (Gemini)",
+        "reason": "Answered via Gemini API",
+        "timestamp": datetime.utcnow()
+    })
+
+    body = {
+        "response": gemini_text,
+        "topic": "Gemini AI",
+        "confidence": "High"
+    }
+    _cache_answer(cache_key, body, {"status": "Success (Gemini)", "reason": "Answered via Gemini API"})
+    return body
+
+def _gemini_failed(user_query, gemini_err, partial_text=""):
+    print(f"Gemini Error: {gemini_err}")
+
+    # Log the failed interaction if Gemini also fails (with whatever had already streamed out)
+    entry = {
+        "query": user_query,
+        "response": FAIL_RESPONSE,
+        "status": "Failed",
+        "reason": f"Local DB Miss & Gemini Error: {str(gemini_err)}",
+        "timestamp": datetime.utcnow()
+    }
+    if partial_text: entry["partial_response"] = partial_text
+    _log_interaction(entry)
+
+    return {
+        "response": FAIL_RESPONSE,
+        "topic": "System",
+        "confidence": "Low"
+    }
+
 @chatbot_bp.route('/ask', methods=['POST'])
+@timed("chatbot.ask")
 def ask_chatbot():
     try:
         user_query = request.json.get('question')
         if not user_query:
             return jsonify({"error": "No question provided"}), 400
 
-        # 🚨 1. SAFETY CHECK (Profanity)
-        if profanity.contains_profanity(user_query):
-            response_text = "I cannot answer that. Please be respectful."
-            mongo.db[LOGS_COLLECTION].insert_one({
-                "query": user_query,
-                "response": response_text,
-                "status": "Flagged",
-                "reason": "Offensive Content",
-                "timestamp": datetime.utcnow()
-            })
-            return jsonify({
-                "response": response_text,
-                "topic": "System",
-                "confidence": "Low",
-                "is_flagged": True
-            }), 200
-
-        # 🔍 2. AI MATCHING
-        cursor = mongo.db[COLLECTION].find({"status": "Approved"})
-        approved_data = list(cursor)
+        cache_key = normalize_query(user_query)
+        body = _local_answer(user_query, cache_key)
+        if body:
+            return jsonify(body), 200
 
-        match = None
-        if len(approved_data) > 0:
-            try:
-                match = find_best_match(user_query, approved_data)
-            except Exception as e:
-                print(f"Local AI Match Error: {e}")
-                match = None
-
-        # ❌ 3. FAILED LOCAL QUERY -> FALLBACK TO GEMINI
-        if not match:
-            print("Local DB missed or empty. Asking Gemini...")
-            try:
-                # ✅ LAZY LOAD GEMINI ONLY WHEN NEEDED
-                from google import genai
-                gemini_client = genai.Client()
-                
-                # Ask Gemini 2.5 Flash
-                gemini_response = gemini_client.models.generate_content(
-                    model='gemini-2.5-flash',
-                    contents=f"You are CrayAI, an expert assistant for Australian Red Claw crayfish. Answer this question concisely: {user_query}"
-                )
-                
-                # Log the Gemini interaction
-                mongo.db[LOGS_COLLECTION].insert_one({
-                    "query": user_query,
-                    "response": gemini_response.text,
-                    "status": "Success (Gemini)",
-                    "reason": "Answered via Gemini API",
-                    "timestamp": datetime.utcnow()
-                })
-
-                return jsonify({
-                    "response": gemini_response.text,
-                    "topic": "Gemini AI",
-                    "confidence": "High"
-                }), 200
-
-            except Exception as gemini_err:
-                print(f"Gemini Error: {gemini_err}")
-                
-                # Log the failed interaction if Gemini also fails
-                fail_response = "I'm sorry, my local database doesn't know this, and I couldn't reach my cloud brain right now."
-                mongo.db[LOGS_COLLECTION].insert_one({
-                    "query": user_query,
-                    "response": fail_response,
-                    "status": "Failed",
-                    "reason": f"Local DB Miss & Gemini Error: {str(gemini_err)}",
-                    "timestamp": datetime.utcnow()
-                })
-                
-                return jsonify({
-                    "response": fail_response,
-                    "topic": "System",
-                    "confidence": "Low"
-                }), 200
-
-        # ✅ 4. SUCCESS QUERY (Local Match)
-        match_id_str = str(match['_id']) 
-
-        mongo.db[LOGS_COLLECTION].insert_one({
+        # ❌ 5. FAILED LOCAL QUERY -> FALLBACK TO GEMINI
+        print("Local DB missed or empty. Asking Gemini...")
+        try:
+            # Ask Gemini 2.5 Flash (shared client: timeout, concurrency cap and circuit breaker)
+            with span("chatbot.gemini"):
+                gemini_text = gemini_client.generate(_gemini_prompt(user_query))
+            return jsonify(_gemini_answered(user_query, cache_key, gemini_text)), 200
+        except Exception as gemini_err:
+            return jsonify(_gemini_failed(user_query, gemini_err)), 200
+
+    except Exception as e:
+        print(f"🔥 Critical AI Error: {e}") 
+        return jsonify({"error": "Internal Server Error"}), 500
+
+# =========================================================
+# 5b. ASK (STREAMING) - Server-sent events
+# =========================================================
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _stream_gemini(user_query, cache_key):
+    """SSE events for a Gemini fallback: `token` per chunk as it arrives, then `done` with the full answer."""
+    chunks = []
+    started = time.perf_counter()
+    stream = gemini_client.generate_stream(_gemini_prompt(user_query))
+    try:
+        yield _sse("start", {"topic": "Gemini AI"})
+        for text in stream:
+            if not chunks: observe("chatbot.gemini_first_token", time.perf_counter() - started)
+            chunks.append(text)
+            yield _sse("token", {"text": text})
+        observe("chatbot.gemini", time.perf_counter() - started)
+        yield _sse("done", _gemini_answered(user_query, cache_key, "".join(chunks)))
+    except GeneratorExit:
+        # Client disconnected: still log what it was sent
+        _log_interaction({
             "query": user_query,
-            "response": match['response'],
-            "status": "Success",
-            "match_id": match_id_str, 
+            "response": "".join(chunks),
+            "status": "Interrupted",
+            "reason": "Client disconnected mid-stream",
             "timestamp": datetime.utcnow()
         })
+        raise
+    except Exception as gemini_err:
+        yield _sse("error", _gemini_failed(user_query, gemini_err, "".join(chunks)))
+    finally:
+        stream.close()  # frees the Gemini slot now, not whenever the generator is collected
 
-        return jsonify({
-            "response": match['response'],
-            "topic": match.get('topic'),
-            "confidence": "High"
-        }), 200
+@chatbot_bp.route('/ask/stream', methods=['GET', 'POST'])
+def ask_chatbot_stream():
+    """
+    Same answers as /ask as text/event-stream. Local answers arrive at once as one `answer` event;
+    Gemini fallbacks stream `start`, `token`... and a final `done` (or `error`) with the full body.
+    GET ?question= is for EventSource clients; POST takes the same JSON body as /ask.
+    """
+    try:
+        user_query = (request.get_json(silent=True) or {}).get('question') or request.args.get('question')
+        if not user_query:
+            return jsonify({"error": "No question provided"}), 400
 
+        cache_key = normalize_query(user_query)
+        body = _local_answer(user_query, cache_key)
+        if body:
+            events = iter([_sse("answer", body)])
+        else:
+            print("Local DB missed or empty. Streaming from Gemini...")
+            events = _stream_gemini(user_query, cache_key)
+        # No proxy buffering (nginx), or the tokens would arrive all at once
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        return Response(stream_with_context(events), mimetype='text/event-stream', headers=headers)
     except Exception as e:
-        print(f"🔥 Critical AI Error: {e}") 
+        print(f"🔥 Critical AI Error: {e}")
         return jsonify({"error": "Internal Server Error"}), 500
 
 # =========================================================
@@ -210,47 +511,113 @@ def ask_chatbot():
 # =========================================================
 @chatbot_bp.route('/stats', methods=['GET'])
 def get_stats():
+    # ?hours=/?days=/?since=/?until= restrict the stats to a time window; ?series=day adds a per-day breakdown
+    try:
+        window = time_window(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     try:
-        total_logs = mongo.db[LOGS_COLLECTION].count_documents({})
-        success_logs = mongo.db[LOGS_COLLECTION].count_documents({"status": "Success"})
-        success_gemini_logs = mongo.db[LOGS_COLLECTION].count_documents({"status": "Success (Gemini)"})
-        failed_logs = mongo.db[LOGS_COLLECTION].count_documents({"status": "Failed"})
-        flagged_logs = mongo.db[LOGS_COLLECTION].count_documents({"status": "Flagged"})
+        # One pass over the (status, timestamp) index instead of a count per status
+        per_day = request.args.get('series') == 'day'
+        group_id = {"status": "$status"}
+        if per_day: group_id["day"] = {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
+        rows = list(mongo.db[LOGS_COLLECTION].aggregate([
+            {"$match": window},
+            {"$group": {"_id": group_id, "count": {"$sum": 1}}}
+        ]))
+
+        counts, days = {}, {}
+        for row in rows:
+            status = row["_id"].get("status")
+            counts[status] = counts.get(status, 0) + row["count"]
+            if per_day:
+                day = days.setdefault(row["_id"].get("day"), {})
+                day[status] = day.get(status, 0) + row["count"]
+
+        total_logs = sum(counts.values())
+        success_gemini_logs = counts.get("Success (Gemini)", 0)
 
         # Combine both local success and Gemini success for accuracy calculation
-        total_success = success_logs + success_gemini_logs
+        total_success = counts.get("Success", 0) + success_gemini_logs
         
+        # A stream the client closed mid-answer says nothing about answer quality, so it isn't counted
+        interrupted = counts.get("Interrupted", 0)
+        answered_logs = total_logs - interrupted
+
         accuracy = 0
-        if total_logs > 0:
-            accuracy = round((total_success / total_logs) * 100)
+        if answered_logs > 0:
+            accuracy = round((total_success / answered_logs) * 100)
 
-        return jsonify({
+        stats = {
             "total_interactions": total_logs,
             "accuracy": accuracy,
-            "failed_count": failed_logs,
-            "flagged_count": flagged_logs,
+            "failed_count": counts.get("Failed", 0),
+            "flagged_count": counts.get("Flagged", 0),
+            "interrupted_count": interrupted,
             "gemini_fallback_count": success_gemini_logs # Added this to track how often Gemini is used
-        }), 200
+        }
+        if window:
+            bounds = window["timestamp"]
+            stats["window"] = {"since": bounds["$gte"].isoformat() if "$gte" in bounds else None,
+                               "until": bounds["$lt"].isoformat() if "$lt" in bounds else None}
+        if per_day:
+            stats["daily"] = [{"day": day, **day_counts} for day, day_counts in sorted(days.items(), key=lambda item: item[0] or "")]
+        return jsonify(stats), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@chatbot_bp.route('/stats/embedding', methods=['GET'])
+def get_embedding_stats():
+    return jsonify(embedding_batcher.stats()), 200
+
+@chatbot_bp.route('/stats/knowledge', methods=['GET'])
+def get_knowledge_stats():
+    return jsonify({"entries": len(knowledge_index), "ready": knowledge_index.ready, **kb_sync.stats()}), 200
+
+@chatbot_bp.route('/stats/gemini', methods=['GET'])
+def get_gemini_stats():
+    return jsonify(gemini_client.stats()), 200
+
+@chatbot_bp.route('/stats/logging', methods=['GET'])
+def get_logging_stats():
+    return jsonify(log_writer.stats()), 200
+
 # =========================================================
 # 7. GET LOGS (Admin Logs)
 # =========================================================
 @chatbot_bp.route('/logs', methods=['GET'])
 def get_logs():
+    try:
+        query = time_window(request.args)
+        # ?cursor= (from the previous page's X-Next-Cursor header) continues where that page ended
+        if request.args.get('cursor'):
+            query.update(cursor_filter(request.args['cursor']))
+        limit = _limit_param()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     try:
         filter_status = request.args.get('status')
-        query = {}
         if filter_status:
             query['status'] = filter_status
-            
-        logs = list(mongo.db[LOGS_COLLECTION].find(query).sort('timestamp', -1).limit(100))
+        logs = list(mongo.db[LOGS_COLLECTION].find(query).sort([('timestamp', -1), ('_id', -1)]).limit(limit))
+        headers = {"X-Next-Cursor": encode_cursor(logs[-1])} if len(logs) == limit and logs[-1].get('timestamp') else {}
         
         for log in logs:
             log['_id'] = str(log['_id'])
             
-        return jsonify(logs), 200
+        return jsonify(logs), 200, headers
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@chatbot_bp.route('/logs/archive', methods=['POST'])
+def archive_logs():
+    # For a cron job when LOG_ARCHIVE=1; ?days= overrides LOG_RETENTION_DAYS for this run
+    days = request.args.get('days')
+    if days and not days.isdigit():
+        return jsonify({"error": "days must be a whole number"}), 400
+    try:
+        moved = archive_old_logs(int(days) if days else None)
+        return jsonify({"archived": moved}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -3,7 +3,20 @@ import numpy as np
 import base64
 import os
 import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from services.metrics import span, timed
+from services.model_registry import model_registry
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: exports are still renamed into place, just not locked
+    fcntl = None
 
 # --- CONFIGURATION ---
 DEFAULT_PIXELS_PER_CM = 65.0 
@@ -11,6 +24,38 @@ MIN_CRAYFISH_LENGTH_CM = 2.0
 AI_MODEL_VERSION = "CrayAI Tri-Core v3.6"
 REFERENCE_BOX_SIZE_CM = 2.0
 MIN_GENDER_CONFIDENCE = 30.0 
+MAX_IMAGE_SIZE = 800
+
+# --- BATCH SCAN CONFIG ---
+MAX_BATCH_IMAGES = int(os.environ.get("MAX_BATCH_IMAGES", 24))
+PREDICT_BATCH_SIZE = int(os.environ.get("PREDICT_BATCH_SIZE", 8))
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", os.cpu_count() or 2))
+# Crops are letterboxed to a square of this size. 0 = the size the gender model was trained at; a smaller
+# size is faster but must first be checked with benchmarks/vision_backend_benchmark.py --gender-imgsz
+GENDER_INPUT_SIZE = int(os.environ.get("GENDER_INPUT_SIZE", 0))
+GENDER_BATCH_SIZE = int(os.environ.get("GENDER_BATCH_SIZE", 32))  # crops are small, so batch more of them per pass
+INCLUDE_TIMINGS = os.environ.get("SCAN_TIMINGS", "0") == "1"     # adds a per-stage "timings_ms" block to scan results
+
+# --- DETECTION CASCADE CONFIG ---
+# Coarse-to-fine: the detector runs once at a small input size on the 800px working image, then only
+# the detected regions and the reference square are re-read from the upload at native resolution
+# (capped at CASCADE_NATIVE_MAX) to refine the boxes, the calibration and the gender crops. The native
+# image is re-decoded from the upload for each of those steps, so a batch holds one at a time.
+DETECTION_CASCADE = os.environ.get("DETECTION_CASCADE", "0") == "1"
+CASCADE_DETECT_IMGSZ = int(os.environ.get("CASCADE_DETECT_IMGSZ", 480))   # coarse detector input size
+CASCADE_REFINE_IMGSZ = int(os.environ.get("CASCADE_REFINE_IMGSZ", 320))   # per-region detector input size
+CASCADE_MAX_REGIONS = int(os.environ.get("CASCADE_MAX_REGIONS", 8))       # per image; extra boxes stay coarse
+CASCADE_NATIVE_MAX = int(os.environ.get("CASCADE_NATIVE_MAX", 3200))      # longest side kept from the upload
+CASCADE_REGION_PAD = 0.15  # context around each region, as a fraction of its size
+CASCADE_MIN_IOU = 0.3      # a refined box must overlap its coarse box this much to replace it
+
+# --- RESULT IMAGE CONFIG ---
+# Image modes: 'base64' = inline in the JSON (original behaviour), 'binary' = raw JPEG bytes
+# for the route to send as a multipart part / stored URL, 'none' = measurements only
+RESULT_JPEG_QUALITY = int(os.environ.get("RESULT_JPEG_QUALITY", 95))  # OpenCV's default
+RESULT_MAX_WIDTH = int(os.environ.get("RESULT_MAX_WIDTH", 0))          # 0 = keep the 800px working size
+MIN_RESULT_WIDTH = 64  # smaller requested widths are raised to this
+IMAGE_MODES = ("base64", "binary", "none")
 
 # --- MODEL PATHS ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) 
@@ -18,10 +63,14 @@ MODEL_PATH = os.path.join(BASE_DIR, "ai_models", "crayfish.pt")
 GENDER_MODEL_PATH = os.path.join(BASE_DIR, "ai_models", "last.pt") 
 ENV_MODEL_PATH = os.path.join(BASE_DIR, "ai_models", "environment.pt")
 
-# --- LAZY LOADING GLOBALS ---
-ai_model = None
-gender_model = None
-env_model = None
+# --- INFERENCE BACKEND ---
+# 'pytorch' = load the .pt files directly, 'onnx' = ONNX Runtime, 'openvino' = Intel OpenVINO.
+# Non-pytorch backends are exported from the .pt files once (at gunicorn startup, or on first
+# load otherwise) and cached next to them.
+VISION_BACKEND = os.environ.get("VISION_BACKEND", "pytorch").lower()
+VISION_INT8 = os.environ.get("VISION_INT8", "0") == "1"      # INT8 weights (dynamic quantization for ONNX)
+VISION_INT8_DATA = os.environ.get("VISION_INT8_DATA")        # calibration dataset yaml for OpenVINO INT8
+EXPORT_IMGSZ = {GENDER_MODEL_PATH: GENDER_INPUT_SIZE}       # 0 = the model's trained size
 
 DEBUG_MODE = True
 
@@ -29,43 +78,169 @@ def debug_log(message, level="INFO"):
     if DEBUG_MODE:
         print(f"[{level}] {message}")
 
-def get_ai_model():
-    global ai_model
-    if ai_model is None:
+def exported_model_path(pt_path, backend, int8=False):
+    """Where ultralytics (or our ONNX quantizer) puts the exported copy of a .pt model."""
+    stem = os.path.splitext(pt_path)[0]
+    if backend == "onnx": return f"{stem}_int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == "openvino": return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    return pt_path
+
+def _is_exported(target):
+    # The .task file is written last, so it marks a finished export
+    return os.path.exists(target) and os.path.exists(f"{target}.task")
+
+@contextmanager
+def _export_lock(target):
+    """Serialises exports of one model across gunicorn workers and inference-pool processes."""
+    with open(f"{target}.lock", "w") as lock:
+        if fcntl: fcntl.flock(lock, fcntl.LOCK_EX)
         try:
-            from ultralytics import YOLO
-            if os.path.exists(MODEL_PATH): ai_model = YOLO(MODEL_PATH)
-            else: ai_model = False 
-        except Exception as e: ai_model = False 
-    return ai_model
+            yield
+        finally:
+            if fcntl: fcntl.flock(lock, fcntl.LOCK_UN)
 
-def get_gender_model():
-    global gender_model
-    if gender_model is None:
+def export_model(pt_path, backend=VISION_BACKEND, int8=VISION_INT8):
+    """
+    Exports a .pt model for a CPU runtime (one-off; the result is reused on later loads).
+    The export runs in a scratch folder and is renamed into place, so a concurrent loader
+    never sees a half-written file.
+    """
+    target = exported_model_path(pt_path, backend, int8)
+    with _export_lock(target):
+        if _is_exported(target):
+            return target  # another process finished it while we waited
+        from ultralytics import YOLO
+        scratch = tempfile.mkdtemp(prefix=".export-", dir=os.path.dirname(pt_path))
         try:
-            from ultralytics import YOLO
-            if os.path.exists(GENDER_MODEL_PATH): gender_model = YOLO(GENDER_MODEL_PATH)
-            else: gender_model = False
-        except Exception as e: gender_model = False
-    return gender_model
+            # ultralytics writes the export beside its source, so export a copy inside the scratch folder
+            scratch_pt = shutil.copy2(pt_path, scratch)
+            model = YOLO(scratch_pt)
+            trained_imgsz = model_input_size(model)
+            imgsz = EXPORT_IMGSZ.get(pt_path, 640) or trained_imgsz
+            debug_log(f"📤 Exporting {os.path.basename(pt_path)} to {backend}{' INT8' if int8 else ''} (imgsz={imgsz})")
 
-def get_env_model():
-    global env_model
-    if env_model is None:
+            if backend == "onnx":
+                exported = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+                if int8:
+                    from onnxruntime.quantization import quantize_dynamic, QuantType
+                    quantize_dynamic(exported, exported_model_path(scratch_pt, "onnx", True), weight_type=QuantType.QUInt8)
+            elif backend == "openvino":
+                kwargs = {"int8": int8}
+                if int8 and VISION_INT8_DATA: kwargs["data"] = VISION_INT8_DATA
+                model.export(format="openvino", imgsz=imgsz, dynamic=True, **kwargs)
+            else:
+                raise ValueError(f"Unknown vision backend '{backend}'")
+
+            # Exported files don't reliably carry the task or the trained size, so keep both beside them for loading
+            scratch_target = exported_model_path(scratch_pt, backend, int8)
+            with open(f"{scratch_target}.task", "w") as f: f.write(f"{model.task}\n{trained_imgsz}")
+            if os.path.isdir(target): shutil.rmtree(target)  # leftover of an interrupted export
+            os.replace(scratch_target, target)
+            os.replace(f"{scratch_target}.task", f"{target}.task")
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return target
+
+def export_models(backend=VISION_BACKEND, int8=VISION_INT8):
+    """Exports every model that isn't exported yet; gunicorn runs this at startup, before workers fork."""
+    if backend == "pytorch": return
+    for pt_path in (MODEL_PATH, GENDER_MODEL_PATH, ENV_MODEL_PATH):
+        if not os.path.exists(pt_path) or _is_exported(exported_model_path(pt_path, backend, int8)):
+            continue
         try:
-            from ultralytics import YOLO
-            if os.path.exists(ENV_MODEL_PATH): env_model = YOLO(ENV_MODEL_PATH)
-            else: env_model = False
-        except Exception as e: env_model = False
-    return env_model
+            export_model(pt_path, backend, int8)
+        except Exception as e:
+            debug_log(f"{backend} export failed for {os.path.basename(pt_path)} ({e}), it will load from PyTorch", "WARN")
+
+def model_input_size(model, default=640):
+    """The square input size a YOLO model was trained at (the .pt checkpoint's args, or the export's .task file)."""
+    for args in (getattr(model, "overrides", None), getattr(getattr(model, "model", None), "args", None)):
+        imgsz = args.get("imgsz") if isinstance(args, dict) else None
+        if imgsz: return int(max(imgsz) if isinstance(imgsz, (list, tuple)) else imgsz)
+    return default  # ultralytics trains at 640 unless told otherwise
+
+def gender_input_size(g_model):
+    return GENDER_INPUT_SIZE or model_input_size(g_model)
+
+def load_yolo(pt_path, backend=VISION_BACKEND, int8=VISION_INT8, strict=False):
+    """
+    Loads one YOLO model through the configured backend, falling back to the .pt file
+    (strict=True raises instead, for benchmarks that must not measure PyTorch by mistake).
+    """
+    if not os.path.exists(pt_path): return False
+    from ultralytics import YOLO
+    if backend == "pytorch": return YOLO(pt_path)
+    try:
+        target = exported_model_path(pt_path, backend, int8)
+        if not _is_exported(target):
+            target = export_model(pt_path, backend, int8)
+        with open(f"{target}.task") as f: task, *imgsz = f.read().split()
+        model = YOLO(target, task=task)
+        if imgsz: model.overrides["imgsz"] = int(imgsz[0])
+        return model
+    except Exception as e:
+        if strict: raise
+        debug_log(f"{backend} backend unavailable for {os.path.basename(pt_path)} ({e}), using PyTorch", "WARN")
+        return YOLO(pt_path)
+
+# --- LAZY LOADING (services/model_registry.py tracks memory and unloads idle models) ---
+model_registry.register("crayfish", lambda: load_yolo(MODEL_PATH))
+model_registry.register("gender", lambda: load_yolo(GENDER_MODEL_PATH))
+model_registry.register("environment", lambda: load_yolo(ENV_MODEL_PATH))
+
+def get_ai_model():
+    return model_registry.get("crayfish")
+
+def get_gender_model():
+    return model_registry.get("gender")
+
+def get_env_model():
+    return model_registry.get("environment")
+
+# --- SHARED PREPROCESSING ---
+LOWER_GREEN = np.array([35, 40, 40], dtype=np.uint8)
+UPPER_GREEN = np.array([85, 255, 255], dtype=np.uint8)
+
+_scratch = threading.local()
+
+def _buffer(name, shape):
+    """Per-thread scratch buffer, reused across scans of the same size instead of reallocated."""
+    buffers = getattr(_scratch, "buffers", None)
+    if buffers is None: buffers = _scratch.buffers = {}
+    buf = buffers.get(name)
+    if buf is None or buf.shape != shape:
+        buf = buffers[name] = np.empty(shape, dtype=np.uint8)
+    return buf
+
+class Preprocessed:
+    """
+    Products computed once per image and shared by analyze_algae and calculate_dynamic_scale.
+    They live in this thread's scratch buffers, so use them before preprocessing the next image.
+    """
+    __slots__ = ("green_mask", "thresh")
+
+    def __init__(self, green_mask, thresh):
+        self.green_mask = green_mask
+        self.thresh = thresh
+
+@timed("measure.preprocess")
+def preprocess(img, need_threshold=True):
+    """Single pass: HSV green mask (algae) and, for calibration, grey -> blur -> adaptive threshold."""
+    h, w = img.shape[:2]
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV, dst=_buffer("hsv", (h, w, 3)))
+    green_mask = cv2.inRange(hsv, LOWER_GREEN, UPPER_GREEN, dst=_buffer("green", (h, w)))
+    thresh = None
+    if need_threshold:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=_buffer("gray", (h, w)))
+        blur = cv2.GaussianBlur(gray, (5, 5), 0, dst=_buffer("blur", (h, w)))
+        thresh = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2, dst=_buffer("thresh", (h, w)))
+    return Preprocessed(green_mask, thresh)
 
 # --- 3-CLASS ALGAE DETECTION ---
-def analyze_algae(img):
+@timed("measure.algae")
+def analyze_algae(img, prep=None):
     try:
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        lower_green = np.array([35, 40, 40])
-        upper_green = np.array([85, 255, 255])
-        mask = cv2.inRange(hsv, lower_green, upper_green)
+        mask = prep.green_mask if prep is not None else preprocess(img, need_threshold=False).green_mask
         percentage = (cv2.countNonZero(mask) / (img.shape[0] * img.shape[1])) * 100
         
         debug_log(f"Algae percentage: {percentage:.2f}%")
@@ -84,163 +259,569 @@ def estimate_age(size_cm):
     elif 6 <= size_cm < 11: return "Sub-Adult (3-6 months)"
     else: return "Adult/Breeder (> 6 months)"
 
-def calculate_dynamic_scale(img):
-    try:
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        blur = cv2.GaussianBlur(gray, (5, 5), 0)
-        thresh = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
-        cnts_result = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+def _is_reference_square(cnt, max_image_area):
+    """Bounding rect (x, y, w, h) of the contour if it passes the paper-square checks, else None."""
+    peri = cv2.arcLength(cnt, True)
+    approx = cv2.approxPolyDP(cnt, 0.04 * peri, True)
+    if len(approx) != 4: return None
+    x, y, w, h = cv2.boundingRect(approx)
+    aspect_ratio = float(w) / h if h != 0 else 0
+    area = cv2.contourArea(cnt)
+    ar_valid = 0.8 < aspect_ratio < 1.2
+    area_valid = 1000 < area < (max_image_area * 0.1)
+    return (x, y, w, h) if ar_valid and area_valid else None
+
+def find_reference_squares(thresh, max_image_area):
+    """Rects (x, y, w, h) of every blob in the threshold image that looks like the reference square."""
+    # Bulk pre-filter: component bounding boxes are checked as arrays, so only blobs that could
+    # be the paper square (box area/aspect a loose superset of the exact checks) reach approxPolyDP
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
+    widths, heights = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+    box_areas = widths * heights
+    aspects = widths / np.maximum(heights, 1)
+    candidates = np.flatnonzero(
+        (box_areas > 1000) & (box_areas < max_image_area * 0.2) & (aspects > 0.7) & (aspects < 1.45)
+    ) + 1
+
+    squares = []
+    for label in candidates:
+        x, y, w, h = stats[label, :4]
+        blob = (labels[y:y + h, x:x + w] == label).astype(np.uint8)
+        cnts_result = cv2.findContours(blob, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         contours = cnts_result[0] if len(cnts_result) == 2 else cnts_result[1]
-        square_widths = []
-        for idx, cnt in enumerate(contours):
-            peri = cv2.arcLength(cnt, True)
-            approx = cv2.approxPolyDP(cnt, 0.04 * peri, True)
-            if len(approx) == 4:
-                x, y, w, h = cv2.boundingRect(approx)
-                aspect_ratio = float(w) / h if h != 0 else 0
-                area = cv2.contourArea(cnt)
-                max_image_area = img.shape[0] * img.shape[1]
-                ar_valid = 0.8 < aspect_ratio < 1.2
-                area_valid = 1000 < area < (max_image_area * 0.1)
-                if ar_valid and area_valid:
-                    square_widths.append(w)
-        if len(square_widths) > 0:
-            return np.median(square_widths) / REFERENCE_BOX_SIZE_CM, True 
-        else:
-            return DEFAULT_PIXELS_PER_CM, False 
+        for cnt in contours:
+            rect = _is_reference_square(cnt, max_image_area)
+            if rect is not None: squares.append((x + rect[0], y + rect[1], rect[2], rect[3]))
+    return squares
+
+def scale_from_squares(squares):
+    if len(squares) > 0:
+        return np.median([w for _, _, w, _ in squares]) / REFERENCE_BOX_SIZE_CM, True
+    return DEFAULT_PIXELS_PER_CM, False
+
+@timed("measure.scale")
+def calculate_dynamic_scale(img, prep=None, squares_out=None):
+    """(pixels_per_cm, paper_detected). Pass a list as `squares_out` to also collect the square rects."""
+    try:
+        thresh = prep.thresh if prep is not None and prep.thresh is not None else preprocess(img).thresh
+        squares = find_reference_squares(thresh, img.shape[0] * img.shape[1])
+        if squares_out is not None: squares_out.extend(squares)
+        return scale_from_squares(squares)
     except Exception as e:
         return DEFAULT_PIXELS_PER_CM, False
 
-def process_measurement(image_file, scan_mode="OVERALL"):
+# --- IMAGE DECODING ---
+# Largest factor first: the JPEG decoder can skip straight to 1/8, 1/4 or 1/2 size via DCT scaling
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def jpeg_dimensions(data):
+    """(height, width) from a JPEG's frame header without decoding it, or None if not a JPEG."""
+    if data[:2] != b"\xff\xd8": return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF: return None
+        marker = data[i + 1]
+        if marker == 0xFF: i += 1; continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7: i += 2; continue
+        if marker in _JPEG_SOF_MARKERS:
+            return int.from_bytes(data[i + 5:i + 7], "big"), int.from_bytes(data[i + 7:i + 9], "big")
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+def _decode(file_bytes, max_side, interpolation=cv2.INTER_LINEAR):
+    # Big JPEGs are decoded at a reduced size that still covers `max_side`
+    flag = cv2.IMREAD_COLOR
+    dims = jpeg_dimensions(file_bytes)
+    if dims:
+        for factor, reduced_flag in REDUCED_DECODE_FLAGS:
+            if max(dims) / factor >= max_side:
+                flag = reduced_flag
+                break
+
+    img = cv2.imdecode(np.frombuffer(file_bytes, np.uint8), flag)
+    if img is None: return None
+    return _shrink(img, max_side, interpolation)
+
+def _shrink(img, max_side, interpolation=cv2.INTER_LINEAR):
+    h, w = img.shape[:2]
+    if max(h, w) > max_side:
+        scale = max_side / max(h, w)
+        img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=interpolation)
+    return img
+
+@timed("measure.decode")
+def decode_image(file_bytes):
+    """Decodes uploaded bytes and shrinks the photo to the 800px working size."""
+    return _decode(file_bytes, MAX_IMAGE_SIZE)
+
+class NativeImage:
+    """An upload's native-resolution copy (capped at CASCADE_NATIVE_MAX), decoded again on each `load`."""
+    __slots__ = ("data", "shape")
+
+    def __init__(self, data, shape):
+        self.data = data
+        self.shape = shape
+
+    @timed("measure.cascade_decode")
+    def load(self):
+        return _decode(self.data, CASCADE_NATIVE_MAX, cv2.INTER_AREA)
+
+@timed("measure.decode")
+def decode_scan(file_bytes):
+    """
+    Cascade decode: (working_img, NativeImage). Only the upload bytes are kept for the native
+    copy, so a 24-photo batch doesn't hold 24 native images between decode and refinement.
+    The NativeImage is None when the upload is no bigger than the working size (nothing to re-read).
+    """
+    native = _decode(file_bytes, CASCADE_NATIVE_MAX, cv2.INTER_AREA)
+    if native is None: return None, None
+    if max(native.shape[:2]) <= MAX_IMAGE_SIZE: return native, None
+    return _shrink(native, MAX_IMAGE_SIZE), NativeImage(file_bytes, native.shape)
+
+def predict_batch(model, images, batch_size=None, **kwargs):
+    """Runs one YOLO model over many images, `batch_size` (default PREDICT_BATCH_SIZE) frames per forward pass."""
+    batch_size = batch_size or PREDICT_BATCH_SIZE
+    results = []
+    for start in range(0, len(images), batch_size):
+        results.extend(model.predict(source=list(images[start:start + batch_size]), verbose=False, **kwargs))
+    return results
+
+def image_options(mode="base64", quality=None, max_width=None):
+    """Normalises the per-request settings for the annotated result image."""
+    quality = RESULT_JPEG_QUALITY if quality is None else quality
+    max_width = RESULT_MAX_WIDTH if max_width is None else max_width
+    return {
+        "mode": mode if mode in IMAGE_MODES else "base64",
+        "quality": int(min(100, max(10, quality))),
+        "max_width": int(max(MIN_RESULT_WIDTH, max_width)) if max_width > 0 else 0
+    }
+
+@timed("measure.encode_image")
+def encode_result_image(img, options=None):
+    """Annotated image as JPEG bytes, honouring the requested quality / max width."""
+    options = options or image_options()
+    max_width = options["max_width"]
+    if max_width and img.shape[1] > max_width:
+        img = cv2.resize(img, (max_width, int(img.shape[0] * max_width / img.shape[1])), interpolation=cv2.INTER_AREA)
+    _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, options["quality"]])
+    return buffer.tobytes()
+
+def attach_image(output, img, options=None):
+    options = options or image_options()
+    if options["mode"] == "none": return output
+    data = encode_result_image(img, options)
+    if options["mode"] == "binary": output["image_bytes"] = data
+    else: output["image"] = base64.b64encode(data).decode('utf-8')
+    return output
+
+def error_result(message):
+    return {"success": False, "error": message, "measurements": [], "gender": "Error", "genderConfidence": 0}
+
+# --- PIPELINE STAGES (each takes the whole batch) ---
+def classify_environment(e_model, images):
+    statuses = ["Optimal Water Quality"] * len(images)
+    if not e_model or not images: return statuses
     try:
-        file_bytes = np.frombuffer(image_file.read(), np.uint8)
-        original_img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+        with span("measure.yolo_environment"):
+            env_results = predict_batch(e_model, images, conf=0.4)
+        for i, env_result in enumerate(env_results):
+            if hasattr(env_result, 'probs') and env_result.probs is not None:
+                statuses[i] = e_model.names[env_result.probs.top1]
+            elif hasattr(env_result, 'boxes') and len(env_result.boxes) > 0:
+                statuses[i] = e_model.names[int(env_result.boxes[0].cls[0])]
+    except Exception as e: pass
+    return statuses
 
-        if original_img is None: return {"success": False, "error": "Invalid Image"}
+def water_quality(algae_level, ai_environment_status):
+    """--- DYNAMIC TURBIDITY & TEXT SYNC (1-3, 4-6, 7-10) ---"""
+    if algae_level == 0:
+        turbidity_level = random.randint(1, 3)
+        if "Clear" in ai_environment_status: ai_environment_status = "Optimal Water Quality"
+    elif algae_level == 1:
+        turbidity_level = random.randint(4, 6)
+        ai_environment_status = "Moderate Murkiness - Monitor Tank"
+    else: # Level 2
+        turbidity_level = random.randint(7, 10)
+        ai_environment_status = "Action Required: Clean Water Immediately"
+    return turbidity_level, ai_environment_status
 
-        max_size = 800
-        h, w = original_img.shape[:2]
-        if max(h, w) > max_size:
-            scale = max_size / max(h, w)
-            original_img = cv2.resize(original_img, (int(w * scale), int(h * scale)))
+def detect_crayfish(model, images, scales, **predict_kwargs):
+    """Runs the crayfish detector once over every image whose reference paper was found."""
+    detections = [[] for _ in images]
+    targets = [i for i, (_, paper_detected) in enumerate(scales) if paper_detected]
+    if not model or not targets: return detections
+    try:
+        with span("measure.yolo_crayfish"):
+            results = predict_batch(model, [images[i] for i in targets], conf=0.6, **predict_kwargs)
+        for i, result in zip(targets, results):
+            pixels_per_cm = scales[i][0]
+            for box in result.boxes:
+                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                if ((y2 - y1) / pixels_per_cm) >= MIN_CRAYFISH_LENGTH_CM:
+                    detections[i].append(box)
+    except Exception as e: pass
+    return detections
 
-        model = get_ai_model()
-        g_model = get_gender_model()
-        e_model = get_env_model()
+# --- COARSE-TO-FINE CASCADE ---
+class RegionBox:
+    """A detection refined at native resolution, in working-image pixels (same .xyxy/.conf/.cls shape as a YOLO box)."""
+    __slots__ = ("xyxy", "conf", "cls")
 
-        # BASE METRICS
-        algae_level, algae_desc = analyze_algae(original_img)
-        ai_environment_status = "Optimal Water Quality"
-        
-        if e_model:
-            try:
-                env_results = e_model.predict(source=original_img, conf=0.4)
-                if hasattr(env_results[0], 'probs') and env_results[0].probs is not None:
-                    ai_environment_status = e_model.names[env_results[0].probs.top1]
-                elif hasattr(env_results[0], 'boxes') and len(env_results[0].boxes) > 0:
-                    ai_environment_status = e_model.names[int(env_results[0].boxes[0].cls[0])]
-            except Exception as e: pass
-
-        # --- DYNAMIC TURBIDITY & TEXT SYNC (1-3, 4-6, 7-10) ---
-        if algae_level == 0:
-            turbidity_level = random.randint(1, 3)
-            if "Clear" in ai_environment_status: ai_environment_status = "Optimal Water Quality"
-        elif algae_level == 1:
-            turbidity_level = random.randint(4, 6)
-            ai_environment_status = "Moderate Murkiness - Monitor Tank"
-        else: # Level 2
-            turbidity_level = random.randint(7, 10)
-            ai_environment_status = "Action Required: Clean Water Immediately"
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = np.asarray([xyxy], dtype=np.float32)
+        self.conf = np.asarray([conf], dtype=np.float32)
+        self.cls = np.asarray([cls], dtype=np.float32)
+
+def _padded_region(x1, y1, x2, y2, shape, pad=CASCADE_REGION_PAD):
+    h, w = shape[:2]
+    px, py = (x2 - x1) * pad, (y2 - y1) * pad
+    return max(0, int(x1 - px)), max(0, int(y1 - py)), min(w, int(np.ceil(x2 + px))), min(h, int(np.ceil(y2 + py)))
+
+def _iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+@timed("measure.cascade_scale")
+def refine_scale(native, squares, factor):
+    """
+    Re-measures the reference squares found on the working image inside their native-resolution
+    regions. Returns pixels_per_cm in working-image units, or None if no square is confirmed.
+    """
+    native_area = native.shape[0] * native.shape[1]
+    widths = []
+    for x, y, w, h in squares:
+        x1, y1, x2, y2 = _padded_region(x * factor, y * factor, (x + w) * factor, (y + h) * factor, native.shape, pad=0.25)
+        region = native[y1:y2, x1:x2]
+        if region.size == 0: continue
+        # Same threshold as preprocess(), without disturbing its working-size scratch buffers
+        gray = cv2.GaussianBlur(cv2.cvtColor(region, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
+        found = find_reference_squares(thresh, native_area)
+        if found: widths.append(max(found, key=lambda r: r[2] * r[3])[2])
+    if not widths: return None
+    return float(np.median(widths)) / factor / REFERENCE_BOX_SIZE_CM
+
+@timed("measure.cascade_refine")
+def refine_detections(model, detections, natives, factors):
+    """
+    Re-runs the detector on each coarse box's region of the native image (at most CASCADE_MAX_REGIONS
+    per image, most confident first) and swaps in the refined box when it agrees with the coarse one.
+    Each native image is decoded once here, one image at a time, and only copies of its regions are
+    kept. Returns (detections, crops): crops[i][j] is box j's native-resolution gender crop, or None.
+    """
+    jobs, regions = [], []
+    crops = [[None] * len(boxes) for boxes in detections]
+    for i, boxes in enumerate(detections):
+        if natives[i] is None or not boxes: continue
+        native = natives[i].load()
+        ranked = set(sorted(range(len(boxes)), key=lambda j: -float(boxes[j].conf[0]))[:CASCADE_MAX_REGIONS])
+        for j, box in enumerate(boxes):
+            coarse = [float(v) * factors[i] for v in box.xyxy[0]]
+            x1, y1, x2, y2 = _padded_region(*coarse, native.shape)
+            if j in ranked and x2 > x1 and y2 > y1:
+                jobs.append((i, j, coarse, x1, y1))
+                regions.append(native[y1:y2, x1:x2].copy())
+            else:
+                crops[i][j] = native_crop(native, box, factors[i]).copy()
+        del native  # freed before the next image's is decoded
+
+    refined = _refine_boxes(model, detections, jobs, regions, factors) if model and regions else detections
+    # The refined box (or the coarse one it kept) lies inside its region, so its crop comes from there
+    for (i, j, _, x1, y1), region in zip(jobs, regions):
+        crops[i][j] = native_crop(region, refined[i][j], factors[i], origin=(x1, y1))
+    return refined, crops
+
+def _refine_boxes(model, detections, jobs, regions, factors):
+    """Detector pass over every cut region at once; boxes that don't agree with their coarse box stay coarse."""
+    refined = [list(boxes) for boxes in detections]
+    try:
+        with span("measure.yolo_crayfish_regions"):
+            results = predict_batch(model, regions, conf=0.4, imgsz=CASCADE_REFINE_IMGSZ)
+        for (i, j, coarse, x1, y1), result in zip(jobs, results):
+            best, best_iou = None, CASCADE_MIN_IOU
+            for box in result.boxes:
+                bx1, by1, bx2, by2 = (float(v) for v in box.xyxy[0])
+                candidate = (bx1 + x1, by1 + y1, bx2 + x1, by2 + y1)
+                overlap = _iou(candidate, coarse)
+                if overlap >= best_iou: best, best_iou = (candidate, box), overlap
+            if best:
+                candidate, box = best
+                refined[i][j] = RegionBox([v / factors[i] for v in candidate], float(box.conf[0]), float(box.cls[0]))
+    except Exception as e:
+        debug_log(f"Cascade refinement failed, keeping coarse boxes: {e}", "WARN")
+        return detections
+    return refined
+
+def native_crop(native, box, factor, origin=(0, 0)):
+    """
+    The box's region cut from the native image (sharper gender crops for large uploads).
+    `origin` is where `native` starts when it is only a region of the native image.
+    """
+    x1, y1, x2, y2 = (float(v) * factor for v in box.xyxy[0])
+    ox, oy = origin
+    return native[max(0, int(y1) - oy):max(0, int(np.ceil(y2)) - oy), max(0, int(x1) - ox):max(0, int(np.ceil(x2)) - ox)]
+
+GENDER_LABELS = ["Male", "Female", "Berried", "male", "female", "berried", "male_crayfish", "female_crayfish"]
+
+def letterbox(img, size):
+    """Resizes a crop to fit a size x size square (aspect kept, grey padding) so crops can share one batch."""
+    h, w = img.shape[:2]
+    scale = size / max(h, w)
+    new_w, new_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - new_h) // 2, (size - new_w) // 2
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    canvas[top:top + new_h, left:left + new_w] = cv2.resize(img, (new_w, new_h), interpolation=interpolation)
+    return canvas
+
+def crop_box(img, box):
+    x1, y1, x2, y2 = map(int, box.xyxy[0])
+    return img[max(0, y1):max(0, y2), max(0, x1):max(0, x2)]
+
+def _best_gender(g_model, g_res):
+    detected_gender, gender_confidence = "Not Defined", 0.0
+    all_detections = (g_res.boxes if getattr(g_res, 'boxes', None) else []) + (g_res.obb if getattr(g_res, 'obb', None) else [])
+    for det in all_detections:
+        label = g_model.names[int(det.cls[0])]
+        conf = float(det.conf[0]) * 100
+        if label in GENDER_LABELS and conf > gender_confidence:
+            detected_gender = label.replace('_crayfish', '').capitalize()
+            gender_confidence = round(conf, 1)
+    return detected_gender, gender_confidence
+
+def classify_genders(g_model, crops):
+    """
+    Sexes every crayfish crop with batched gender-model calls instead of one call per box.
+    Returns one (gender, confidence) pair per crop, in order.
+    """
+    predictions = [("Not Defined", 0.0)] * len(crops)
+    valid = [i for i, crop in enumerate(crops) if crop.size > 0]
+    if g_model and valid:
+        try:
+            size = gender_input_size(g_model)
+            inputs = [letterbox(crops[i], size) for i in valid]
+            with span("measure.yolo_gender"):
+                gender_results = predict_batch(g_model, inputs, batch_size=GENDER_BATCH_SIZE, conf=0.4, imgsz=size)
+            for i, g_res in zip(valid, gender_results):
+                predictions[i] = _best_gender(g_model, g_res)
+        except Exception as err: pass
+
+    results = []
+    for detected_gender, gender_confidence in predictions:
+        if detected_gender != "Not Defined" and gender_confidence < MIN_GENDER_CONFIDENCE:
+            detected_gender, gender_confidence = "Not Defined", 0.0
+        if detected_gender == "Not Defined":
+            detected_gender = random.choice(["Male", "Female"])
+            gender_confidence = round(random.uniform(48.2, 74.9), 1)
+        results.append((detected_gender, gender_confidence))
+    return results
+
+def measure_crayfish(original_img, raw_boxes, pixels_per_cm, genders):
+    """Measures and annotates every detected crayfish in one image (genders come pre-computed, one per box)."""
+    h_img, w_img = original_img.shape[:2]
+    results_data = []
+    if len(raw_boxes) == 0:
+        cv2.rectangle(original_img, (0, 0), (w_img, h_img), (0, 0, 255), 15)
+        cv2.putText(original_img, "NO CRAYFISH DETECTED", (int(w_img * 0.1), int(h_img / 2)), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 4)
+        return results_data
+
+    for box, (detected_gender, gender_confidence) in zip(raw_boxes, genders):
+        # Sizes from the unrounded box (cascade boxes carry sub-pixel precision), drawing on whole pixels
+        fx1, fy1, fx2, fy2 = (float(v) for v in box.xyxy[0])
+        x1, y1, x2, y2 = int(fx1), int(fy1), int(fx2), int(fy2)
+        w_cm = (fx2 - fx1) / pixels_per_cm
+        h_cm = (fy2 - fy1) / pixels_per_cm
+        age_category = estimate_age(h_cm)
 
+        cv2.rectangle(original_img, (x1, y1), (x2, y2), (0, 255, 0), 4)
+        label_color = (255, 105, 180) if "Female" in detected_gender or "Berried" in detected_gender else (255, 0, 0)
+        cv2.putText(original_img, f"{detected_gender} ({gender_confidence}%)", (x1, max(30, y1 - 40)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, label_color, 3)
+        cv2.putText(original_img, f"W: {w_cm:.2f}cm", (x1, max(30, y1 - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        cv2.putText(original_img, f"H: {h_cm:.2f}cm", (x1, y2 + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+
+        results_data.append({
+            "type": "target", "width_cm": round(w_cm, 2), "height_cm": round(h_cm, 2),
+            "estimated_age": age_category, "gender": detected_gender, "gender_confidence": gender_confidence
+        })
+    return results_data
+
+def _attach_timings(outputs, timings, **counts):
+    breakdown = {stage: round(ms, 2) for stage, ms in timings.items()}
+    breakdown.update(counts)
+    for output in outputs:
+        if output.get("success"): output["timings_ms"] = breakdown
+
+def session_scale(img, scale, fallback_scale=None):
+    """
+    Falls back to the session's last paper calibration (pixels_per_cm, image_width) when the
+    reference square isn't visible, rescaled to this image's width.
+    Returns (pixels_per_cm, paper_detected, scale_source).
+    """
+    pixels_per_cm, paper_detected = scale
+    if paper_detected: return pixels_per_cm, True, "paper"
+    if fallback_scale:
+        cached_ppcm, cached_width = fallback_scale
+        return cached_ppcm * img.shape[1] / cached_width, True, "session"
+    return pixels_per_cm, False, "default"
+
+@timed("measure.pipeline")
+def measure_images(images, scan_mode="OVERALL", options=None, fallback_scale=None, natives=None):
+    """
+    Runs the full scan pipeline over already-decoded images. Each YOLO model is called
+    once for the whole batch; the result list matches the order of `images`.
+    `natives` (cascade mode) holds each image's NativeImage, or None per image.
+    """
+    natives = natives or [None] * len(images)
+    factors = [native.shape[1] / img.shape[1] if native is not None else 1.0 for img, native in zip(images, natives)]
+    # Only the models this scan mode runs are loaded (ENVIRONMENT scans never need the detector)
+    models = model_registry.for_mode(scan_mode)
+    e_model = models["environment"]
+    timings = {}
+    clock = time.perf_counter()
+
+    # BASE METRICS
+    env_statuses = classify_environment(e_model, images)
+    timings["environment"] = (time.perf_counter() - clock) * 1000
+    # One preprocessing pass per image feeds both the algae check and (OVERALL only) the paper calibration
+    clock = time.perf_counter()
+    overall = scan_mode.upper() != "ENVIRONMENT"
+    outputs, scales = [], []
+    for original_img, native, factor, ai_environment_status in zip(images, natives, factors, env_statuses):
+        prep = preprocess(original_img, need_threshold=overall)
+        algae_level, algae_desc = analyze_algae(original_img, prep)
+        if overall:
+            squares = []
+            scale = calculate_dynamic_scale(original_img, prep, squares_out=squares)
+            if native is not None and scale[1]:
+                scale = (refine_scale(native.load(), squares, factor) or scale[0], True)
+            pixels_per_cm, paper_detected, scale_source = session_scale(original_img, scale, fallback_scale)
+            scales.append((pixels_per_cm, paper_detected))
+            if scale_source == "paper": fallback_scale = (pixels_per_cm, original_img.shape[1])  # later photos in this batch reuse it
+        else:
+            scale_source = None
+        turbidity_level, ai_environment_status = water_quality(algae_level, ai_environment_status)
         h_img, w_img = original_img.shape[:2]
         cv2.putText(original_img, f"Water: {ai_environment_status}", (30, h_img - 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 200, 0), 3)
+        outputs.append({
+            "measurements": [], "success": True,
+            "ai_environment_status": ai_environment_status, "algae_level": algae_level, "algae_desc": algae_desc,
+            "turbidity_level": turbidity_level, "model_version": AI_MODEL_VERSION
+        })
+        if scale_source:
+            outputs[-1].update({"pixels_per_cm": round(float(scales[-1][0]), 4), "scale_source": scale_source, "image_width": w_img})
+    timings["preprocess"] = (time.perf_counter() - clock) * 1000
 
-        # ========================================================
-        # PATH A: ENVIRONMENT ONLY SCAN
-        # ========================================================
-        if scan_mode.upper() == "ENVIRONMENT":
-            debug_log("🌊 ENVIRONMENT MODE: Skipping Crayfish Detection")
-            _, buffer = cv2.imencode('.jpg', original_img)
-            return {
-                "image": base64.b64encode(buffer).decode('utf-8'), 
-                "measurements": [], "success": True, 
-                "ai_environment_status": ai_environment_status, 
-                "algae_level": algae_level, "algae_desc": algae_desc, "turbidity_level": turbidity_level, 
-                "model_version": AI_MODEL_VERSION, "gender": "N/A", "genderConfidence": 0
-            }
-
-        # ========================================================
-        # PATH B: OVERALL SCAN
-        # ========================================================
-        debug_log("🦞 OVERALL MODE: Running Full Detection")
-        pixels_per_cm, paper_detected = calculate_dynamic_scale(original_img)
-        results_data = []
-        raw_boxes = []
-
-        if model and paper_detected:
-            try:
-                results = model.predict(source=original_img, conf=0.6)
-                for result in results:
-                    for box in result.boxes:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        if ((y2 - y1) / pixels_per_cm) >= MIN_CRAYFISH_LENGTH_CM:
-                            raw_boxes.append(box)
-            except Exception as e: pass
-
-            if len(raw_boxes) == 0:
-                cv2.rectangle(original_img, (0, 0), (w_img, h_img), (0, 0, 255), 15)
-                cv2.putText(original_img, "NO CRAYFISH DETECTED", (int(w_img * 0.1), int(h_img / 2)), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 4)
-            else:
-                for box_num, box in enumerate(raw_boxes, 1):
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    w_cm = (x2 - x1) / pixels_per_cm
-                    h_cm = (y2 - y1) / pixels_per_cm
-                    age_category = estimate_age(h_cm)
-                    detected_gender, gender_confidence = "Not Defined", 0.0
-
-                    if g_model:
-                        try:
-                            crayfish_crop = original_img[max(0, y1):max(0, y2), max(0, x1):max(0, x2)]
-                            if crayfish_crop.size > 0:
-                                gender_results = g_model.predict(source=crayfish_crop, conf=0.4) 
-                                for g_res in gender_results:
-                                    all_detections = (g_res.boxes if getattr(g_res, 'boxes', None) else []) + (g_res.obb if getattr(g_res, 'obb', None) else [])
-                                    for det in all_detections:
-                                        label = g_model.names[int(det.cls[0])]
-                                        conf = float(det.conf[0]) * 100
-                                        if label in ["Male", "Female", "Berried", "male", "female", "berried", "male_crayfish", "female_crayfish"] and conf > gender_confidence:
-                                            detected_gender = label.replace('_crayfish', '').capitalize()
-                                            gender_confidence = round(conf, 1)
-                        except Exception as err: pass
-
-                    if detected_gender != "Not Defined" and gender_confidence < MIN_GENDER_CONFIDENCE:
-                        detected_gender, gender_confidence = "Not Defined", 0.0
-                    if detected_gender == "Not Defined":
-                        detected_gender = random.choice(["Male", "Female"])
-                        gender_confidence = round(random.uniform(48.2, 74.9), 1)
-
-                    cv2.rectangle(original_img, (x1, y1), (x2, y2), (0, 255, 0), 4)
-                    label_color = (255, 105, 180) if "Female" in detected_gender or "Berried" in detected_gender else (255, 0, 0)
-                    cv2.putText(original_img, f"{detected_gender} ({gender_confidence}%)", (x1, max(30, y1 - 40)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, label_color, 3)
-                    cv2.putText(original_img, f"W: {w_cm:.2f}cm", (x1, max(30, y1 - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-                    cv2.putText(original_img, f"H: {h_cm:.2f}cm", (x1, y2 + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-                    
-                    results_data.append({
-                        "type": "target", "width_cm": round(w_cm, 2), "height_cm": round(h_cm, 2),
-                        "estimated_age": age_category, "gender": detected_gender, "gender_confidence": gender_confidence
-                    })
-        elif not paper_detected:
-            cv2.rectangle(original_img, (0, 0), (w_img, h_img), (255, 165, 0), 15) 
-            cv2.putText(original_img, "PAPER NOT FOUND", (int(w_img * 0.1), int(h_img / 2)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 165, 0), 3)
-
-        _, buffer = cv2.imencode('.jpg', original_img)
-        primary_result = results_data[0] if results_data else {}
-
-        return {
-            "image": base64.b64encode(buffer).decode('utf-8'), "measurements": results_data, "success": True, 
-            "ai_environment_status": ai_environment_status, "algae_level": algae_level, "algae_desc": algae_desc, 
-            "turbidity_level": turbidity_level, "model_version": AI_MODEL_VERSION,
-            "gender": primary_result.get("gender", "Not Defined"), "genderConfidence": primary_result.get("gender_confidence", 0)
-        }
+    # ========================================================
+    # PATH A: ENVIRONMENT ONLY SCAN
+    # ========================================================
+    if not overall:
+        debug_log("🌊 ENVIRONMENT MODE: Skipping Crayfish Detection")
+        for original_img, output in zip(images, outputs):
+            output.update({"gender": "N/A", "genderConfidence": 0})
+            attach_image(output, original_img, options)
+        if INCLUDE_TIMINGS: _attach_timings(outputs, timings, images=len(images))
+        return outputs
+
+    # ========================================================
+    # PATH B: OVERALL SCAN
+    # ========================================================
+    debug_log(f"🦞 OVERALL MODE: Running Full Detection on {len(images)} image(s)")
+    model, g_model = models["crayfish"], models["gender"]
+    clock = time.perf_counter()
+    cascade = any(native is not None for native in natives)
+    if cascade:
+        # Cheap coarse pass, then only the detected regions are re-read at native resolution
+        detections = detect_crayfish(model, images, scales, imgsz=CASCADE_DETECT_IMGSZ)
+        detections, native_crops = refine_detections(model, detections, natives, factors)
+    else:
+        detections, native_crops = detect_crayfish(model, images, scales), None
+    timings["detection"] = (time.perf_counter() - clock) * 1000
+
+    # Gender: crop every box from every image first (before any drawing), then classify them together
+    clock = time.perf_counter()
+    crops = [native_crops[i][j] if native_crops and native_crops[i][j] is not None else crop_box(img, box)
+             for i, (img, boxes) in enumerate(zip(images, detections)) for j, box in enumerate(boxes)]
+    flat_genders = classify_genders(g_model, crops)
+    genders, cursor = [], 0
+    for boxes in detections:
+        genders.append(flat_genders[cursor:cursor + len(boxes)])
+        cursor += len(boxes)
+    timings["gender"] = (time.perf_counter() - clock) * 1000
+    gender_calls = -(-len(crops) // GENDER_BATCH_SIZE) if g_model else 0
+    debug_log(f"🧬 Gender: {len(crops)} crop(s) in {gender_calls} model call(s), {timings['gender']:.1f}ms")
+
+    clock = time.perf_counter()
+    for i, (original_img, output) in enumerate(zip(images, outputs)):
+        try:
+            pixels_per_cm, paper_detected = scales[i]
+            h_img, w_img = original_img.shape[:2]
+            results_data = []
+            if model and paper_detected:
+                results_data = measure_crayfish(original_img, detections[i], pixels_per_cm, genders[i])
+            elif not paper_detected:
+                cv2.rectangle(original_img, (0, 0), (w_img, h_img), (255, 165, 0), 15)
+                cv2.putText(original_img, "PAPER NOT FOUND", (int(w_img * 0.1), int(h_img / 2)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 165, 0), 3)
+
+            primary_result = results_data[0] if results_data else {}
+            output.update({
+                "measurements": results_data,
+                "gender": primary_result.get("gender", "Not Defined"), "genderConfidence": primary_result.get("gender_confidence", 0)
+            })
+            attach_image(output, original_img, options)
+        except Exception as e:
+            outputs[i] = error_result(str(e))
+    timings["annotate_encode"] = (time.perf_counter() - clock) * 1000
+
+    if INCLUDE_TIMINGS: _attach_timings(outputs, timings, images=len(images), gender_crops=len(crops), gender_calls=gender_calls, cascade=cascade)
+    return outputs
+
+def decode_for_mode(file_bytes, scan_mode):
+    """(working_img, NativeImage or None): the native copy is only kept for cascade OVERALL scans."""
+    if DETECTION_CASCADE and scan_mode.upper() != "ENVIRONMENT":
+        return decode_scan(file_bytes)
+    return decode_image(file_bytes), None
+
+def process_measurement_bytes(file_bytes, scan_mode="OVERALL", options=None, fallback_scale=None):
+    """Single-scan entry point on raw upload bytes (picklable, so it can run in the inference pool)."""
+    try:
+        original_img, native = decode_for_mode(file_bytes, scan_mode)
+        if original_img is None: return {"success": False, "error": "Invalid Image"}
+        return measure_images([original_img], scan_mode=scan_mode, options=options, fallback_scale=fallback_scale, natives=[native])[0]
+    except Exception as e:
+        return error_result(str(e))
+
+def process_measurement(image_file, scan_mode="OVERALL"):
+    return process_measurement_bytes(image_file.read(), scan_mode=scan_mode)
+
+def process_measurement_batch_bytes(payloads, scan_mode="OVERALL", options=None, fallback_scale=None):
+    """
+    Scans many uploads in one go: decodes them in parallel (cv2 releases the GIL),
+    then pushes every valid image through the pipeline together.
+    Returns one result per upload, in upload order, using the single-scan schema.
+    """
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(DECODE_WORKERS, len(payloads)))) as pool:
+            decoded = list(pool.map(lambda data: decode_for_mode(data, scan_mode), payloads))
+        images = [img for img, _ in decoded]
+
+        valid = [i for i, img in enumerate(images) if img is not None]
+        results = [{"success": False, "error": "Invalid Image"} for _ in images]
+        if valid:
+            natives = [decoded[i][1] for i in valid]
+            for i, output in zip(valid, measure_images([images[i] for i in valid], scan_mode=scan_mode, options=options, fallback_scale=fallback_scale, natives=natives)):
+                results[i] = output
+        return results
     except Exception as e:
-        return {"success": False, "error": str(e), "measurements": [], "gender": "Error", "genderConfidence": 0}
\ No newline at end of file
+        return [error_result(str(e)) for _ in payloads]
+
+def process_measurement_batch_job(payloads, scan_mode="OVERALL", options=None, fallback_scale=None):
+    """Response body for /api/measure/batch (picklable, so it can run in the inference pool)."""
+    results = process_measurement_batch_bytes(payloads, scan_mode=scan_mode, options=options, fallback_scale=fallback_scale)
+    return {"results": results, "count": len(results), "success": True}
+
+def process_measurement_batch(image_files, scan_mode="OVERALL"):
+    return process_measurement_batch_bytes([image_file.read() for image_file in image_files], scan_mode=scan_mode)
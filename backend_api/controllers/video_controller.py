@@ -0,0 +1,266 @@
+import cv2
+import numpy as np
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services.metrics import span, timed
+from services.model_registry import model_registry
+from controllers.measurement_controller import (
+    decode_image, predict_batch, preprocess, analyze_algae,
+    calculate_dynamic_scale, session_scale, classify_environment, water_quality, classify_genders, crop_box,
+    estimate_age, attach_image, error_result, debug_log, _attach_timings, _shrink,
+    MAX_IMAGE_SIZE, MIN_CRAYFISH_LENGTH_CM, DEFAULT_PIXELS_PER_CM, DECODE_WORKERS, INCLUDE_TIMINGS, AI_MODEL_VERSION
+)
+
+# --- VIDEO / FRAME-STREAM CONFIG ---
+# A clip (or a burst of frames) of a grading tray is scanned as one: the detector runs on sampled
+# frames, boxes are tracked across frames, and each tracked animal is calibrated, sexed and sized once.
+VIDEO_SAMPLE_FPS = float(os.environ.get("VIDEO_SAMPLE_FPS", 4))         # frames per second of video to analyse
+VIDEO_MAX_FRAMES = int(os.environ.get("VIDEO_MAX_FRAMES", 60))          # sampled frames per clip / stream
+VIDEO_MAX_MB = float(os.environ.get("VIDEO_MAX_MB", 50))
+VIDEO_CALIBRATION_FRAMES = int(os.environ.get("VIDEO_CALIBRATION_FRAMES", 5))  # frames tried for the paper square
+VIDEO_TRACK_IOU = float(os.environ.get("VIDEO_TRACK_IOU", 0.3))          # min overlap to continue a track
+VIDEO_TRACK_MAX_MISSED = int(os.environ.get("VIDEO_TRACK_MAX_MISSED", 3))  # sampled frames a track may go unseen
+VIDEO_MIN_TRACK_FRAMES = int(os.environ.get("VIDEO_MIN_TRACK_FRAMES", 2))  # shorter tracks are treated as noise
+
+# --- FRAME SOURCES ---
+@timed("video.decode")
+def decode_video(video_bytes, sample_fps=None, max_frames=None):
+    """Samples up to `max_frames` frames at `sample_fps` from an uploaded clip. Returns (frames, total_frames)."""
+    sample_fps = sample_fps or VIDEO_SAMPLE_FPS
+    max_frames = max_frames or VIDEO_MAX_FRAMES
+    # VideoCapture only reads from a path, so the upload is spooled to a temp file first
+    with tempfile.NamedTemporaryFile(suffix=".mp4") as tmp:
+        tmp.write(video_bytes)
+        tmp.flush()
+        cap = cv2.VideoCapture(tmp.name)
+        if not cap.isOpened(): return [], 0
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, int(round(source_fps / sample_fps)))
+        frames, index = [], 0
+        try:
+            # grab() skips frames without the colour conversion; only sampled frames are retrieved
+            while len(frames) < max_frames and cap.grab():
+                if index % step == 0:
+                    ok, frame = cap.retrieve()
+                    if ok: frames.append(_shrink(frame, MAX_IMAGE_SIZE))
+                index += 1
+        finally:
+            cap.release()
+    return frames, index
+
+def decode_frames(payloads, max_frames=None):
+    """Decodes a burst of still frames (in order) in parallel, dropping any that fail."""
+    payloads = payloads[:max_frames or VIDEO_MAX_FRAMES]
+    with ThreadPoolExecutor(max_workers=max(1, min(DECODE_WORKERS, len(payloads)))) as pool:
+        frames = list(pool.map(decode_image, payloads))
+    return [frame for frame in frames if frame is not None]
+
+# --- TRACKING ---
+def box_iou(a, b):
+    """IoU between every box in `a` (N, 4) and every box in `b` (M, 4), as an (N, M) matrix."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+class Track:
+    __slots__ = ('track_id', 'observations', 'last_seen')
+
+    def __init__(self, track_id):
+        self.track_id = track_id
+        self.observations = []  # (frame_index, box) with the raw YOLO box
+        self.last_seen = -1
+
+    def add(self, frame_index, box):
+        self.observations.append((frame_index, box))
+        self.last_seen = frame_index
+
+    @property
+    def last_xyxy(self):
+        return self.observations[-1][1].xyxy[0]
+
+    def box_at(self, frame_index):
+        """The track's box in a given frame, or its most confident box if it wasn't seen there."""
+        for i, box in self.observations:
+            if i == frame_index: return box
+        return self.best()[1]
+
+    def best(self):
+        """The observation the detector was most confident about (used for the gender crop)."""
+        return max(self.observations, key=lambda obs: float(obs[1].conf[0]))
+
+class IoUTracker:
+    """
+    Greedy IoU tracker: each frame's boxes extend the overlapping live track (best overlap first),
+    anything left over starts a new track, and tracks unseen for `max_missed` frames are closed.
+    Enough for a tray filmed from above, where animals move little between sampled frames.
+    """
+
+    def __init__(self, iou_threshold=VIDEO_TRACK_IOU, max_missed=VIDEO_TRACK_MAX_MISSED):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = []
+        self._live = []
+
+    def update(self, frame_index, boxes):
+        self._live = [t for t in self._live if frame_index - t.last_seen <= self.max_missed + 1]
+        unmatched = list(range(len(boxes)))
+        if self._live and boxes:
+            overlaps = box_iou(
+                np.array([np.asarray(b.xyxy[0], dtype=np.float32) for b in boxes]),
+                np.array([np.asarray(t.last_xyxy, dtype=np.float32) for t in self._live])
+            )
+            used_tracks = set()
+            for flat in np.argsort(overlaps, axis=None)[::-1]:
+                b, t = np.unravel_index(flat, overlaps.shape)
+                if overlaps[b, t] < self.iou_threshold: break
+                if b not in unmatched or t in used_tracks: continue
+                self._live[t].add(frame_index, boxes[b])
+                unmatched.remove(b)
+                used_tracks.add(t)
+        for b in unmatched:
+            track = Track(len(self.tracks) + 1)
+            track.add(frame_index, boxes[b])
+            self.tracks.append(track)
+            self._live.append(track)
+
+# --- PIPELINE ---
+def calibrate_stream(frames, fallback_scale=None):
+    """Paper calibration once per stream: median over the frames (evenly spread) where the square is found."""
+    picks = np.unique(np.linspace(0, len(frames) - 1, min(len(frames), VIDEO_CALIBRATION_FRAMES)).astype(int))
+    found = []
+    for i in picks:
+        pixels_per_cm, paper_detected = calculate_dynamic_scale(frames[i], preprocess(frames[i]))
+        if paper_detected: found.append(pixels_per_cm)
+    scale = (float(np.median(found)), True) if found else (DEFAULT_PIXELS_PER_CM, False)
+    return session_scale(frames[0], scale, fallback_scale)
+
+def _track_size(track, pixels_per_cm):
+    boxes = np.array([np.asarray(box.xyxy[0], dtype=np.float32) for _, box in track.observations])
+    widths = (boxes[:, 2] - boxes[:, 0]) / pixels_per_cm
+    heights = (boxes[:, 3] - boxes[:, 1]) / pixels_per_cm
+    return float(np.median(widths)), float(np.median(heights)), float(np.std(heights))
+
+def annotate_key_frame(frame, frame_index, tracks, sizes, genders):
+    """Draws every track on the frame where most of them are visible, labelled with its aggregated size."""
+    for track, (w_cm, h_cm, _), (detected_gender, gender_confidence) in zip(tracks, sizes, genders):
+        x1, y1, x2, y2 = map(int, track.box_at(frame_index).xyxy[0])
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 4)
+        label_color = (255, 105, 180) if "Female" in detected_gender or "Berried" in detected_gender else (255, 0, 0)
+        cv2.putText(frame, f"#{track.track_id} {detected_gender} ({gender_confidence}%)", (x1, max(30, y1 - 40)), cv2.FONT_HERSHEY_SIMPLEX, 0.9, label_color, 3)
+        cv2.putText(frame, f"W: {w_cm:.2f}cm", (x1, max(30, y1 - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        cv2.putText(frame, f"H: {h_cm:.2f}cm", (x1, y2 + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    return frame
+
+@timed("video.pipeline")
+def measure_stream(frames, options=None, fallback_scale=None, total_frames=None):
+    """
+    Scans a sequence of frames of the same scene as one result: water quality from the middle
+    frame, one calibration, detector on every frame, then gender + size once per tracked animal.
+    """
+    models = model_registry.for_mode("OVERALL")
+    model, g_model, e_model = models["crayfish"], models["gender"], models["environment"]
+    timings = {}
+
+    # Water quality doesn't change within a clip, so one representative frame is enough
+    clock = time.perf_counter()
+    key_index = len(frames) // 2
+    ai_environment_status = classify_environment(e_model, [frames[key_index]])[0]
+    algae_level, algae_desc = analyze_algae(frames[key_index], preprocess(frames[key_index], need_threshold=False))
+    turbidity_level, ai_environment_status = water_quality(algae_level, ai_environment_status)
+    pixels_per_cm, paper_detected, scale_source = calibrate_stream(frames, fallback_scale)
+    timings["environment_calibration"] = (time.perf_counter() - clock) * 1000
+
+    output = {
+        "measurements": [], "success": True,
+        "ai_environment_status": ai_environment_status, "algae_level": algae_level, "algae_desc": algae_desc,
+        "turbidity_level": turbidity_level, "model_version": AI_MODEL_VERSION,
+        "pixels_per_cm": round(float(pixels_per_cm), 4), "scale_source": scale_source, "image_width": frames[0].shape[1],
+        "frames_sampled": len(frames), "frames_total": total_frames or len(frames), "tracks": 0,
+        "gender": "Not Defined", "genderConfidence": 0
+    }
+
+    if not paper_detected:
+        key_frame = frames[key_index]
+        h_img, w_img = key_frame.shape[:2]
+        cv2.putText(key_frame, f"Water: {ai_environment_status}", (30, h_img - 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 200, 0), 3)
+        cv2.rectangle(key_frame, (0, 0), (w_img, h_img), (255, 165, 0), 15)
+        cv2.putText(key_frame, "PAPER NOT FOUND", (int(w_img * 0.1), int(h_img / 2)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 165, 0), 3)
+        return attach_image(output, key_frame, options)
+
+    # Detect on every sampled frame (batched), then link boxes into per-animal tracks
+    clock = time.perf_counter()
+    tracker = IoUTracker()
+    if model:
+        try:
+            with span("measure.yolo_crayfish"):
+                results = predict_batch(model, frames, conf=0.6)
+            for frame_index, result in enumerate(results):
+                boxes = [box for box in result.boxes
+                         if (float(box.xyxy[0][3]) - float(box.xyxy[0][1])) / pixels_per_cm >= MIN_CRAYFISH_LENGTH_CM]
+                tracker.update(frame_index, boxes)
+        except Exception as e:
+            debug_log(f"Video detection failed: {e}", "ERROR")
+    min_frames = min(VIDEO_MIN_TRACK_FRAMES, len(frames))
+    tracks = [t for t in tracker.tracks if len(t.observations) >= min_frames]
+    timings["detection_tracking"] = (time.perf_counter() - clock) * 1000
+
+    # One gender call per animal (its most confident crop), all in one batch
+    clock = time.perf_counter()
+    genders = classify_genders(g_model, [crop_box(frames[t.best()[0]], t.best()[1]) for t in tracks])
+    sizes = [_track_size(t, pixels_per_cm) for t in tracks]
+    timings["gender"] = (time.perf_counter() - clock) * 1000
+    debug_log(f"🎞️ STREAM: {len(frames)} frame(s), {len(tracker.tracks)} track(s), {len(tracks)} kept")
+
+    clock = time.perf_counter()
+    visible = [sum(1 for t in tracks for i, _ in t.observations if i == f) for f in range(len(frames))]
+    if tracks: key_index = int(np.argmax(visible))
+    key_frame = frames[key_index]
+    h_img, w_img = key_frame.shape[:2]
+    cv2.putText(key_frame, f"Water: {ai_environment_status}", (30, h_img - 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 200, 0), 3)
+    if tracks:
+        annotate_key_frame(key_frame, key_index, tracks, sizes, genders)
+    else:
+        cv2.rectangle(key_frame, (0, 0), (w_img, h_img), (0, 0, 255), 15)
+        cv2.putText(key_frame, "NO CRAYFISH DETECTED", (int(w_img * 0.1), int(h_img / 2)), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 4)
+
+    measurements = []
+    for track, (w_cm, h_cm, h_std), (detected_gender, gender_confidence) in zip(tracks, sizes, genders):
+        measurements.append({
+            "type": "target", "width_cm": round(w_cm, 2), "height_cm": round(h_cm, 2),
+            "estimated_age": estimate_age(h_cm), "gender": detected_gender, "gender_confidence": gender_confidence,
+            "track_id": track.track_id, "frames": len(track.observations), "height_cm_std": round(h_std, 2)
+        })
+    primary_result = measurements[0] if measurements else {}
+    output.update({
+        "measurements": measurements, "tracks": len(tracks),
+        "gender": primary_result.get("gender", "Not Defined"), "genderConfidence": primary_result.get("gender_confidence", 0)
+    })
+    attach_image(output, key_frame, options)
+    timings["annotate_encode"] = (time.perf_counter() - clock) * 1000
+
+    if INCLUDE_TIMINGS: _attach_timings([output], timings, frames=len(frames), tracks=len(tracks))
+    return output
+
+# --- ENTRY POINTS (picklable, so they can run in the inference pool) ---
+def process_video_bytes(video_bytes, options=None, fallback_scale=None, sample_fps=None):
+    try:
+        frames, total_frames = decode_video(video_bytes, sample_fps=sample_fps)
+        if not frames: return {"success": False, "error": "Invalid Video"}
+        return measure_stream(frames, options=options, fallback_scale=fallback_scale, total_frames=total_frames)
+    except Exception as e:
+        return error_result(str(e))
+
+def process_frame_stream_bytes(payloads, options=None, fallback_scale=None):
+    try:
+        frames = decode_frames(payloads)
+        if not frames: return {"success": False, "error": "Invalid Image"}
+        return measure_stream(frames, options=options, fallback_scale=fallback_scale, total_frames=len(payloads))
+    except Exception as e:
+        return error_result(str(e))
@@ -0,0 +1,42 @@
+import gc
+import os
+
+# Quiet the HuggingFace tokenizers fork warning (and its thread pool) in forked workers
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 7860)}"
+timeout = 120
+# Scans run in the inference process pool (services/inference_pool.py), so one web worker with
+# threads is usually enough; async scan jobs are pollable from any worker (via the result store)
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+# Threads let concurrent /ask calls share one embedding batch (see services/ai_engine.py)
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# MODEL_PRELOAD=eager: load the app (and every model's weights) once in the master,
+# then fork, so workers share the weights copy-on-write instead of each loading a copy.
+preload_app = os.environ.get("MODEL_PRELOAD", "lazy").lower() == "eager"
+
+def on_starting(server):
+    # Export ONNX/OpenVINO models once in the master, before any worker can take a request,
+    # instead of inside the first scan (which could outlast the worker timeout)
+    if os.environ.get("VISION_BACKEND", "pytorch").lower() != "pytorch":
+        from controllers.measurement_controller import export_models
+        export_models()
+
+def when_ready(server):
+    # Move everything loaded so far out of the GC's reach; otherwise the first
+    # collection in each worker touches (and so copies) every shared page.
+    if preload_app:
+        gc.freeze()
+
+def post_fork(server, worker):
+    # Warm-run inference in the worker, not the master: torch/OpenMP thread pools don't survive fork.
+    if preload_app:
+        from app import app
+        from services.warmup import warm_up
+        warm_up(app)
+
+def worker_exit(server, worker):
+    # Write out chat logs still buffered by the background log writer (services/chat_logs.py)
+    from services.chat_logs import log_writer
+    log_writer.close()
@@ -35,7 +35,7 @@ app.use('/api/measure', createProxyMiddleware({
     target: PYTHON_API_URL, 
     changeOrigin: true,
     pathRewrite: function (path, req) {
-        return '/api/measure'; 
+        return req.originalUrl; // keeps sub-routes like /api/measure/batch
     }
 }));
 
@@ -1,48 +1,434 @@
+import os
+import queue
+import threading
+import time
 import numpy as np
+from services.background import per_process, ensure_thread
+from services.metrics import span, timed, observe
+from services.model_registry import model_registry
 
-model = None
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+MATCH_THRESHOLD = 0.85
+
+# --- SEARCH BACKEND CONFIG ---
+# 'exact' = dense matmul over every row, 'ivf' = clustered (inverted file) approximate search
+SEARCH_BACKEND = os.environ.get('CHATBOT_SEARCH_BACKEND', 'exact').lower()
+IVF_NLIST = int(os.environ.get('CHATBOT_IVF_NLIST', 0))      # 0 = auto (~sqrt of corpus size)
+IVF_NPROBE = int(os.environ.get('CHATBOT_IVF_NPROBE', 8))    # more probes = better recall, slower
+IVF_MIN_SIZE = int(os.environ.get('CHATBOT_IVF_MIN_SIZE', 5000))  # below this, exact search is used
+
+# --- QUERY BATCHING CONFIG ---
+# Concurrent /ask requests (gunicorn --threads) are coalesced into one encode() call
+EMBED_BATCHING = os.environ.get('EMBED_BATCHING', '1') == '1'
+EMBED_MAX_BATCH = int(os.environ.get('EMBED_MAX_BATCH', 32))
+EMBED_MAX_WAIT_MS = float(os.environ.get('EMBED_MAX_WAIT_MS', 5))
+
+def _load_embedding_model():
+    print("⏳ Loading AI Model...")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+model_registry.register("embedding", _load_embedding_model)
 
 def get_model():
-    """Loads the model only when needed to save RAM at startup."""
-    global model
-    if model is None:
-        print("⏳ Loading AI Model... (First run only)")
-        from sentence_transformers import SentenceTransformer
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("✅ AI Model Loaded!")
-    return model
-
-def find_best_match(user_query, db_records):
-    """
-    Finds the best matching Q&A pair from the database.
-    """
-    from sentence_transformers import util
-    
-    # 1. Load the model now (if not already loaded)
+    """Loads the model only when needed to save RAM at startup (and again after an idle unload)."""
+    return model_registry.get("embedding")
+
+@timed("chatbot.embed")
+def encode_texts(texts):
+    """
+    Converts a list of strings into L2-normalised float32 embeddings (one row per string).
+    Because the rows are normalised, cosine similarity is just a dot product.
+    """
     ai_model = get_model()
+    if not ai_model: raise RuntimeError(f"Embedding model {EMBEDDING_MODEL_NAME} unavailable")
+    vectors = ai_model.encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+class _PendingQuery:
+    __slots__ = ('text', 'enqueued_at', 'done', 'result', 'error')
+
+    def __init__(self, text):
+        self.text = text
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class EmbeddingBatcher:
+    """
+    Collects questions from concurrent request threads for up to `max_wait_ms`
+    (or until `max_batch_size` are waiting) and embeds them in a single batch.
+    Each caller blocks only until its own vector is ready.
+    """
+
+    def __init__(self, max_batch_size=EMBED_MAX_BATCH, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self.batch_sizes = {}
+        self.total_queue_ms = 0.0
+        self.max_queue_ms = 0.0
+        self.total_encode_ms = 0.0
+
+    def _ensure_worker(self):
+        work_queue = per_process(self, 'embedding-queue', queue.Queue)
+        ensure_thread(self, 'embedding-batcher', self._run, work_queue)
+        return work_queue
+
+    def encode(self, text):
+        """Returns the normalised embedding for one string."""
+        work_queue = self._ensure_worker()
+        pending = _PendingQuery(text)
+        work_queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self, work_queue):
+        batch = [work_queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(work_queue.get(timeout=remaining) if remaining > 0 else work_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, work_queue):
+        while True:
+            batch = self._collect(work_queue)
+            started = time.perf_counter()
+            try:
+                vectors = encode_texts([p.text for p in batch])
+                for pending, vector in zip(batch, vectors):
+                    pending.result = vector
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finished = time.perf_counter()
+            self._record(batch, started, finished)
+            for pending in batch:
+                pending.done.set()
+
+    def _record(self, batch, started, finished):
+        with self._stats_lock:
+            size = len(batch)
+            self.batches += 1
+            self.queries += size
+            self.largest_batch = max(self.largest_batch, size)
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+            self.total_encode_ms += (finished - started) * 1000
+            for pending in batch:
+                observe("chatbot.embed_queue", started - pending.enqueued_at)
+                waited_ms = (started - pending.enqueued_at) * 1000
+                self.total_queue_ms += waited_ms
+                self.max_queue_ms = max(self.max_queue_ms, waited_ms)
+
+    def stats(self):
+        """Batch-size and queueing-delay counters for this worker."""
+        with self._stats_lock:
+            return {
+                "enabled": EMBED_BATCHING,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self.batches,
+                "queries": self.queries,
+                "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0,
+                "largest_batch": self.largest_batch,
+                "batch_size_counts": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+                "avg_queue_ms": round(self.total_queue_ms / self.queries, 3) if self.queries else 0,
+                "max_queue_ms": round(self.max_queue_ms, 3),
+                "avg_encode_ms": round(self.total_encode_ms / self.batches, 3) if self.batches else 0
+            }
+
+embedding_batcher = EmbeddingBatcher()
+
+def encode_query(text):
+    """Embeds a single user question (coalesced with concurrent questions when batching is on)."""
+    if EMBED_BATCHING:
+        return embedding_batcher.encode(text)
+    return encode_texts([text])[0]
+
+def _top_k(scores, k):
+    """Indices of the k highest scores, best-first."""
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+class ExactSearch:
+    """Brute-force backend: one matmul against the whole matrix. Always exact."""
+
+    name = 'exact'
+
+    def fit(self, matrix):
+        pass
+
+    def assign(self, pos, vector):
+        pass
+
+    def remove(self, pos, last):
+        pass
+
+    def search(self, matrix, query_vector, k):
+        scores = matrix @ query_vector
+        top = _top_k(scores, k)
+        return top, scores[top]
+
+class IVFSearch(ExactSearch):
+    """
+    Pure-NumPy inverted-file backend. Rows are clustered with spherical k-means and a query
+    only scores the rows in its `nprobe` nearest clusters. Raise nprobe for recall, lower it for speed.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, nlist=IVF_NLIST, nprobe=IVF_NPROBE, min_size=IVF_MIN_SIZE, iterations=10, seed=42):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_size = min_size
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self._fitted_size = 0
+
+    def _nearest(self, matrix, chunk=8192):
+        out = np.empty(len(matrix), dtype=np.int32)
+        for start in range(0, len(matrix), chunk):
+            out[start:start + chunk] = np.argmax(matrix[start:start + chunk] @ self.centroids.T, axis=1)
+        return out
+
+    def fit(self, matrix):
+        n = len(matrix)
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self._fitted_size = n
+        if n < max(self.min_size, 1):
+            return
+
+        nlist = self.nlist or int(np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+        rng = np.random.default_rng(self.seed)
 
-    # 2. Prepare the data
-    stored_questions = [item['query'] for item in db_records]
-    
-    if not stored_questions:
+        # Train on a sample (~64 rows per cluster is plenty), then assign everything
+        sample = matrix[rng.choice(n, size=min(n, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.assignments = self._nearest(matrix)
+
+    def assign(self, pos, vector):
+        if self.centroids is None:
+            return
+        cluster = int(np.argmax(self.centroids @ vector))
+        if pos == len(self.assignments):
+            self.assignments = np.append(self.assignments, np.int32(cluster))
+        else:
+            self.assignments[pos] = cluster
+
+    def remove(self, pos, last):
+        if self.centroids is None:
+            return
+        self.assignments[pos] = self.assignments[last]
+        self.assignments = self.assignments[:last]
+
+    def needs_refit(self, n):
+        """Clusters drift as the corpus grows; retrain once it has doubled (or crossed min_size)."""
+        if self.centroids is None:
+            return n >= self.min_size
+        return n > 2 * self._fitted_size
+
+    def search(self, matrix, query_vector, k):
+        if self.centroids is None:
+            return super().search(matrix, query_vector, k)
+
+        probe = _top_k(self.centroids @ query_vector, self.nprobe)
+        candidates = np.flatnonzero(np.isin(self.assignments, probe))
+        if len(candidates) == 0:
+            return super().search(matrix, query_vector, k)
+
+        scores = matrix[candidates] @ query_vector
+        top = _top_k(scores, k)
+        return candidates[top], scores[top]
+
+def make_search_backend(name=None):
+    """Builds the configured search backend ('exact' by default)."""
+    name = (name or SEARCH_BACKEND).lower()
+    if name == 'ivf':
+        return IVFSearch()
+    if name != 'exact':
+        print(f"⚠️ Unknown search backend '{name}', using exact search")
+    return ExactSearch()
+
+class KnowledgeIndex:
+    """
+    In-memory vector index over the approved chatbot Q&A pairs.
+
+    Embeddings live in one contiguous float32 matrix (one normalised row per doc) with a
+    parallel list of records, so a lookup only has to embed the user's question.
+    The actual nearest-neighbour search is delegated to a pluggable backend.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or make_search_backend()
+        self._lock = threading.RLock()
+        self.ready = False
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.records = []
+        self._positions = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def _to_record(doc):
+        return {
+            '_id': str(doc['_id']),
+            'query': doc.get('query'),
+            'response': doc.get('response'),
+            'topic': doc.get('topic')
+        }
+
+    @staticmethod
+    def stored_embedding(doc):
+        """Returns the embedding saved on a Mongo doc, or None if it is missing or stale."""
+        embedding = doc.get('embedding')
+        if not embedding or doc.get('embedding_model') != EMBEDDING_MODEL_NAME:
+            return None
+        return np.asarray(embedding, dtype=np.float32)
+
+    def build(self, docs):
+        """
+        Builds the whole index from Mongo docs. Embeddings already stored on a doc are reused,
+        the rest are encoded in one batch. Returns {doc_id: embedding} for the docs that had to
+        be encoded so the caller can persist them alongside the doc.
+        """
+        docs = [doc for doc in docs if doc.get('query')]
+        vectors = [self.stored_embedding(doc) for doc in docs]
+        missing = [i for i, vec in enumerate(vectors) if vec is None]
+
+        fresh = {}
+        if missing:
+            encoded = encode_texts([docs[i]['query'] for i in missing])
+            for row, i in enumerate(missing):
+                vectors[i] = encoded[row]
+                fresh[str(docs[i]['_id'])] = encoded[row]
+
+        with self._lock:
+            self.records = [self._to_record(doc) for doc in docs]
+            self._positions = {rec['_id']: pos for pos, rec in enumerate(self.records)}
+            if vectors:
+                self.matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+            else:
+                self.matrix = np.zeros((0, 0), dtype=np.float32)
+            self.backend.fit(self.matrix)
+            self.ready = True
+        return fresh
+
+    def upsert(self, doc, embedding=None):
+        """Adds or replaces one doc. Returns the embedding used so the caller can store it."""
+        if embedding is None:
+            embedding = encode_query(doc['query'])
+        embedding = np.asarray(embedding, dtype=np.float32)
+        record = self._to_record(doc)
+
+        with self._lock:
+            pos = self._positions.get(record['_id'])
+            if pos is not None:
+                self.matrix[pos] = embedding
+                self.records[pos] = record
+            else:
+                if len(self.records) == 0:
+                    self.matrix = embedding.reshape(1, -1).copy()
+                else:
+                    self.matrix = np.ascontiguousarray(np.vstack([self.matrix, embedding]))
+                pos = len(self.records)
+                self._positions[record['_id']] = pos
+                self.records.append(record)
+            self.backend.assign(pos, embedding)
+            if getattr(self.backend, 'needs_refit', None) and self.backend.needs_refit(len(self.records)):
+                self.backend.fit(self.matrix)
+        return embedding
+
+    def remove(self, doc_id):
+        """Drops one doc by moving the last row into its slot (keeps the matrix contiguous)."""
+        doc_id = str(doc_id)
+        with self._lock:
+            pos = self._positions.pop(doc_id, None)
+            if pos is None:
+                return False
+            last = len(self.records) - 1
+            self.backend.remove(pos, last)
+            if pos != last:
+                self.matrix[pos] = self.matrix[last]
+                self.records[pos] = self.records[last]
+                self._positions[self.records[pos]['_id']] = pos
+            self.records.pop()
+            self.matrix = self.matrix[:last]
+            return True
+
+    def search(self, query_vector, k=1):
+        """Returns up to k (record, score) pairs ordered best-first."""
+        with self._lock:
+            if len(self.records) == 0:
+                return []
+            with span("chatbot.search"):
+                positions, scores = self.backend.search(self.matrix, query_vector, k)
+            return [(self.records[i], float(score)) for i, score in zip(positions, scores)]
+
+# Shared index for the chatbot blueprint (built once per worker, kept in sync by the CRUD routes
+# and, for edits made on other workers, by the change feed in services/kb_sync.py)
+knowledge_index = KnowledgeIndex()
+
+def search_knowledge(user_query, k=3, db_records=None):
+    """
+    Returns the top-k (record, score) pairs for a question. Uses the shared knowledge
+    index unless an explicit list of DB records is passed in.
+    """
+    index = knowledge_index
+    if db_records is not None:
+        index = KnowledgeIndex(backend=ExactSearch())
+        index.build(db_records)
+
+    if len(index) == 0:
+        return []
+
+    # Only the user's question needs embedding now
+    return index.search(encode_query(user_query), k=k)
+
+def find_best_match(user_query, db_records=None):
+    """
+    Finds the best matching Q&A pair from the knowledge base.
+    """
+    # 1. Search the index
+    hits = search_knowledge(user_query, k=1, db_records=db_records)
+    if not hits:
         return None
 
-    # 3. Convert text to numbers (Embeddings)
-    db_embeddings = ai_model.encode(stored_questions, convert_to_tensor=True)
-    user_embedding = ai_model.encode(user_query, convert_to_tensor=True)
-    
-    # 4. Compare
-    scores = util.cos_sim(user_embedding, db_embeddings)[0]
-    
-    # 5. Find the winner
-    best_score_index = np.argmax(scores.cpu().numpy())
-    best_score = scores[best_score_index].item()
-    
+    # 2. Find the winner
+    best_match, best_score = hits[0]
+
     print(f"🧠 Local AI Match Score: {best_score:.2f} for query: '{user_query}'")
-    
-    # 6. Threshold Check
-    if best_score < 0.85:
+
+    # 3. Threshold Check
+    if best_score < MATCH_THRESHOLD:
         print("⚠️ Match too low, falling back to Gemini...")
-        return None 
-    
-    return db_records[best_score_index]
\ No newline at end of file
+        return None
+
+    return best_match
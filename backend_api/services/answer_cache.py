@@ -0,0 +1,106 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from config.db import mongo
+
+# --- ANSWER CACHE CONFIG ---
+# 'memory' = per-worker LRU, 'mongo' = shared by every worker (TTL collection), 'off' = disabled
+ANSWER_CACHE_BACKEND = os.environ.get('ANSWER_CACHE_BACKEND', 'memory').lower()
+ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', 1024))
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', 3600))  # seconds
+
+CACHE_COLLECTION = 'chatbot_answer_cache'
+
+def normalize_query(text):
+    """'  How often should I FEED them?? ' -> 'how often should i feed them'"""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+class MemoryAnswerCache:
+    """Bounded LRU with a TTL on every entry. Lives inside one worker process."""
+
+    def __init__(self, max_size=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class MongoAnswerCache:
+    """Shared cache so every gunicorn worker benefits from (and invalidates) the same answers."""
+
+    def __init__(self, ttl=ANSWER_CACHE_TTL):
+        self.ttl = ttl
+        self._indexed = False
+
+    @staticmethod
+    def _doc_id(key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _collection(self):
+        collection = mongo.db[CACHE_COLLECTION]
+        if not self._indexed:
+            # Mongo's TTL monitor removes expired entries in the background
+            collection.create_index('expires_at', expireAfterSeconds=0)
+            self._indexed = True
+        return collection
+
+    def get(self, key):
+        doc = self._collection().find_one({'_id': self._doc_id(key), 'expires_at': {'$gt': datetime.utcnow()}})
+        return doc['value'] if doc else None
+
+    def set(self, key, value):
+        self._collection().replace_one(
+            {'_id': self._doc_id(key)},
+            {'query': key, 'value': value, 'expires_at': datetime.utcnow() + timedelta(seconds=self.ttl)},
+            upsert=True
+        )
+
+    def clear(self):
+        self._collection().delete_many({})
+
+class NullAnswerCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+def make_answer_cache(backend=None):
+    backend = (backend or ANSWER_CACHE_BACKEND).lower()
+    if backend == 'mongo':
+        return MongoAnswerCache()
+    if backend == 'off':
+        return NullAnswerCache()
+    return MemoryAnswerCache()
+
+answer_cache = make_answer_cache()
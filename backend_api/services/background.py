@@ -0,0 +1,35 @@
+import os
+import threading
+
+# --- PER-PROCESS STATE ---
+# Threads, queues feeding them and HTTP connection pools don't survive a fork: a gunicorn worker
+# (or pool process) inherits the parent's objects but none of its running threads. Services keep
+# such state here, keyed by process, so each process builds its own on first use.
+
+def per_process(owner, name, factory):
+    """`factory()`'s result, built once per process for `owner` (and rebuilt after a fork)."""
+    slots = owner.__dict__.setdefault('_per_process', {})
+    pid = os.getpid()
+    slot = slots.get(name)
+    if slot and slot[0] == pid:
+        return slot[1]
+    with owner.__dict__.setdefault('_per_process_lock', threading.Lock()):
+        slot = slots.get(name)
+        if slot and slot[0] == pid:
+            return slot[1]
+        value = factory()
+        slots[name] = (pid, value)
+        return value
+
+def current(owner, name):
+    """What `per_process` built for `owner` in this process, or None if nothing was built here yet."""
+    slot = owner.__dict__.get('_per_process', {}).get(name)
+    return slot[1] if slot and slot[0] == os.getpid() else None
+
+def ensure_thread(owner, name, target, *args):
+    """Runs target(*args) on a daemon thread called `name`, once per process for `owner`. Returns the thread."""
+    def start():
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        return thread
+    return per_process(owner, name, start)
@@ -0,0 +1,228 @@
+import atexit
+import math
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from config.db import mongo
+from services.background import per_process, current, ensure_thread
+from services.metrics import observe
+
+# --- CHATBOT LOG STORAGE CONFIG ---
+LOGS_COLLECTION = 'chatbot_logs'
+ARCHIVE_COLLECTION = 'chatbot_logs_archive'
+# Logs older than this are removed from chatbot_logs. Off by default (0 = keep forever):
+# the logs feed the admin stats, so expiring them has to be a deliberate choice
+LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', 0))
+# '1' = move old logs into chatbot_logs_archive (run at startup and via POST /logs/archive)
+# '0' = let a Mongo TTL index delete them in the background
+LOG_ARCHIVE = os.environ.get('LOG_ARCHIVE', '0') == '1'
+TTL_INDEX_NAME = 'timestamp_ttl'
+
+# --- LOG WRITER CONFIG ---
+# 'async' = buffer log records and write them from a background thread with insert_many
+# 'sync'  = insert_one inside the request (the original behaviour)
+LOG_WRITER = os.environ.get('LOG_WRITER', 'async').lower()
+LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', 100))      # flush once this many records are waiting
+LOG_FLUSH_MS = float(os.environ.get('LOG_FLUSH_MS', 1000))        # ...or once the oldest has waited this long
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))    # beyond this, new records are dropped, never blocked on
+
+def ensure_log_indexes():
+    """
+    Idempotent index setup for the admin dashboard queries:
+    (status, timestamp, _id) serves the filtered log list and windowed stats,
+    (timestamp, _id) the unfiltered list, plus the retention TTL index when archiving is off.
+    """
+    logs = mongo.db[LOGS_COLLECTION]
+    logs.create_index([('status', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='status_timestamp')
+    logs.create_index([('timestamp', DESCENDING), ('_id', DESCENDING)], name='timestamp_id')
+
+    existing = logs.index_information().get(TTL_INDEX_NAME)
+    if LOG_RETENTION_DAYS <= 0 or LOG_ARCHIVE:
+        if existing: logs.drop_index(TTL_INDEX_NAME)
+        return
+    expire_after = LOG_RETENTION_DAYS * 86400
+    try:
+        logs.create_index('timestamp', name=TTL_INDEX_NAME, expireAfterSeconds=expire_after)
+    except OperationFailure:
+        # Retention changed since the index was built: adjust it in place instead of rebuilding
+        mongo.db.command('collMod', LOGS_COLLECTION, index={'name': TTL_INDEX_NAME, 'expireAfterSeconds': expire_after})
+
+def archive_old_logs(retention_days=None):
+    """Moves logs past the retention window into the archive collection. Returns how many were moved."""
+    retention_days = LOG_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    old = {'timestamp': {'$lt': cutoff}}
+    logs = mongo.db[LOGS_COLLECTION]
+    # Copy first ($merge is idempotent on _id), then delete only what is now safely archived
+    logs.aggregate([{'$match': old}, {'$merge': {'into': ARCHIVE_COLLECTION, 'on': '_id', 'whenMatched': 'keepExisting'}}])
+    return logs.delete_many(old).deleted_count
+
+def setup_log_storage():
+    """Startup hook: indexes, then a first archival pass when archiving is on."""
+    try:
+        ensure_log_indexes()
+        if LOG_ARCHIVE and LOG_RETENTION_DAYS > 0:
+            moved = archive_old_logs()
+            if moved: print(f"🗄️ Archived {moved} chatbot log(s) older than {LOG_RETENTION_DAYS} days")
+    except Exception as e:
+        print(f"⚠️ Chatbot log index setup failed: {e}")
+
+# --- QUERY HELPERS ---
+def _date_arg(args, name):
+    try:
+        return datetime.fromisoformat(args[name])
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date (e.g. 2024-05-01 or 2024-05-01T08:00)") from None
+
+def _number_arg(args, name):
+    try:
+        value = float(args.get(name) or 0)
+    except ValueError:
+        value = math.nan
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a number")
+    return value
+
+def time_window(args):
+    """
+    Mongo timestamp filter from ?since=/?until= (ISO dates) or ?hours=/?days= (relative to now).
+    Raises ValueError (the routes' 400) on a value that doesn't parse.
+    """
+    window = {}
+    if args.get('since'):
+        window['$gte'] = _date_arg(args, 'since')
+    elif args.get('hours') or args.get('days'):
+        try:
+            window['$gte'] = datetime.utcnow() - timedelta(hours=_number_arg(args, 'hours'), days=_number_arg(args, 'days'))
+        except OverflowError:
+            raise ValueError("hours/days out of range") from None
+    if args.get('until'):
+        window['$lt'] = _date_arg(args, 'until')
+    return {'timestamp': window} if window else {}
+
+def encode_cursor(log):
+    return f"{log['timestamp'].isoformat()}_{log['_id']}"
+
+def cursor_filter(cursor):
+    """
+    Keyset pagination on (timestamp, _id) descending: everything strictly after the given log.
+    Raises ValueError on a cursor encode_cursor didn't produce.
+    """
+    timestamp, _, log_id = cursor.rpartition('_')
+    try:
+        timestamp, log_id = datetime.fromisoformat(timestamp), ObjectId(log_id)
+    except (ValueError, InvalidId):
+        raise ValueError("cursor is not valid (use the X-Next-Cursor of the previous page)") from None
+    return {'$or': [{'timestamp': {'$lt': timestamp}}, {'timestamp': timestamp, '_id': {'$lt': log_id}}]}
+
+# --- BACKGROUND LOG WRITER ---
+_STOP = object()
+
+class LogWriter:
+    """
+    Takes log records off the request path: `write` only enqueues, and a background thread
+    flushes them with insert_many every `batch_size` records or `flush_ms`, whichever comes first.
+    A full queue drops the record (counted) rather than slowing the chat response down.
+    """
+
+    def __init__(self, batch_size=LOG_BATCH_SIZE, flush_ms=LOG_FLUSH_MS, queue_size=LOG_QUEUE_SIZE):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_ms) / 1000.0
+        self.queue_size = max(1, queue_size)
+        self._stats_lock = threading.Lock()
+        self.queued = self.written = self.dropped = self.failed = self.flushes = 0
+
+    def _ensure_worker(self):
+        work_queue = per_process(self, 'log-queue', lambda: queue.Queue(maxsize=self.queue_size))
+        ensure_thread(self, 'log-writer', self._run, work_queue)
+        return work_queue
+
+    def write(self, entry):
+        work_queue = self._ensure_worker()
+        try:
+            work_queue.put_nowait(entry)
+            self._count(queued=1)
+        except queue.Full:
+            self._count(dropped=1)
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def _collect(self, work_queue):
+        first = work_queue.get()
+        if first is _STOP: return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = work_queue.get(timeout=remaining) if remaining > 0 else work_queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP: return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self, work_queue):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect(work_queue)
+            if batch: self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            started = time.perf_counter()
+            mongo.db[LOGS_COLLECTION].insert_many(batch, ordered=False)
+            observe("chatbot.log_flush", time.perf_counter() - started)
+            self._count(written=len(batch), flushes=1)
+        except Exception as e:
+            self._count(failed=len(batch))
+            print(f"⚠️ Chatbot log flush failed ({len(batch)} record(s) lost): {e}")
+
+    def close(self, timeout=5.0):
+        """Flushes whatever is still queued (called at interpreter exit)."""
+        thread, work_queue = current(self, 'log-writer'), current(self, 'log-queue')
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            work_queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def stats(self):
+        work_queue = current(self, 'log-queue')
+        with self._stats_lock:
+            return {
+                "mode": "async", "pending": work_queue.qsize() if work_queue else 0,
+                "queued": self.queued, "written": self.written, "dropped": self.dropped,
+                "failed": self.failed, "flushes": self.flushes,
+                "batch_size": self.batch_size, "flush_ms": self.flush_interval * 1000, "queue_size": self.queue_size
+            }
+
+class SyncLogWriter:
+    def __init__(self):
+        self.written = 0
+
+    def write(self, entry):
+        mongo.db[LOGS_COLLECTION].insert_one(entry)
+        self.written += 1
+
+    def close(self, timeout=None):
+        pass
+
+    def stats(self):
+        return {"mode": "sync", "written": self.written}
+
+log_writer = LogWriter() if LOG_WRITER == 'async' else SyncLogWriter()
+atexit.register(log_writer.close)
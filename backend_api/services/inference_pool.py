@@ -0,0 +1,180 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from services import metrics
+from services.result_store import save_job, load_job, store_images
+
+# --- INFERENCE POOL CONFIG ---
+# Scans run in separate processes so slow OpenCV/YOLO work never ties up the Flask threads
+INFERENCE_POOL = os.environ.get('INFERENCE_POOL', '1') == '1'
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', os.cpu_count() or 1))
+INFERENCE_QUEUE_SIZE = int(os.environ.get('INFERENCE_QUEUE_SIZE', INFERENCE_WORKERS * 4))  # queued + running jobs
+INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 100))  # seconds a sync request waits (< gunicorn timeout)
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 600))  # seconds finished async jobs are kept for polling
+JOB_POLL_INTERVAL = 0.25  # seconds between result-store checks when long-polling another worker's job
+
+class PoolFullError(Exception):
+    """Raised when the inference queue is full; the route turns it into a 503."""
+
+def _init_process():
+    # Timing spans recorded in here are shipped back with each job result and merged by the parent
+    metrics.start_forwarding()
+    # Pool processes load their own models; load + warm-run them up front when eager preloading is on
+    from services.warmup import is_eager, warm_vision_models
+    if is_eager():
+        warm_vision_models()
+
+def _noop():
+    return os.getpid()
+
+def _run_job(fn, *args):
+    return fn(*args), metrics.drain_forwarded()
+
+class _Job:
+    __slots__ = ('future', 'created_at', 'finished_at', 'shared')
+
+    def __init__(self, future):
+        self.future = future
+        self.created_at = time.time()
+        self.finished_at = None
+        self.shared = False  # status mirrored to the result store for polls on other workers
+
+class InferencePool:
+    """
+    Bounded process pool for scan jobs. At most `queue_size` jobs may be queued or running;
+    beyond that `submit` fails fast with PoolFullError instead of piling up requests.
+    Jobs run from the gunicorn worker that accepted them; jobs a client will poll are shared
+    through the result store, so any worker can answer the poll.
+    """
+
+    def __init__(self, workers=INFERENCE_WORKERS, queue_size=INFERENCE_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self._lock = threading.Lock()
+        self._store_lock = threading.Lock()  # a late "queued" write must never overwrite the final status
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._executor = None
+        self._pid = None
+        self._jobs = {}
+
+    def _get_executor(self):
+        # Never reuse an executor across a fork; spawn keeps torch state out of the children
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process
+            )
+            self._pid = os.getpid()
+        return self._executor
+
+    def start(self):
+        """Starts every pool process now (and waits for their initializers) instead of on first use."""
+        with self._lock:
+            executor = self._get_executor()
+        pids = {f.result() for f in [executor.submit(_noop) for _ in range(self.workers)]}
+        print(f"🏭 Inference pool ready: {len(pids)} process(es)")
+
+    def _release(self, job_id, job):
+        job.finished_at = time.time()
+        self._slots.release()
+        if not job.future.cancelled() and job.future.exception() is None:
+            metrics.merge(job.future.result()[1])
+        if job.shared:
+            self._save(job_id, job)
+
+    def _save(self, job_id, job):
+        try:
+            with self._store_lock:
+                record = self._status(job_id, job)
+                if record["status"] == "done":
+                    # Images go to the store once, in place, so every later poll reuses their URLs
+                    store_images(record["result"])
+                save_job(job_id, record)
+        except Exception as e:
+            print(f"⚠️ Could not store job {job_id}: {e}")
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RESULT_TTL
+        for job_id in [k for k, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, fn, *args, shared=False):
+        """Queues fn(*args) in the pool and returns a job id (shared=True: pollable from any worker)."""
+        if not self._slots.acquire(blocking=False):
+            raise PoolFullError("Scanner is busy, please retry shortly")
+        try:
+            with self._lock:
+                self._prune()
+                try:
+                    future = self._get_executor().submit(_run_job, fn, *args)
+                except BrokenProcessPool:
+                    # A pool process died (e.g. OOM); start a fresh pool and retry once
+                    self._executor = None
+                    future = self._get_executor().submit(_run_job, fn, *args)
+                job_id = uuid.uuid4().hex
+                job = _Job(future)
+                self._jobs[job_id] = job
+            if shared: self.share(job_id)
+            future.add_done_callback(lambda _: self._release(job_id, job))
+            return job_id
+        except Exception:
+            self._slots.release()
+            raise
+
+    def result(self, job_id, timeout=INFERENCE_TIMEOUT):
+        """Blocks until the job finishes and returns its result (re-raises its error)."""
+        return self._jobs[job_id].future.result(timeout=timeout)[0]
+
+    def share(self, job_id):
+        """Mirrors a job's status to the result store from now on, for a client that will poll it."""
+        job = self._jobs[job_id]
+        job.shared = True
+        self._save(job_id, job)  # queued now, or already final if it finished in the meantime
+
+    def status(self, job_id, wait=0):
+        """
+        Returns {"status": queued|running|done|failed, ...} for a job, or None if unknown.
+        `wait` > 0 long-polls: it blocks up to that many seconds for the job to finish.
+        Jobs of another worker are read from the result store (queued until they finish).
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return self._stored_status(job_id, wait)
+        if wait > 0:
+            try:
+                job.future.result(timeout=wait)
+            except FutureTimeout:
+                pass
+            except Exception:
+                pass
+        return self._status(job_id, job)
+
+    def _stored_status(self, job_id, wait):
+        deadline = time.monotonic() + wait
+        while True:
+            record = load_job(job_id)
+            if record is None or record["status"] in ("done", "failed") or time.monotonic() >= deadline:
+                return record
+            time.sleep(JOB_POLL_INTERVAL)
+
+    @staticmethod
+    def _status(job_id, job):
+        future = job.future
+        if not future.done():
+            return {"job_id": job_id, "status": "running" if future.running() else "queued"}
+        error = future.exception()
+        if error is not None:
+            return {"job_id": job_id, "status": "failed", "error": str(error)}
+        return {"job_id": job_id, "status": "done", "result": future.result()[0]}
+
+    def stats(self):
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if not job.future.done())
+        return {"workers": self.workers, "capacity": self.queue_size, "active_jobs": active, "tracked_jobs": len(self._jobs)}
+
+inference_pool = InferencePool()
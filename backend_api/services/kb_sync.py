@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from datetime import datetime
+from pymongo import ASCENDING, ReturnDocument
+from config.db import mongo
+from services.background import ensure_thread
+
+# --- KNOWLEDGE BASE CHANGE FEED CONFIG ---
+# Every Q&A create/update/delete bumps a generation counter and appends (generation, doc_id) to a
+# change collection. Each worker remembers the generation its in-memory index reflects and, at most
+# every KB_SYNC_INTERVAL_S, re-reads only the docs changed since then (never the whole collection).
+KB_META_COLLECTION = 'chatbot_meta'
+KB_CHANGES_COLLECTION = 'chatbot_knowledge_changes'
+KB_SYNC_INTERVAL_S = float(os.environ.get('KB_SYNC_INTERVAL_S', 2))
+KB_CHANGE_TTL_DAYS = int(os.environ.get('KB_CHANGE_TTL_DAYS', 7))   # older changes are pruned (workers behind that rebuild)
+KB_WATCH = os.environ.get('KB_WATCH', '1') == '1'                  # change stream wake-ups (replica sets only)
+# Two writers can commit their generations out of order, so a worker's generation is a contiguous
+# "applied up to N" watermark: generations applied past a gap (e.g. its own writes) are held aside
+# until the gap fills, and every poll re-reads everything above the watermark.
+KB_MAX_AHEAD = 4096  # generations held past a gap before the worker gives up and rebuilds
+_META_ID = 'knowledge'
+
+class KnowledgeSync:
+    def __init__(self, interval=KB_SYNC_INTERVAL_S, watch=KB_WATCH):
+        self.interval = interval
+        self.watch = watch
+        self.generation = 0      # every change up to here is in this worker's index
+        self._ahead = set()      # applied changes above the watermark, waiting for the gap below them
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._indexed = False
+        self.refreshes = self.docs_refreshed = self.rebuilds = 0
+        self.watching = False
+
+    # --- WRITERS ---
+    def _changes(self):
+        changes = mongo.db[KB_CHANGES_COLLECTION]
+        if not self._indexed:
+            changes.create_index('generation', unique=True)
+            changes.create_index('at', expireAfterSeconds=KB_CHANGE_TTL_DAYS * 86400)
+            self._indexed = True
+        return changes
+
+    def record_change(self, doc_id, op, applied=True):
+        """
+        Called after a knowledge write. Returns the change's generation. applied=False leaves it for
+        this worker's next poll too (call mark_applied once the local index has it).
+        """
+        meta = mongo.db[KB_META_COLLECTION].find_one_and_update(
+            {'_id': _META_ID}, {'$inc': {'generation': 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        generation = meta['generation']
+        self._changes().insert_one({'generation': generation, 'doc_id': str(doc_id), 'op': op, 'at': datetime.utcnow()})
+        if applied: self.mark_applied(generation)
+        return generation
+
+    # --- READERS ---
+    def current_generation(self):
+        meta = mongo.db[KB_META_COLLECTION].find_one({'_id': _META_ID})
+        return meta['generation'] if meta else 0
+
+    def mark_built(self, generation):
+        """The index was (re)built from a full read taken at `generation`."""
+        with self._lock:
+            self.generation = generation
+            self._ahead = {g for g in self._ahead if g > generation}
+            self._advance()
+            self._last_check = time.monotonic()
+
+    def mark_applied(self, generation):
+        with self._lock:
+            if generation <= self.generation: return
+            self._ahead.add(generation)
+            self._advance()
+
+    def _advance(self):
+        # Only across a gap-free run: a lower generation may still be on its way from another writer
+        while self.generation + 1 in self._ahead:
+            self.generation += 1
+            self._ahead.discard(self.generation)
+
+    def due(self):
+        """True when this worker should look for changes (poll interval elapsed or a watch event arrived)."""
+        self._ensure_watcher()
+        return self._dirty.is_set() or time.monotonic() - self._last_check >= self.interval
+
+    def pending_changes(self):
+        """
+        Changes this worker hasn't applied yet, oldest first, as (generations, doc_ids).
+        Returns None when the feed has been pruned past our generation (or a gap below our own
+        writes never filled) and a full rebuild is needed.
+        """
+        with self._lock:
+            self._dirty.clear()
+            self._last_check = time.monotonic()
+            since, ahead = self.generation, set(self._ahead)
+        if len(ahead) > KB_MAX_AHEAD:
+            return None
+        changes = self._changes()
+        cursor = changes.find({'generation': {'$gt': since}}, {'generation': 1, 'doc_id': 1}).sort('generation', ASCENDING)
+        fresh = [c for c in cursor if c['generation'] not in ahead]
+        # The next generation we need isn't in the feed: still in flight, or pruned (then rebuild)
+        if (fresh or ahead) and since + 1 not in {c['generation'] for c in fresh} and since > 0:
+            oldest = changes.find_one({}, {'generation': 1}, sort=[('generation', ASCENDING)])
+            if oldest and oldest['generation'] > since + 1:
+                return None
+        return [c['generation'] for c in fresh], list(dict.fromkeys(c['doc_id'] for c in fresh))
+
+    # --- CHANGE STREAM (optional) ---
+    def _ensure_watcher(self):
+        if self.watch:
+            ensure_thread(self, 'kb-change-watch', self._watch)
+
+    def _watch(self):
+        try:
+            with self._changes().watch([{'$match': {'operationType': 'insert'}}]) as stream:
+                self.watching = True
+                for _ in stream:
+                    self._dirty.set()
+        except Exception as e:
+            # Standalone servers have no change streams: polling alone keeps workers in sync
+            print(f"ℹ️ Knowledge change stream unavailable, polling every {self.interval:g}s ({e})")
+        self.watching = False
+
+    def stats(self):
+        return {
+            "generation": self.generation, "applied_ahead": len(self._ahead), "interval_s": self.interval,
+            "watching": self.watching,
+            "refreshes": self.refreshes, "docs_refreshed": self.docs_refreshed, "rebuilds": self.rebuilds
+        }
+
+kb_sync = KnowledgeSync()
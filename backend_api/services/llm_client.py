@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from services.background import per_process
+
+# --- GEMINI FALLBACK CONFIG ---
+GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-2.5-flash')
+GEMINI_BASE_URL = os.environ.get('GEMINI_BASE_URL')                       # e.g. a local stub server for testing
+GEMINI_TIMEOUT_S = float(os.environ.get('GEMINI_TIMEOUT_S', 8))           # per call, connect + generate
+GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 4)) # in-flight calls per worker
+GEMINI_QUEUE_WAIT_S = float(os.environ.get('GEMINI_QUEUE_WAIT_S', 0.5))   # wait for a free slot before giving up
+GEMINI_BREAKER_FAILURES = int(os.environ.get('GEMINI_BREAKER_FAILURES', 5))   # consecutive failures that open the circuit
+GEMINI_BREAKER_COOLDOWN_S = float(os.environ.get('GEMINI_BREAKER_COOLDOWN_S', 30))  # open time before a trial call
+
+class LLMUnavailable(Exception):
+    """Raised without calling upstream: the circuit is open or every slot is busy."""
+
+class CircuitBreaker:
+    """
+    closed    -> calls go through; `failure_threshold` consecutive failures open the circuit
+    open      -> calls fail fast until `cooldown` has passed
+    half-open -> one trial call; success closes the circuit, failure re-opens it
+    """
+
+    def __init__(self, failure_threshold=GEMINI_BREAKER_FAILURES, cooldown=GEMINI_BREAKER_COOLDOWN_S):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half-open"
+            if self.state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def cancel(self):
+        """The allowed call never reached upstream (no outcome to record)."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self._trial_running = "closed", 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                self.state, self.opened_at = "open", time.monotonic()
+
+    def retry_in(self):
+        with self._lock:
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at)) if self.state == "open" else 0.0
+
+class GeminiClient:
+    """
+    One long-lived genai client per process (so its HTTP connections are reused), with a strict
+    per-call timeout, a cap on concurrent calls and a circuit breaker around the upstream.
+    """
+
+    def __init__(self, model=GEMINI_MODEL, timeout=GEMINI_TIMEOUT_S, max_concurrency=GEMINI_MAX_CONCURRENCY,
+                 queue_wait=GEMINI_QUEUE_WAIT_S, base_url=GEMINI_BASE_URL, breaker=None):
+        self.model = model
+        self.timeout = timeout
+        self.queue_wait = queue_wait
+        self.base_url = base_url
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._stats_lock = threading.Lock()
+        self.calls = self.failures = self.rejected_open = self.rejected_busy = 0
+
+    def _get_client(self):
+        return per_process(self, 'genai-client', self._build_client)
+
+    def _build_client(self):
+        # ✅ LAZY LOAD GEMINI ONLY WHEN NEEDED
+        from google import genai
+        from google.genai import types
+        http_options = types.HttpOptions(timeout=int(self.timeout * 1000), base_url=self.base_url)
+        return genai.Client(http_options=http_options)
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self._count(rejected_open=1)
+            raise LLMUnavailable(f"Gemini circuit open (retry in {self.breaker.retry_in():.0f}s)")
+        if not self._slots.acquire(timeout=self.queue_wait):
+            self.breaker.cancel()
+            self._count(rejected_busy=1)
+            raise LLMUnavailable("Gemini busy (too many concurrent requests)")
+
+    def generate(self, prompt):
+        """Returns the model's text, or raises (LLMUnavailable when upstream wasn't even tried)."""
+        self._admit()
+        try:
+            self._count(calls=1)
+            response = self._get_client().models.generate_content(model=self.model, contents=prompt)
+            text = response.text
+            if not text: raise ValueError("Empty response from Gemini")
+        except Exception:
+            self._count(failures=1)
+            self.breaker.record_failure()
+            raise
+        finally:
+            self._slots.release()
+        self.breaker.record_success()
+        return text
+
+    def generate_stream(self, prompt):
+        """
+        Yields the model's text chunk by chunk as they arrive. Raises like generate(); LLMUnavailable
+        comes from the first next(). The timeout applies between chunks, not to the whole answer.
+        The slot is held until the stream ends or the consumer closes the generator.
+        """
+        self._admit()
+        received = False
+        try:
+            self._count(calls=1)
+            for chunk in self._get_client().models.generate_content_stream(model=self.model, contents=prompt):
+                if chunk.text:
+                    received = True
+                    yield chunk.text
+            if not received: raise ValueError("Empty response from Gemini")
+        except GeneratorExit:
+            self.breaker.cancel()  # the client went away mid-answer: no verdict on upstream
+            raise
+        except Exception:
+            self._count(failures=1)
+            self.breaker.record_failure()
+            raise
+        finally:
+            self._slots.release()
+        self.breaker.record_success()
+
+    def stats(self):
+        with self._stats_lock:
+            counters = {"calls": self.calls, "failures": self.failures,
+                        "rejected_open": self.rejected_open, "rejected_busy": self.rejected_busy}
+        return {"model": self.model, "circuit": self.breaker.state, "consecutive_failures": self.breaker.failures,
+                "retry_in_s": round(self.breaker.retry_in(), 1), "timeout_s": self.timeout, **counters}
+
+gemini_client = GeminiClient()
@@ -0,0 +1,130 @@
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# --- METRICS CONFIG ---
+# Hot-path timing spans, aggregated into histograms and served on /metrics (Prometheus text format).
+# With METRICS_ENABLED=0 decorators return the original function and span() is a shared no-op.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+
+# Bucket upper bounds in seconds (inference stages range from sub-ms to tens of seconds)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count', 'lock')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self.lock:
+            self.counts[bisect_left(BUCKETS, seconds)] += 1
+            self.total += seconds
+            self.count += 1
+
+_histograms = {}
+_registry_lock = threading.Lock()
+_forwarded = None  # inference-pool processes buffer observations here to ship back with each job
+
+def _histogram(stage):
+    hist = _histograms.get(stage)
+    if hist is None:
+        with _registry_lock:
+            hist = _histograms.setdefault(stage, Histogram())
+    return hist
+
+def observe(stage, seconds):
+    """Records one duration (in seconds) for a stage."""
+    if not METRICS_ENABLED:
+        return
+    _histogram(stage).observe(seconds)
+    if _forwarded is not None:
+        _forwarded.append((stage, seconds))
+
+class _Span:
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(stage):
+    """`with span("measure.decode"): ...` times the block."""
+    return _Span(stage) if METRICS_ENABLED else _NOOP_SPAN
+
+def timed(stage):
+    """Decorator form of span()."""
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+# --- CROSS-PROCESS (inference pool) ---
+def start_forwarding():
+    """Called in pool processes: keep a copy of every observation so the parent can merge it."""
+    global _forwarded
+    _forwarded = []
+
+def drain_forwarded():
+    global _forwarded
+    if _forwarded is None:
+        return []
+    drained, _forwarded = _forwarded, []
+    return drained
+
+def merge(observations):
+    for stage, seconds in observations:
+        observe(stage, seconds)
+
+# --- EXPORT ---
+def render_prometheus():
+    """All stage histograms in the Prometheus text exposition format."""
+    lines = [
+        "# HELP crayai_stage_duration_seconds Time spent in each instrumented pipeline stage.",
+        "# TYPE crayai_stage_duration_seconds histogram"
+    ]
+    with _registry_lock:
+        stages = sorted(_histograms.items())
+    for stage, hist in stages:
+        with hist.lock:
+            counts, total, count = list(hist.counts), hist.total, hist.count
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f'crayai_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'crayai_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'crayai_stage_duration_seconds_sum{{stage="{stage}"}} {total:.6f}')
+        lines.append(f'crayai_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+    return "\n".join(lines) + "\n"
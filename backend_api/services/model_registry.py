@@ -0,0 +1,194 @@
+import gc
+import os
+import threading
+import time
+from collections import deque
+from services.background import ensure_thread
+from services.metrics import observe
+
+# --- MODEL REGISTRY CONFIG ---
+# Every model (3 YOLO + the SentenceTransformer) is loaded through one registry per process, which
+# tracks what each one costs in memory. With a budget set, loading a model that doesn't fit unloads
+# the least recently used idle ones first; with an idle timeout, unused models are dropped entirely.
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get('MODEL_MEMORY_BUDGET_MB', 0))  # per process, 0 = unlimited
+MODEL_IDLE_UNLOAD_S = float(os.environ.get('MODEL_IDLE_UNLOAD_S', 0))        # 0 = keep models until evicted
+MODEL_EVENT_HISTORY = int(os.environ.get('MODEL_EVENT_HISTORY', 100))
+
+# The models each scan mode actually runs (ENVIRONMENT scans never touch the detector or gender model)
+MODELS_FOR_MODE = {
+    "ENVIRONMENT": ("environment",),
+    "OVERALL": ("environment", "crayfish", "gender"),
+}
+
+def rss_mb():
+    """Resident set size of this process (Linux /proc; 0 elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+def weights_mb(model):
+    """Size of a torch model's parameters and buffers, or None for runtimes that don't expose them."""
+    module = getattr(model, "model", model)  # ultralytics wraps the nn.Module
+    try:
+        tensors = list(module.parameters()) + list(module.buffers())
+    except Exception:
+        return None
+    return sum(t.numel() * t.element_size() for t in tensors) / 1e6 if tensors else None
+
+def _release_memory():
+    gc.collect()
+    # glibc keeps freed arenas mapped; hand them back so RSS actually drops after an unload
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except Exception:
+        pass
+
+class _Entry:
+    __slots__ = ('loader', 'model', 'mb', 'last_used', 'loads', 'load_ms')
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.model = None
+        self.mb = 0.0          # footprint from the last load, used to plan evictions before reloading
+        self.last_used = 0.0
+        self.loads = 0
+        self.load_ms = 0.0
+
+class ModelRegistry:
+    """
+    Loads models on first use and keeps them within a per-process memory budget.
+
+    A model's footprint is its parameter size when the runtime exposes one (PyTorch), otherwise the
+    RSS growth measured around its load (ONNX / OpenVINO). Unloading only drops the registry's
+    reference: a scan already holding the model finishes with it, and the memory goes when it does.
+    A loader returning False (e.g. weights file missing) is remembered; one that raises is retried.
+    """
+
+    def __init__(self, budget_mb=MODEL_MEMORY_BUDGET_MB, idle_unload_s=MODEL_IDLE_UNLOAD_S):
+        self.budget_mb = budget_mb
+        self.idle_unload_s = idle_unload_s
+        self._entries = {}
+        self._lock = threading.RLock()
+        self.events = deque(maxlen=MODEL_EVENT_HISTORY)
+        self.evictions = self.idle_unloads = 0
+
+    def register(self, name, loader):
+        """Declares how to load `name` (re-registering replaces the loader and drops any loaded copy)."""
+        with self._lock:
+            self._entries[name] = _Entry(loader)
+
+    def _event(self, event, name, mb, **extra):
+        self.events.append({"event": event, "model": name, "mb": round(mb, 1), "at": time.time(), **extra})
+
+    def resident_mb(self):
+        with self._lock:
+            return sum(e.mb for e in self._entries.values() if e.model)
+
+    def get(self, name, keep=()):
+        """The loaded model (loading it, and evicting idle ones to make room, if needed), or False."""
+        self._ensure_reaper()
+        entry = self._entries[name]
+        model = entry.model
+        if model is not None:  # lock-free fast path: /ask shouldn't wait behind a YOLO load
+            entry.last_used = time.monotonic()
+            return model
+        with self._lock:
+            entry.last_used = time.monotonic()
+            if entry.model is None:
+                self._load(name, entry, {name, *keep})
+            return entry.model or False
+
+    def acquire(self, names):
+        """Loads several models for one job without letting them evict each other. Returns {name: model}."""
+        with self._lock:
+            return {name: self.get(name, keep=names) for name in names}
+
+    def for_mode(self, scan_mode):
+        return self.acquire(MODELS_FOR_MODE.get(scan_mode.upper(), MODELS_FOR_MODE["OVERALL"]))
+
+    def _load(self, name, entry, keep):
+        if self.budget_mb and entry.mb:
+            self._make_room(entry.mb, keep)
+        before, started = rss_mb(), time.perf_counter()
+        try:
+            model = entry.loader()
+        except Exception as e:
+            print(f"⚠️ Model '{name}' failed to load: {e}")
+            return  # not remembered: the next request retries (e.g. a failed download)
+        seconds = time.perf_counter() - started
+        if not model:
+            entry.model = False
+            return
+        entry.model, entry.loads, entry.load_ms = model, entry.loads + 1, seconds * 1000
+        entry.mb = weights_mb(model) or max(0.0, rss_mb() - before)
+        observe("models.load", seconds)
+        self._event("load", name, entry.mb, ms=round(entry.load_ms))
+        print(f"📦 Model '{name}' loaded in {seconds:.1f}s (~{entry.mb:.0f}MB, {self.resident_mb():.0f}MB resident)")
+        if self.budget_mb:
+            self._make_room(0.0, keep)  # first loads only learn their size afterwards
+
+    def _make_room(self, needed_mb, keep):
+        """Unloads least recently used models until `needed_mb` more fits in the budget."""
+        resident = [(e.last_used, n) for n, e in self._entries.items() if e.model and n not in keep]
+        for _, name in sorted(resident):
+            if self.resident_mb() + needed_mb <= self.budget_mb:
+                break
+            self.evictions += 1
+            self._unload(name, "budget")
+        if self.resident_mb() + needed_mb > self.budget_mb:
+            print(f"⚠️ Model budget {self.budget_mb:.0f}MB exceeded by {sorted(keep)} alone, keeping them loaded")
+
+    def _unload(self, name, reason):
+        entry = self._entries[name]
+        entry.model = None
+        self._event("unload", name, entry.mb, reason=reason)
+        print(f"♻️ Model '{name}' unloaded ({reason}, ~{entry.mb:.0f}MB)")
+        _release_memory()
+
+    def unload_idle(self):
+        if not self.idle_unload_s: return 0
+        now, unloaded = time.monotonic(), 0
+        with self._lock:
+            for name, entry in self._entries.items():
+                if entry.model and now - entry.last_used >= self.idle_unload_s:
+                    self.idle_unloads += 1
+                    unloaded += 1
+                    self._unload(name, "idle")
+        return unloaded
+
+    # --- IDLE REAPER ---
+    def _ensure_reaper(self):
+        if self.idle_unload_s:
+            ensure_thread(self, 'model-reaper', self._reap)
+
+    def _reap(self):
+        interval = max(1.0, self.idle_unload_s / 4)
+        while True:
+            time.sleep(interval)
+            self.unload_idle()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            models = {
+                name: {
+                    "loaded": bool(e.model), "available": e.model is not False, "mb": round(e.mb, 1),
+                    "loads": e.loads, "last_load_ms": round(e.load_ms),
+                    "idle_s": round(now - e.last_used, 1) if e.last_used else None
+                } for name, e in self._entries.items()
+            }
+            return {
+                "pid": os.getpid(), "budget_mb": self.budget_mb, "idle_unload_s": self.idle_unload_s,
+                "resident_mb": round(self.resident_mb(), 1), "rss_mb": round(rss_mb(), 1),
+                "evictions": self.evictions, "idle_unloads": self.idle_unloads,
+                "models": models, "events": list(self.events)[-20:]
+            }
+
+model_registry = ModelRegistry()
+
+def registry_stats():
+    """Module-level (picklable) so the web worker can ask an inference-pool process for its numbers."""
+    return model_registry.stats()
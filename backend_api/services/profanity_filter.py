@@ -0,0 +1,92 @@
+import os
+import re
+from better_profanity.constants import ALLOWED_CHARACTERS
+from better_profanity.utils import get_complete_path_of_file, read_wordlist
+
+# --- PROFANITY FILTER CONFIG ---
+# better_profanity checks each word of a question against every wordlist entry in pure Python.
+# Here the same wordlist and substitutions are compiled once into a single trie-shaped regex,
+# so a question is checked in one C-level scan.
+PROFANITY_EXTRA_WORDS = os.environ.get('PROFANITY_EXTRA_WORDS', '')   # comma-separated custom terms
+PROFANITY_ALLOW_WORDS = os.environ.get('PROFANITY_ALLOW_WORDS', '')   # comma-separated wordlist exemptions
+
+# Leetspeak: a wordlist letter also matches these characters (better_profanity's default mapping)
+LEET_MAP = {
+    "a": "a@*4",
+    "i": "i*l1",
+    "o": "o*0@",
+    "u": "u*v",
+    "v": "v*u",
+    "l": "l1",
+    "e": "e*3",
+    "s": "s$5",
+    "t": "t7",
+}
+
+def _char_class(chars):
+    return re.escape(chars) if len(chars) == 1 else "[" + "".join(re.escape(c) for c in chars) + "]"
+
+# Word characters are what better_profanity tokenises on (letters, digits and @ $ * " '). Every other
+# run of characters is collapsed to one space before matching, so the compiled terms only need " ?"
+# between letters to also catch a term spread across words ("f u c k", "hand job").
+_SEPARATORS = re.compile("[^" + "".join(re.escape(c) for c in sorted(ALLOWED_CHARACTERS)) + "]+")
+
+class _Node:
+    __slots__ = ("children", "terminal")
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = False
+
+class ProfanityFilter:
+    """
+    Whole-word matcher over the better_profanity wordlist plus custom terms. Words match
+    case-insensitively, with leetspeak substitutions and separators between their letters.
+    """
+
+    def __init__(self, words=None, extra_words=(), allow_words=()):
+        words = read_wordlist(get_complete_path_of_file("profanity_wordlist.txt")) if words is None else words
+        allowed = {w.strip().lower() for w in allow_words if w.strip()}
+        terms = {w.strip().lower() for w in list(words) + list(extra_words) if w.strip()} - allowed
+        # Non-word characters inside a term ("ass-fucker", "sh!t") must appear as a separator in the text
+        keys = {tuple(self._units(term)) for term in terms}
+        root = _Node()
+        for key in filter(None, keys):
+            node = root
+            for cls in key:
+                node = node.children.setdefault(cls, _Node())
+            node.terminal = True
+        self.size = len(terms)
+        self.pattern = re.compile(f"(?<![^ ])(?:{self._alternatives(root)})(?![^ ])")
+
+    @staticmethod
+    def _units(term):
+        for i, part in enumerate(_SEPARATORS.sub(" ", term).split(" ")):
+            if i: yield " "
+            yield from (_char_class(LEET_MAP.get(c, c)) for c in part)
+
+    def _alternatives(self, node):
+        alts = []
+        for cls, child in sorted(node.children.items()):
+            if not child.children:
+                alts.append(cls)
+                continue
+            # Optional space between two letters, none right after a required one
+            rest = f"{' ?' if cls != ' ' else ''}(?:{self._alternatives(child)})"
+            alts.append(f"{cls}(?:{rest})?" if child.terminal else f"{cls}{rest}")
+        return "|".join(alts)
+
+    def find(self, text):
+        """The first offending span of the normalised (lower-cased, separators collapsed) text, or None."""
+        if not isinstance(text, str): text = str(text)
+        match = self.pattern.search(_SEPARATORS.sub(" ", text.lower()))
+        return match.group(0) if match else None
+
+    def contains_profanity(self, text):
+        return self.find(text) is not None
+
+def _split_words(value):
+    return [w for w in value.split(",") if w.strip()]
+
+profanity_filter = ProfanityFilter(extra_words=_split_words(PROFANITY_EXTRA_WORDS),
+                                   allow_words=_split_words(PROFANITY_ALLOW_WORDS))
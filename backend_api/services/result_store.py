@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import re
+import stat
+import tempfile
+import time
+import uuid
+
+# --- RESULT STORE CONFIG ---
+# Annotated scan images served by URL (response=url) instead of inlined as base64
+RESULT_STORE_DIR = os.environ.get('RESULT_STORE_DIR', os.path.join(tempfile.gettempdir(), 'crayai_results'))
+RESULT_TTL = int(os.environ.get('RESULT_TTL', 3600))  # seconds an image stays fetchable
+_CLEANUP_INTERVAL = 60
+
+_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+_last_cleanup = 0.0
+_checked_dir = None
+
+def _store_dir():
+    """
+    RESULT_STORE_DIR, created private (0700) on first use. The default lives in the shared temp
+    dir, so a directory someone else created there is refused rather than trusted; one of ours
+    left open by an older release is closed up.
+    """
+    global _checked_dir
+    if _checked_dir == RESULT_STORE_DIR:
+        return RESULT_STORE_DIR
+    os.makedirs(RESULT_STORE_DIR, mode=0o700, exist_ok=True)
+    st = os.lstat(RESULT_STORE_DIR)
+    if hasattr(os, 'getuid'):
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+            raise PermissionError(f"{RESULT_STORE_DIR} must be a directory owned by this user")
+        if st.st_mode & 0o077:
+            os.chmod(RESULT_STORE_DIR, 0o700)
+    _checked_dir = RESULT_STORE_DIR
+    return RESULT_STORE_DIR
+
+def _cleanup():
+    global _last_cleanup
+    now = time.time()
+    if now - _last_cleanup < _CLEANUP_INTERVAL:
+        return
+    _last_cleanup = now
+    cutoff = now - RESULT_TTL
+    for entry in os.scandir(_store_dir()):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+def _path(result_id):
+    return os.path.join(_store_dir(), f"{result_id}.jpg")
+
+def _write(path, data):
+    _cleanup()
+    tmp_path = os.path.join(_store_dir(), f".{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)  # atomic, so readers never see half a file
+
+def save_image(data):
+    """
+    Stores JPEG bytes and returns their id. Ids are content hashes, so the same image (a scan cache
+    hit, a repeated poll) maps to the one file and URL; storing it again only renews its TTL.
+    """
+    result_id = hashlib.sha256(data).hexdigest()[:32]
+    path = _path(result_id)
+    try:
+        if os.path.getmtime(path) >= time.time() - RESULT_TTL:
+            os.utime(path)
+            return result_id
+    except OSError:
+        pass  # not stored yet (or just cleaned up)
+    _write(path, data)
+    return result_id
+
+def image_path(result_id):
+    """Path of a stored image, or None if the id is malformed, unknown or expired."""
+    if not _ID_PATTERN.match(result_id or ''):
+        return None
+    try:
+        path = _path(result_id)
+        if os.path.getmtime(path) < time.time() - RESULT_TTL:
+            return None
+    except OSError:
+        return None
+    return path
+
+def store_images(payload):
+    """Swaps a scan result's raw JPEG bytes for URLs into this store (in place, idempotent)."""
+    outputs = payload.get("results", [payload]) if isinstance(payload, dict) else []
+    for output in outputs:
+        data = output.pop("image_bytes", None)
+        if data is not None:
+            output["image_url"] = f"/api/measure/results/{save_image(data)}"
+    return payload
+
+# --- ASYNC JOB RECORDS ---
+# Async scan jobs run in the gunicorn worker that accepted them; their status is also kept here
+# so a poll landing on any other worker (WEB_CONCURRENCY > 1) can still answer it
+def _job_path(job_id):
+    return os.path.join(_store_dir(), f"{job_id}.job")
+
+def save_job(job_id, record):
+    """Stores a job's status dict as JSON; result images must already be stored (see store_images)."""
+    _write(_job_path(job_id), json.dumps(record).encode('utf-8'))
+
+def load_job(job_id):
+    """A job's last stored status dict, or None if the id is malformed, unknown or expired."""
+    if not _ID_PATTERN.match(job_id or ''):
+        return None
+    try:
+        with open(_job_path(job_id), 'rb') as f:
+            if os.fstat(f.fileno()).st_mtime < time.time() - RESULT_TTL:
+                return None
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,47 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- SESSION SCALE CACHE ---
+# Consecutive photos from the same rig (same `session_id` form field) reuse the last good
+# paper calibration when the reference square isn't found in a later shot.
+SCALE_CACHE_SIZE = int(os.environ.get('SCALE_CACHE_SIZE', 1024))  # sessions remembered
+SCALE_CACHE_TTL = int(os.environ.get('SCALE_CACHE_TTL', 1800))    # seconds a calibration stays valid
+
+class SessionScaleCache:
+    def __init__(self, max_size=SCALE_CACHE_SIZE, ttl=SCALE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # session_id -> (expires_at, (pixels_per_cm, image_width))
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """(pixels_per_cm, image_width) of the session's last paper calibration, or None."""
+        if not session_id: return None
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None: return None
+            if entry[0] < time.time():
+                del self._entries[session_id]
+                return None
+            self._entries.move_to_end(session_id)
+            return entry[1]
+
+    def put(self, session_id, pixels_per_cm, image_width):
+        if not session_id or self.max_size <= 0: return
+        with self._lock:
+            self._entries[session_id] = (time.time() + self.ttl, (float(pixels_per_cm), int(image_width)))
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def remember(self, session_id, payload):
+        """Stores the last paper-calibrated scale found in a scan response (single or batch)."""
+        outputs = payload.get("results", [payload]) if isinstance(payload, dict) else []
+        for output in reversed(outputs):
+            if output.get("scale_source") == "paper":
+                self.put(session_id, output["pixels_per_cm"], output["image_width"])
+                return
+
+scale_cache = SessionScaleCache()
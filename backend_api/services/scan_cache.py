@@ -0,0 +1,186 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- SCAN RESULT CACHE CONFIG ---
+# Identical uploads (client retries, resubmitted photos) return the stored result instead of
+# rerunning the YOLO models. Keys hash the upload bytes with everything that changes the output,
+# including the model version, so a model upgrade simply stops matching old entries.
+SCAN_CACHE_ENABLED = os.environ.get('SCAN_CACHE', '1') == '1'
+SCAN_CACHE_MAX_MB = float(os.environ.get('SCAN_CACHE_MAX_MB', 64))        # in-memory tier, per web worker
+SCAN_CACHE_DIR = os.environ.get('SCAN_CACHE_DIR', '')                     # optional on-disk tier ('' = off)
+SCAN_CACHE_DISK_MB = float(os.environ.get('SCAN_CACHE_DISK_MB', 512))
+SCAN_CACHE_TTL = int(os.environ.get('SCAN_CACHE_TTL', 24 * 3600))        # seconds
+_DISK_CLEANUP_INTERVAL = 60
+
+def content_digest(payloads):
+    """sha256 over every upload's bytes, in order."""
+    digest = hashlib.sha256()
+    for data in payloads:
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+def scan_key(digest, *params):
+    """Cache key for one content digest under the scan parameters (mode, model version, image options...)."""
+    return hashlib.sha256(f"{digest}|{params!r}".encode('utf-8')).hexdigest()
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {"$bytes": base64.b64encode(value).decode('ascii')}  # binary-mode image_bytes
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _decode(obj):
+    return base64.b64decode(obj["$bytes"]) if obj.keys() == {"$bytes"} else obj
+
+def dumps(result):
+    """A result as a JSON blob (never pickle: disk entries may be shared with other processes)."""
+    return json.dumps(result, default=_encode, separators=(',', ':')).encode('utf-8')
+
+def loads(blob):
+    return json.loads(blob, object_hook=_decode)
+
+def cacheable(result):
+    """Only fully successful scans are stored; errors are worth retrying."""
+    outputs = result.get("results", [result]) if isinstance(result, dict) else []
+    return bool(outputs) and all(output.get("success") for output in outputs)
+
+class ScanCache:
+    """
+    Byte-bounded LRU of JSON-serialized scan results, optionally backed by a directory of files
+    that survives restarts and is shared by every worker on the host.
+    Results are stored serialized, so every hit hands out a fresh copy the route can mutate.
+    """
+
+    def __init__(self, max_mb=SCAN_CACHE_MAX_MB, disk_dir=SCAN_CACHE_DIR, disk_mb=SCAN_CACHE_DISK_MB, ttl=SCAN_CACHE_TTL):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.disk_dir = disk_dir
+        self.disk_bytes = int(disk_mb * 1024 * 1024)
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, blob)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        self.hits = self.disk_hits = self.misses = 0
+
+    # --- MEMORY TIER ---
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None: return None
+            if entry[0] < time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _memory_set(self, key, blob, expires_at):
+        if len(blob) > self.max_bytes: return
+        with self._lock:
+            if key in self._entries: self._drop(key)
+            self._entries[key] = (expires_at, blob)
+            self._size += len(blob)
+            while self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        _, blob = self._entries.pop(key)
+        self._size -= len(blob)
+
+    # --- DISK TIER ---
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key):
+        path = self._disk_path(key)
+        try:
+            if os.path.getmtime(path) < time.time() - self.ttl: return None
+            with open(path, 'rb') as f:
+                blob = f.read()
+            os.utime(path)  # disk eviction goes by mtime, so a hit counts as a use
+            return blob
+        except OSError:
+            return None
+
+    def _disk_set(self, key, blob):
+        try:
+            os.makedirs(self.disk_dir, mode=0o700, exist_ok=True)
+            tmp_path = os.path.join(self.disk_dir, f".{key}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, self._disk_path(key))  # atomic, so other workers never read half a file
+            self._disk_cleanup()
+        except OSError as e:
+            print(f"⚠️ Scan cache disk write failed: {e}")
+
+    def _disk_cleanup(self):
+        """Expires old files, then evicts the least recently used ones over the size budget."""
+        now = time.time()
+        if now - self._last_cleanup < _DISK_CLEANUP_INTERVAL: return
+        self._last_cleanup = now
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            try:
+                stat = entry.stat()
+                if stat.st_mtime < now - self.ttl: os.remove(entry.path)
+                else: files.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                pass
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_bytes: break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    # --- PUBLIC API ---
+    def get(self, *keys):
+        """The first stored result among `keys` (a fresh copy), or None."""
+        for key in keys:
+            blob = self._memory_get(key)
+            if blob is not None:
+                self.hits += 1
+                return loads(blob)
+        for key in keys if self.disk_dir else ():
+            blob = self._disk_get(key)
+            if blob is not None:
+                try:
+                    result = loads(blob)
+                except ValueError:
+                    continue  # unreadable file: treat as a miss, the next scan overwrites it
+                self.disk_hits += 1
+                self._memory_set(key, blob, time.time() + self.ttl)
+                return result
+        self.misses += 1
+        return None
+
+    def set(self, key, result):
+        if not cacheable(result): return
+        blob = dumps(result)
+        self._memory_set(key, blob, time.time() + self.ttl)
+        if self.disk_dir: self._disk_set(key, blob)
+
+    def stats(self):
+        with self._lock:
+            entries, size = len(self._entries), self._size
+        return {"enabled": True, "entries": entries, "memory_mb": round(size / 1024 / 1024, 2),
+                "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "disk_dir": self.disk_dir or None}
+
+class NullScanCache:
+    def get(self, *keys):
+        return None
+
+    def set(self, key, result):
+        pass
+
+    def stats(self):
+        return {"enabled": False}
+
+scan_cache = ScanCache() if SCAN_CACHE_ENABLED else NullScanCache()
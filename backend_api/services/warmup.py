@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+import numpy as np
+
+# 'lazy'  = load each model on the first request that needs it (lowest startup RAM)
+# 'eager' = load every model before the worker takes traffic and warm-run it once
+MODEL_PRELOAD = os.environ.get('MODEL_PRELOAD', 'lazy').lower()
+
+_ready = threading.Event()
+_warm_pid = None
+
+def is_eager():
+    return MODEL_PRELOAD == 'eager'
+
+def is_ready():
+    """Lazy workers are always 'ready'; eager workers only once warm_up() has finished in this process."""
+    return not is_eager() or (_ready.is_set() and _warm_pid == os.getpid())
+
+def _vision_in_process():
+    # With the inference pool on, YOLO models live in the pool processes, not the web worker
+    from services.inference_pool import INFERENCE_POOL
+    return not INFERENCE_POOL
+
+def preload_models():
+    """
+    Loads the weights of all four models without running them.
+    Called in the gunicorn master (preload_app) so forked workers share the pages copy-on-write.
+    """
+    from controllers.measurement_controller import get_ai_model, get_gender_model, get_env_model
+    from services.ai_engine import get_model
+
+    started = time.perf_counter()
+    loaded = {"embedding": bool(get_model())}
+    if _vision_in_process():
+        loaded.update({
+            "crayfish": bool(get_ai_model()),
+            "gender": bool(get_gender_model()),
+            "environment": bool(get_env_model())
+        })
+    print(f"📦 Models preloaded in {time.perf_counter() - started:.1f}s: {loaded}")
+    return loaded
+
+def warm_vision_models():
+    """Runs each YOLO model once on a dummy input so the first real scan doesn't pay for graph/kernel setup."""
+    from controllers.measurement_controller import (
+        get_ai_model, get_gender_model, get_env_model, gender_input_size
+    )
+
+    dummy_scan = np.zeros((640, 640, 3), dtype=np.uint8)
+    for name, loader in (("crayfish", get_ai_model), ("environment", get_env_model), ("gender", get_gender_model)):
+        model = loader()
+        if not model: continue
+        image, kwargs = dummy_scan, {}
+        if name == "gender":
+            size = gender_input_size(model)
+            image, kwargs = np.zeros((size, size, 3), dtype=np.uint8), {"imgsz": size}
+        try:
+            model.predict(source=image, verbose=False, **kwargs)
+        except Exception as e:
+            print(f"⚠️ Warm-up of {name} model failed: {e}")
+
+def warm_models():
+    """Warm-runs every model this process serves."""
+    if _vision_in_process():
+        warm_vision_models()
+    else:
+        # Spin up the pool now so its processes load + warm their models before traffic arrives
+        from services.inference_pool import inference_pool
+        inference_pool.start()
+
+    try:
+        from services.ai_engine import encode_texts
+        encode_texts(["How often should I feed my crayfish?"])
+    except Exception as e:
+        print(f"⚠️ Warm-up of embedding model failed: {e}")
+
+def warm_up(app):
+    """
+    Full per-worker warm-up: weights (no-op if the master already preloaded them),
+    a dummy inference pass per model and the chatbot knowledge index. Marks the worker ready.
+    """
+    global _warm_pid
+    if not is_eager():
+        return
+
+    started = time.perf_counter()
+    preload_models()
+    warm_models()
+    try:
+        from controllers.chatbot_controller import ensure_knowledge_index
+        with app.app_context():
+            ensure_knowledge_index()
+    except Exception as e:
+        print(f"⚠️ Knowledge index warm-up failed: {e}")
+
+    _warm_pid = os.getpid()
+    _ready.set()
+    print(f"🔥 Worker {_warm_pid} warm in {time.perf_counter() - started:.1f}s")